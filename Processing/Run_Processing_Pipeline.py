@@ -1,46 +1,77 @@
+import argparse
+import sys
 import yaml
 from pathlib import Path
 
-from scripts import get_data, process_data, terrain_derivatives, push_to_map
+from scripts import batch, metrics, pipeline
 
 
-def main(config):
+def report_dir(config):
+    opts = config.get('metrics', {}) or {}
+    return Path(__file__).parent / opts.get('report_dir', "Data/Reports")
+
+
+def main(config, only=None, dry_run=False, force=False, districts=None, profile=None):
+    """Runs the pipeline; returns the names of the targets (or districts) that failed."""
     print("Starting data processing pipeline...")
-    
-    # 1. Fetch Distict Boundary, Features (Trails, Roads, Lands) and NHD Data
-    if config['steps']['get_data']:
-        print(50*"-")
-        print("Running aquisition pipeline...\n")
-        get_data.main(config)
-
-    
-    # 2. Terrain Derivatives
-    if config['steps']['terrain_derivatives']:
-        print(50*"-")
-        print("Running terrain derivatives pipeline...\n")
-        terrain_derivatives.main(config)
-
-    # 3. Process Data
-    if config['steps']['process_data']:
-        print(50*"-")
-        print("Running processing pipeline...\n")
-        process_data.main(config)
-
-    # 4. Push to Map
-    if config['steps']['push_to_map']:
-        print(50*"-")
-        print("Running map pipeline...\n")
-        push_to_map.push_to_map(config)
+
+    # Wall/CPU time, peak RSS, HTTP traffic and feature counts per stage and
+    # layer go to a JSON run report; --profile adds a profile per stage
+    run = metrics.start_run(profile)
+    run.profile_dir = report_dir(config) / f"profile-{run.id}"
+    try:
+        return run_pipeline(config, only, dry_run, force, districts)
+    finally:
+        if run.stages:
+            print(50*"-")
+            metrics.print_summary()
+            print(f"Run report: {metrics.write_report(report_dir(config))}")
+
+
+def run_pipeline(config, only=None, dry_run=False, force=False, districts=None):
+    # Multi-district batch: shared downloads, per-district outputs
+    if districts:
+        ids = None if districts == ["all"] else districts
+        return [d for d, status, _ in batch.run(config, ids) if status == "failed"]
+
+    # Each enabled step is split into targets (per layer where possible) and
+    # only targets whose inputs, config or code changed are rebuilt.
+    report = pipeline.run(config, only=only, dry_run=dry_run, force=force)
+
+    print(50*"-")
+    rebuilt = [name for name, status in report if status in ("rebuilt", "would rebuild")]
+    if dry_run:
+        print(f"Dry run: {len(rebuilt)} of {len(report)} targets would rebuild.")
+    else:
+        print(f"Rebuilt {len(rebuilt)} of {len(report)} targets.")
+    failed = [name for name, status in report if status == "failed"]
+    if failed:
+        print(f"Failed {len(failed)} targets: {', '.join(failed)}")
+    return failed
 
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the hunting unit data pipeline.")
+    parser.add_argument("--only", nargs="+", metavar="LAYER",
+                        help="Only build these layers/targets, e.g. FS_Trails parcels")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Report what would rebuild without running anything")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild selected targets even if their fingerprints are unchanged")
+    parser.add_argument("--districts", nargs="+", metavar="ID",
+                        help="Batch-build these districts (or 'all') into per-district dirs")
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=metrics.PROFILERS,
+                        help="Profile each stage (cProfile by default) into the report dir")
+    args = parser.parse_args()
+
     config_path = Path(__file__).parent / "config.yaml"
     with open (config_path) as f:
         config = yaml.safe_load(f
         )
 
-    main(config)
-
-
-    
\ No newline at end of file
+    districts = args.districts or config.get('batch', {}).get('districts')
+    failed = main(config, only=args.only, dry_run=args.dry_run, force=args.force, districts=districts,
+                  profile=args.profile)
+    if failed:
+        sys.exit(1)
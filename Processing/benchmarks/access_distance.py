@@ -0,0 +1,90 @@
+"""
+Access-distance benchmark on a district-size synthetic DEM.
+
+Builds a 1 arc-second lat/lon DEM of rolling ridges and a random road/trail
+network, then times each step of access_distance: rasterizing the network,
+the Euclidean distance transform, the cost-distance (travel time) and the
+full derive_access run including vectorization.
+
+Usage (from the Processing dir):
+    python -m benchmarks.access_distance
+    python -m benchmarks.access_distance --size 6000 --lines 400 --cost-cell 90
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.transform import from_origin
+from shapely.geometry import LineString, box
+
+from scripts import layer_io
+from scripts.access_distance import distance_from_access, rasterize_access, travel_minutes, derive_access
+
+
+def synthetic_dem(size, res_deg=1 / 3600, west=-113.5, north=47.0):
+    y, x = np.mgrid[0:size, 0:size] / size * 10
+    dem = (1800 + 600 * np.sin(x) * np.cos(y * 0.8) + 150 * np.sin(x * 3.1 + y * 2.3)).astype(np.float32)
+    return dem, from_origin(west, north, res_deg, res_deg), CRS.from_epsg(4326)
+
+
+def synthetic_network(transform, size, n_lines, seed=0):
+    """Random wandering polylines inside the DEM extent."""
+    rng = np.random.default_rng(seed)
+    west, north = transform.c, transform.f
+    span = size * transform.a
+    lines = []
+    for _ in range(n_lines):
+        start = rng.uniform(0, span, 2)
+        steps = rng.normal(0, span / 40, (20, 2)).cumsum(axis=0) + start
+        steps = np.clip(steps, 0, span)
+        lines.append(LineString(np.column_stack([west + steps[:, 0], north - steps[:, 1]])))
+    return gpd.GeoDataFrame(geometry=lines, crs=4326)
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"  {label:<28} {time.perf_counter() - start:7.2f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=4000, help="DEM width/height in pixels")
+    parser.add_argument("--lines", type=int, default=200, help="Number of synthetic roads/trails")
+    parser.add_argument("--cost-cell", type=float, default=60.0, help="Cost-distance cell size in meters")
+    args = parser.parse_args()
+
+    dem, transform, crs = synthetic_dem(args.size)
+    network = synthetic_network(transform, args.size, args.lines)
+    print(f"DEM: {args.size} x {args.size} ({dem.size / 1e6:.1f} M cells), {args.lines} access lines\n")
+
+    access = timed("rasterize", rasterize_access, [network], dem.shape, transform, crs)
+    distance = timed("distance transform", distance_from_access, access, transform, crs)
+    minutes = timed(f"cost-distance ({args.cost_cell:g} m)", travel_minutes, dem, transform, crs, access, args.cost_cell)
+    print(f"\n  max distance {np.nanmax(distance):.0f} m, max travel time {np.nanmax(minutes):.0f} min")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        dem_path = tmp / "dem.tif"
+        with rasterio.open(dem_path, "w", driver="GTiff", height=args.size, width=args.size, count=1,
+                           dtype="float32", crs=crs, transform=transform, nodata=-9999) as dst:
+            dst.write(dem, 1)
+        layer_io.write_layer(network, layer_io.layer_path(tmp, "mt_roads", "parquet"))
+
+        aoi = box(*rasterio.transform.array_bounds(args.size, args.size, transform)).buffer(-transform.a * 10)
+        opts = {"layers": ["mt_roads"], "cost_cell_m": args.cost_cell}
+        print()
+        timed("derive_access (end to end)", derive_access, dem_path, aoi, tmp, opts, {"sieve_min_area_m2": 2000})
+        for name in ("access_distance", "access_time"):
+            gdf = layer_io.read_layer(layer_io.layer_path(tmp, name, "parquet"))
+            print(f"  {name}: {', '.join(gdf['label'])}")
+
+
+if __name__ == "__main__":
+    main()
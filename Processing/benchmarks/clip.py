@@ -0,0 +1,73 @@
+"""
+Clipping benchmark: gpd.clip per layer vs one shared, prepared AOI.
+
+Clips the shipped layers (frontend/public/data) to the hunting district
+buffered by --buffer miles. The shipped layers already cover the district
+plus a one mile buffer, so a smaller buffer puts plenty of features across
+the boundary. Reports wall time per layer, how many features each AOI.clip
+had to cut, and whether the results match gpd.clip (normalized geometry
+equality per feature).
+
+Usage (from the Processing dir):
+    python -m benchmarks.clip
+    python -m benchmarks.clip --buffer 0 --repeat 5
+"""
+import argparse
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from scripts.aoi import AOI, BOUNDARY, INTERIOR
+
+DATA_DIR = Path(__file__).parent.parent.parent / "frontend" / "public" / "data"
+LAYERS = ("MT_Roads", "FS_Trails", "NHD_Flowline", "parcels")
+
+
+def best_of(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def same_features(a, b):
+    if not a.index.sort_values().equals(b.index.sort_values()):
+        return False
+    a, b = a.geometry.sort_index().values, b.geometry.sort_index().values
+    return bool(shapely.equals(shapely.normalize(a), shapely.normalize(b)).all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buffer", type=float, default=0.5, help="District buffer in miles")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per method (best is reported)")
+    args = parser.parse_args()
+
+    district = gpd.read_file(DATA_DIR / "Hunting_District.geojson")
+    start = time.perf_counter()
+    aoi = AOI.buffered(district, args.buffer)
+    print(f"AOI built in {time.perf_counter() - start:.3f}s "
+          f"({shapely.get_num_coordinates(aoi.geom)} vertices)\n")
+    clip_geom = aoi.geom
+
+    print(f"  {'layer':<14} {'features':>9} {'interior':>9} {'cut':>6} {'gpd.clip':>9} {'AOI.clip':>9} {'speedup':>8}  same")
+    total_ref = total_aoi = 0.0
+    for name in LAYERS:
+        gdf = gpd.read_file(DATA_DIR / f"{name}.geojson")
+        ref, t_ref = best_of(args.repeat, gpd.clip, gdf, clip_geom)
+        out, t_aoi = best_of(args.repeat, aoi.clip, gdf)
+        kind = aoi.classify(gdf.geometry.values)
+        total_ref += t_ref
+        total_aoi += t_aoi
+        print(f"  {name:<14} {len(gdf):9d} {np.sum(kind == INTERIOR):9d} {np.sum(kind == BOUNDARY):6d} "
+              f"{t_ref:9.3f} {t_aoi:9.3f} {t_ref / t_aoi:7.1f}x  {same_features(ref, out)}")
+    print(f"\n  total: gpd.clip {total_ref:.3f}s, AOI.clip {total_aoi:.3f}s ({total_ref / total_aoi:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
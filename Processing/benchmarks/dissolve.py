@@ -0,0 +1,78 @@
+"""
+Parcel ownership dissolve benchmark: GeoDataFrame.dissolve vs coverage_dissolve.
+
+The shipped parcels sample (frontend/public/data/parcels.geojson) is already
+one feature per owner, so it is cut back into adjacent pieces along a grid to
+stand in for the raw cadastral parcels. Each method then dissolves the pieces
+by Owner. Reports wall time, output vertex counts and the area where the
+results differ.
+
+Usage (from the Processing dir):
+    python -m benchmarks.dissolve
+    python -m benchmarks.dissolve --cell 0.001 --workers 4 --presimplify 1
+"""
+import argparse
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from scripts.geometry_ops import coverage_dissolve
+
+SAMPLE = Path(__file__).parent.parent.parent / "frontend" / "public" / "data" / "parcels.geojson"
+
+
+def split_parcels(gdf, cell):
+    """Cuts every feature along a grid of cell degrees; pieces keep their attributes."""
+    xmin, ymin, xmax, ymax = gdf.total_bounds
+    xs = np.arange(xmin, xmax + cell, cell)
+    ys = np.arange(ymin, ymax + cell, cell)
+    gx, gy = np.meshgrid(xs[:-1], ys[:-1])
+    grid = shapely.box(gx.ravel(), gy.ravel(), gx.ravel() + cell, gy.ravel() + cell)
+
+    feature, cell_idx = shapely.STRtree(grid).query(gdf.geometry.values, predicate="intersects")
+    pieces = shapely.intersection(gdf.geometry.values[feature], grid[cell_idx])
+    out = gdf.iloc[feature].set_geometry(pieces, crs=gdf.crs).reset_index(drop=True)
+    out = out.explode(index_parts=False).reset_index(drop=True)
+    return out[out.geom_type == "Polygon"]
+
+
+def vertices(gdf):
+    return int(shapely.get_num_coordinates(gdf.geometry.values).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cell", type=float, default=0.002, help="Grid cell (degrees) the sample is cut with")
+    parser.add_argument("--workers", type=int, default=0, help="coverage_dissolve threads (0 = one per core)")
+    parser.add_argument("--presimplify", type=float, default=0.0, help="coverage_dissolve presimplify_m")
+    args = parser.parse_args()
+
+    sample = gpd.read_file(SAMPLE)[["Owner", "Total_Value", "geometry"]]
+    pieces = split_parcels(sample, args.cell)
+    print(f"{len(sample)} owners cut into {len(pieces)} parcels ({vertices(pieces)} vertices)\n")
+
+    start = time.perf_counter()
+    unary = pieces.dissolve("Owner")
+    t_unary = time.perf_counter() - start
+
+    start = time.perf_counter()
+    coverage = coverage_dissolve(pieces, "Owner", args.presimplify, args.workers)
+    t_coverage = time.perf_counter() - start
+
+    print(f"  {'method':<10} {'seconds':>8} {'features':>9} {'vertices':>9}")
+    print(f"  {'unary':<10} {t_unary:8.2f} {len(unary):9d} {vertices(unary):9d}")
+    print(f"  {'coverage':<10} {t_coverage:8.2f} {len(coverage):9d} {vertices(coverage):9d}")
+    print(f"\nSpeedup: {t_unary / t_coverage:.1f}x")
+
+    same_rows = unary.index.equals(coverage.index) and list(unary.columns) == list(coverage.columns)
+    metric = unary.to_crs(32612)
+    diff = metric.geometry.symmetric_difference(coverage.to_crs(32612).geometry).area.sum()
+    print(f"Same owners/columns: {same_rows}; area that differs: {diff:.1f} m2 "
+          f"of {metric.area.sum() / 1e6:.1f} km2")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Intermediate format benchmark: GeoJSON vs GeoParquet per layer.
+
+For every GeoJSON layer in a directory, writes it in both formats and reports
+write time, full read time, read time for only the field-mapped columns (what
+process_data reads) and size on disk.
+
+Usage (from the Processing dir):
+    python -m benchmarks.intermediate_format                  # layers in ../frontend/public/data
+    python -m benchmarks.intermediate_format --dir Data/Raw
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import geopandas as gpd
+
+from scripts import layer_io
+from scripts.process_data import load_field_mappings
+
+
+def timed(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default="../frontend/public/data", help="Directory of GeoJSON layers")
+    args = parser.parse_args()
+
+    field_mappings = load_field_mappings() or {}
+    totals = {fmt: [0.0, 0.0, 0.0, 0] for fmt in layer_io.SUFFIXES}
+
+    print(f"{'layer':<18} {'format':<8} {'write s':>8} {'read s':>8} {'cols s':>8} {'KB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for src in sorted(Path(args.dir).glob("*.geojson")):
+            gdf = gpd.read_file(src)
+            mapping = field_mappings.get(f"{src.stem.lower()}.geojson", {}).get("field_map", {})
+            wanted = {col.lower() for col in mapping}
+            columns = [col for col in gdf.columns if col.lower() in wanted]
+
+            for fmt in layer_io.SUFFIXES:
+                path = layer_io.layer_path(tmp, src.stem, fmt)
+                t_write = timed(lambda: layer_io.write_layer(gdf, path))
+                t_read = timed(lambda: layer_io.read_layer(path))
+                t_cols = timed(lambda: layer_io.read_layer(path, columns))
+                kb = path.stat().st_size / 1024
+                for i, v in enumerate((t_write, t_read, t_cols, kb)):
+                    totals[fmt][i] += v
+                print(f"{src.stem:<18} {fmt:<8} {t_write:8.3f} {t_read:8.3f} {t_cols:8.3f} {kb:8.0f}")
+
+    print()
+    for fmt, (t_write, t_read, t_cols, kb) in totals.items():
+        print(f"{'total':<18} {fmt:<8} {t_write:8.3f} {t_read:8.3f} {t_cols:8.3f} {kb:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
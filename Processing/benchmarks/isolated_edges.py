@@ -0,0 +1,56 @@
+"""
+Isolated-edge removal: per-line loop (the previous implementation, kept as
+the reference in tests/test_geometry_ops.py) vs the bulk remove_isolated_edges.
+
+Checks that both keep exactly the same rows on each network layer, exact and
+with a tolerance, and reports the time for each; exits 1 if any differ (the
+tests assert the same on the shipped layers).
+
+Usage (from the Processing dir):
+    python -m benchmarks.isolated_edges                  # layers in ../frontend/public/data
+    python -m benchmarks.isolated_edges --dir Data/Raw
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from scripts import layer_io
+from scripts.geometry_ops import remove_isolated_edges
+from tests.test_geometry_ops import remove_isolated_edges_loop
+
+
+LAYERS = ("nhd_flowline", "mt_roads", "fs_trails")
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default="../frontend/public/data", help="Directory with the network layers")
+    args = parser.parse_args()
+
+    layers = {p.stem.lower(): p for p in layer_io.list_layers(Path(args.dir))}
+    print(f"{'layer':<14} {'tolerance':>9} {'lines':>7} {'kept':>7} {'loop s':>8} {'bulk s':>8} {'same':>5}")
+    differ = []
+    for name in LAYERS:
+        if name not in layers:
+            continue
+        gdf = layer_io.read_layer(layers[name])
+        for tolerance in (0.0, 0.0001):
+            ref, t_loop = timed(lambda: remove_isolated_edges_loop(gdf, tolerance))
+            out, t_bulk = timed(lambda: remove_isolated_edges(gdf, tolerance))
+            same = ref.index.equals(out.index) and ref.geometry.equals(out.geometry)
+            print(f"{name:<14} {tolerance:9.4f} {len(gdf):7d} {len(out):7d} {t_loop:8.2f} {t_bulk:8.3f} {str(same):>5}")
+            if not same:
+                differ.append(f"{name} (tolerance {tolerance:g})")
+    if differ:
+        sys.exit(f"Bulk and loop results differ: {', '.join(differ)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Slope cell-size benchmark: center-latitude vs per-row geodesic vs reproject-then-slope.
+
+The reference is the DEM reprojected to UTM (where cells are square meters)
+with slope computed there. Both lat/lon modes are computed on the native grid,
+warped onto the same UTM grid and compared against the reference, overall and
+for the north / middle / south thirds of the raster, where the single
+center-latitude cell size is most wrong.
+
+Usage (from the Processing dir):
+    python -m benchmarks.slope_accuracy                  # synthetic tall tile
+    python -m benchmarks.slope_accuracy --tile Data/Raw/dem_merged.tif
+"""
+import argparse
+import time
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.transform import from_origin
+from rasterio.warp import calculate_default_transform, reproject, Resampling
+from pyproj import Transformer
+
+from scripts.terrain_derivatives import compute_slope_degrees
+
+
+UTM_CRS = CRS.from_epsg(32611)  # UTM 11N covers western Montana
+
+
+def synthetic_tile(rows=7200, cols=900, res_deg=1 / 1800, west=-115.5, north=49.0):
+    """
+    A tall lat/lon DEM (4 degrees of latitude by default) of ridges defined in
+    UTM meters, so its true slope doesn't depend on the lat/lon grid.
+    """
+    transform = from_origin(west, north, res_deg, res_deg)
+    lon = west + (np.arange(cols) + 0.5) * res_deg
+    lat = north - (np.arange(rows) + 0.5) * res_deg
+    lon, lat = np.meshgrid(lon, lat)
+    x, y = Transformer.from_crs("EPSG:4326", UTM_CRS, always_xy=True).transform(lon, lat)
+    dem = 1500.0 + 1800.0 * np.sin(x / 1500.0) * np.cos(y / 1800.0) + 0.02 * (y - y.min())
+    return dem.astype(np.float32), transform, CRS.from_epsg(4326)
+
+
+def to_utm(data, transform, crs, dst_transform=None, dst_shape=None, resampling=Resampling.bilinear):
+    if dst_transform is None:
+        h, w = data.shape
+        bounds = rasterio.transform.array_bounds(h, w, transform)
+        dst_transform, dst_w, dst_h = calculate_default_transform(crs, UTM_CRS, w, h, *bounds)
+        dst_shape = (dst_h, dst_w)
+    out = np.full(dst_shape, np.nan, dtype=np.float32)
+    reproject(
+        data, out, src_transform=transform, src_crs=crs, dst_transform=dst_transform,
+        dst_crs=UTM_CRS, src_nodata=np.nan if data.dtype.kind == "f" else None,
+        dst_nodata=np.nan, resampling=resampling,
+    )
+    return out, dst_transform, dst_shape
+
+
+def timed(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def error_stats(test, ref, band):
+    valid = ~np.isnan(test) & ~np.isnan(ref)
+    # Ignore the outermost cells where warping and one-sided gradients disagree
+    valid[:2] = valid[-2:] = False
+    valid[:, :2] = valid[:, -2:] = False
+    rows = np.zeros(ref.shape[0], dtype=bool)
+    rows[band] = True
+    valid &= rows[:, None]
+    diff = np.abs(test[valid] - ref[valid])
+    mask_disagree = np.mean((test[valid] > 45) != (ref[valid] > 45)) * 100
+    return float(diff.mean()), float(np.percentile(diff, 99)), float(mask_disagree)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tile", help="Reference lat/lon DEM (default: synthetic 4-degree-tall tile)")
+    args = parser.parse_args()
+
+    if args.tile:
+        with rasterio.open(args.tile) as src:
+            dem, transform, crs, nodata = src.read(1).astype(np.float32), src.transform, src.crs, src.nodata
+        if nodata is not None:
+            dem[dem == nodata] = np.nan
+    else:
+        dem, transform, crs = synthetic_tile()
+    print(f"DEM: {dem.shape[0]} x {dem.shape[1]}, {crs}")
+
+    center, t_center = timed(lambda: compute_slope_degrees(dem, transform, None, crs=crs))
+    per_row, t_row = timed(lambda: compute_slope_degrees(dem, transform, None, crs=crs, per_row=True))
+
+    def reference():
+        utm_dem, utm_transform, utm_shape = to_utm(dem, transform, crs)
+        return compute_slope_degrees(utm_dem, utm_transform, None, crs=UTM_CRS), utm_transform, utm_shape
+
+    (ref, utm_transform, utm_shape), t_ref = timed(reference, repeat=1)
+
+    print("\nTiming (best of 3):")
+    print(f"  center latitude      {t_center * 1000:8.1f} ms")
+    print(f"  per-row geodesic     {t_row * 1000:8.1f} ms")
+    print(f"  reproject + slope    {t_ref * 1000:8.1f} ms")
+
+    thirds = np.array_split(np.arange(utm_shape[0]), 3)
+    bands = {"north": thirds[0], "middle": thirds[1], "south": thirds[2], "all": np.arange(utm_shape[0])}
+
+    print("\nError vs reproject-then-slope (degrees; mask = % cells disagreeing on > 45):")
+    print(f"  {'mode':<18} {'rows':<7} {'MAE':>8} {'p99':>8} {'mask %':>8}")
+    for name, slope in (("center latitude", center), ("per-row geodesic", per_row)):
+        warped, _, _ = to_utm(slope, transform, crs, utm_transform, utm_shape)
+        for band_name, band in bands.items():
+            mae, p99, mask = error_stats(warped, ref, band)
+            print(f"  {name:<18} {band_name:<7} {mae:8.4f} {p99:8.4f} {mask:8.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Streaming vs in-memory process_file benchmark.
+
+Writes a synthetic polygon layer (many wide attribute rows, like a statewide
+extract) under a streamable layer name, then processes it once in memory and
+once streamed in batches. Each run happens in a fresh process so peak RSS is
+comparable (Linux VmHWM). Reports wall time, features/s and peak RSS, and checks that both
+outputs hold the same features.
+
+Usage (from the Processing dir):
+    python -m benchmarks.streaming
+    python -m benchmarks.streaming --features 500000 --batch-size 20000 --format geojson
+"""
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from scripts import layer_io, process_data
+
+LAYER = "nhd_waterbody"
+
+
+def synthetic_layer(n, seed=0):
+    """n small squares with the waterbody attributes plus unused wide columns."""
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-114, -112, n)
+    y = rng.uniform(46, 47.5, n)
+    size = rng.uniform(0.0005, 0.003, n)
+    geoms = shapely.box(x, y, x + size, y + size)
+    data = {
+        "GNIS_Name": rng.choice(["Lake A", "Pond B", None], n),
+        "FType": rng.choice([390, 436, 466], n),
+        "AreaSqKm": size * size * 1e4,
+    }
+    # Columns the field map doesn't use: pushed down on read, never loaded
+    for i in range(10):
+        data[f"extra_{i}"] = rng.choice(["x" * 40, "y" * 40], n)
+    return gpd.GeoDataFrame(data, geometry=geoms, crs=4326)
+
+
+def run_once(src, dest, fmt, batch_size):
+    field_mappings = process_data.load_field_mappings()
+    start = time.perf_counter()
+    out = process_data.process_file(src, field_mappings, dest, fmt, batch_size)
+    elapsed = time.perf_counter() - start
+    return elapsed, peak_rss_mb(), str(out)
+
+
+def peak_rss_mb():
+    # ru_maxrss survives exec, so a spawned worker would report the parent's
+    # peak; VmHWM is per process image
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--features", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=20_000)
+    parser.add_argument("--format", choices=sorted(layer_io.SUFFIXES), default="parquet",
+                        help="Format of the raw input and the output")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src = layer_io.write_layer(synthetic_layer(args.features), layer_io.layer_path(tmp, LAYER, args.format))
+        print(f"Input: {args.features} features, {src.stat().st_size / 1024 ** 2:.0f} MB {args.format}\n")
+
+        ctx = multiprocessing.get_context("spawn")
+        results = []
+        for label, batch_size in (("in memory", None), (f"streamed ({args.batch_size})", args.batch_size)):
+            with ctx.Pool(1) as pool:
+                elapsed, rss, out = pool.apply(run_once, (src, tmp / label.split()[0], args.format, batch_size))
+            results.append((label, elapsed, rss, Path(out)))
+
+        print(f"\n  {'mode':<20} {'seconds':>8} {'features/s':>11} {'peak RSS MB':>12}")
+        for label, elapsed, rss, _ in results:
+            print(f"  {label:<20} {elapsed:8.2f} {args.features / elapsed:11.0f} {rss:12.0f}")
+
+        a, b = (layer_io.read_layer(out) for *_, out in results)
+        same = len(a) == len(b) and a.geometry.geom_equals_exact(b.geometry, 0).all()
+        print(f"\nOutputs identical: {same}")
+
+
+if __name__ == "__main__":
+    main()
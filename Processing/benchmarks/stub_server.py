@@ -0,0 +1,322 @@
+"""
+Local stand-in for the ArcGIS and TNM services get_data and terrain_derivatives call.
+
+Serves a synthetic world (see benchmarks.synthetic) over HTTP:
+
+  /arcgis/rest/services/<key>/FeatureServer/0/query   each service layer
+  /arcgis/rest/services/nhd/MapServer/<id>/query      NHD flowline / area / waterbody
+  /api/v1/products                                    TNM product search
+  /tiles/<name>                                       DEM tiles (HEAD and Range work)
+
+The query endpoint speaks the parts of the ArcGIS REST protocol the pager
+uses: where (1=1 or NAME IN (...)), envelope and polygon geometry filters,
+returnIdsOnly, returnCountOnly, objectIds, resultOffset/resultRecordCount
+(capped at maxRecordCount, with exceededTransferLimit), maxAllowableOffset,
+geometryPrecision and f=json/geojson, over GET or POST. --latency adds a
+fixed delay to every request, like a remote server.
+
+Usage (from the Processing dir), to run a config against it by hand:
+    python -m benchmarks.stub_server --data /tmp/synthetic --port 8765
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlparse
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from benchmarks.synthetic import DISTRICT_SERVICE, NHD_LAYER_IDS, World
+
+
+MAX_RECORD_COUNT = 2000
+CHUNK_SIZE = 1024 * 1024
+WHERE_IN = re.compile(r"^\s*(\w+)\s+IN\s*\((.*)\)\s*$", re.IGNORECASE)
+WHERE_EQ = re.compile(r"^\s*(\w+)\s*=\s*'([^']*)'\s*$")
+
+
+class QueryError(ValueError):
+    """A request the stub answers with an ArcGIS error payload."""
+
+
+def esri_geometry(params):
+    """The query's filter geometry (envelope or polygon), or None."""
+    geometry = params.get("geometry")
+    if not geometry:
+        return None
+    kind = params.get("geometryType", "esriGeometryEnvelope")
+    if kind == "esriGeometryEnvelope":
+        if geometry.lstrip().startswith("{"):
+            e = json.loads(geometry)
+            return shapely.box(e["xmin"], e["ymin"], e["xmax"], e["ymax"])
+        return shapely.box(*(float(v) for v in geometry.split(",")))
+    if kind == "esriGeometryPolygon":
+        # Esri rings: clockwise shells, counter-clockwise holes
+        shells, holes = [], []
+        for ring in json.loads(geometry)["rings"]:
+            ring = shapely.linearrings(np.asarray(ring, dtype=float))
+            (holes if shapely.is_ccw(ring) else shells).append(ring)
+        polygons = []
+        for shell in shells:
+            inside = [h for h in holes if shapely.contains(shapely.polygons(shell), h)]
+            polygons.append(shapely.polygons(shell, inside or None))
+        return shapely.make_valid(shapely.multipolygons(polygons))
+    raise QueryError(f"Unsupported geometryType {kind}")
+
+
+class ServiceLayer:
+    """One queryable layer: geometries, their index and pre-encoded attributes."""
+
+    def __init__(self, gdf, max_record_count=MAX_RECORD_COUNT):
+        self.max_record_count = max_record_count
+        self.geoms = gdf.geometry.to_numpy()
+        self.tree = shapely.STRtree(self.geoms)
+        self.oids = np.arange(1, len(gdf) + 1)
+        self.attrs = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+        records = self.attrs.astype(object).where(self.attrs.notna(), None).to_dict("records")
+        self.properties = [json.dumps({"OBJECTID": int(oid), **rec}, default=str) for oid, rec in zip(self.oids, records)]
+
+    def select(self, params):
+        """Row positions matching where, geometry and objectIds, in object ID order."""
+        rows = np.arange(len(self.geoms))
+        where = params.get("where", "1=1").strip()
+        if where and where != "1=1":
+            match = WHERE_IN.match(where) or WHERE_EQ.match(where)
+            if not match:
+                raise QueryError(f"Unsupported where clause: {where}")
+            column, values = match.groups()
+            values = [v.strip().strip("'") for v in values.split(",")]
+            columns = {c.lower(): c for c in self.attrs.columns}
+            if column.lower() not in columns:
+                raise QueryError(f"Unknown field {column}")
+            rows = rows[self.attrs[columns[column.lower()]].astype(str).isin(values).to_numpy()]
+
+        geometry = esri_geometry(params)
+        if geometry is not None:
+            rows = np.intersect1d(rows, self.tree.query(geometry, predicate="intersects"))
+
+        if params.get("objectIds"):
+            ids = np.array([int(i) for i in params["objectIds"].split(",")])
+            rows = np.intersect1d(rows, ids - 1)
+        return rows
+
+    def query(self, params):
+        rows = self.select(params)
+        if params.get("returnIdsOnly") == "true":
+            return {"objectIdFieldName": "OBJECTID", "objectIds": self.oids[rows].tolist()}
+        if params.get("returnCountOnly") == "true":
+            return {"count": int(len(rows))}
+        if params.get("f", "json") != "geojson":
+            raise QueryError("The stub only returns features as f=geojson")
+
+        offset = int(params.get("resultOffset", 0) or 0)
+        count = min(int(params.get("resultRecordCount", self.max_record_count) or self.max_record_count),
+                    self.max_record_count)
+        page = rows[offset:offset + count]
+        exceeded = offset + count < len(rows)
+
+        geoms = self.geoms[page]
+        if params.get("maxAllowableOffset"):
+            geoms = shapely.simplify(geoms, float(params["maxAllowableOffset"]))
+        if params.get("geometryPrecision"):
+            decimals = int(params["geometryPrecision"])
+            geoms = shapely.transform(geoms, lambda c: np.round(c, decimals))
+        features = ",".join(
+            f'{{"type":"Feature","id":{self.oids[row]},"geometry":{geometry},"properties":{self.properties[row]}}}'
+            for row, geometry in zip(page, shapely.to_geojson(geoms))
+        )
+        tail = ',"properties":{"exceededTransferLimit":true}' if exceeded else ""
+        return f'{{"type":"FeatureCollection","features":[{features}]{tail}}}'
+
+
+class StubServer:
+    """
+    Serves a World on 127.0.0.1 from a background thread. Use as a context
+    manager; config_urls() gives the URLS section pointing at it.
+    """
+
+    def __init__(self, world, port=0, latency=0.0, max_record_count=MAX_RECORD_COUNT):
+        self.world = world
+        self.latency = latency
+        self.layers = {key: ServiceLayer(gdf, max_record_count) for key, gdf in world.services().items()}
+        self.tiles = [(path, bounds, path.stat().st_size) for path, bounds in world.tiles()]
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), make_handler(self))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def service_url(self, key):
+        if key in NHD_LAYER_IDS:
+            return f"{self.url}/arcgis/rest/services/nhd/MapServer/{NHD_LAYER_IDS[key]}"
+        return f"{self.url}/arcgis/rest/services/{key}/FeatureServer/0"
+
+    def config_urls(self, feature_services):
+        """config['URLS'] for the stub; feature_services are the names config.yaml lists."""
+        return {
+            "Hunting_Districts": self.service_url(DISTRICT_SERVICE),
+            "NHD_MAPSERVER": f"{self.url}/arcgis/rest/services/nhd/MapServer",
+            "TNM_Products": f"{self.url}/api/v1/products",
+            "Feature_Services": [{"name": name, "url": self.service_url(name)} for name in feature_services],
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # -----------------------------
+    # ROUTES
+    # -----------------------------
+    def layer_for(self, path):
+        """ServiceLayer for a .../query path, or None."""
+        parts = path.strip("/").split("/")
+        if len(parts) < 6 or parts[:3] != ["arcgis", "rest", "services"] or parts[-1] != "query":
+            return None
+        if parts[3] == "nhd" and parts[4] == "MapServer":
+            key = {str(v): k for k, v in NHD_LAYER_IDS.items()}.get(parts[5])
+        else:
+            key = parts[3]
+        return self.layers.get(key)
+
+    def products(self, params):
+        """TNM products search: the tiles intersecting bbox, paged by offset/max."""
+        west, south, east, north = (float(v) for v in params["bbox"].split(","))
+        hits = [t for t in self.tiles if t[1][0] < east and t[1][2] > west and t[1][1] < north and t[1][3] > south]
+        offset, limit = int(params.get("offset", 0)), int(params.get("max", 50))
+        items = [{
+            "title": path.stem,
+            "format": "GeoTIFF",
+            "downloadURL": f"{self.url}/tiles/{path.name}",
+            "sizeInBytes": size,
+            "boundingBox": {"minX": b[0], "minY": b[1], "maxX": b[2], "maxY": b[3]},
+        } for path, b, size in hits[offset:offset + limit]]
+        return {"total": len(hits), "items": items}
+
+    def tile(self, name):
+        for path, _, size in self.tiles:
+            if path.name == name:
+                return path, size
+        return None, None
+
+
+def make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_body(self, status, body, content_type="application/json"):
+            if isinstance(body, dict):
+                body = json.dumps(body)
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def handle_request(self, params):
+            with server._lock:
+                server.requests += 1
+            if server.latency:
+                time.sleep(server.latency)
+
+            path = urlparse(self.path).path
+            layer = server.layer_for(path)
+            if layer is not None:
+                try:
+                    return self.send_body(200, layer.query(params))
+                except (QueryError, ValueError, KeyError) as e:
+                    # ArcGIS reports bad queries as 200 with an error payload
+                    return self.send_body(200, {"error": {"code": 400, "message": str(e)}})
+            if path == "/api/v1/products":
+                return self.send_body(200, server.products(params))
+            if path.startswith("/tiles/"):
+                return self.send_tile(path.rsplit("/", 1)[-1])
+            self.send_body(404, {"error": {"code": 404, "message": f"No route {path}"}})
+
+        def send_tile(self, name, head=False):
+            tile_path, size = server.tile(name)
+            if tile_path is None:
+                return self.send_body(404, b"", "text/plain")
+            start = 0
+            match = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+            if match:
+                start = int(match.group(1))
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "image/tiff")
+            self.send_header("Content-Length", str(size - start))
+            self.end_headers()
+            if head:
+                return
+            with open(tile_path, "rb") as f:
+                f.seek(start)
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    self.wfile.write(chunk)
+
+        def do_GET(self):
+            self.handle_request(dict(parse_qsl(urlparse(self.path).query)))
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            form = self.rfile.read(length).decode("utf-8")
+            params = dict(parse_qsl(urlparse(self.path).query))
+            params.update(parse_qsl(form))
+            self.handle_request(params)
+
+        def do_HEAD(self):
+            path = urlparse(self.path).path
+            if path.startswith("/tiles/"):
+                return self.send_tile(path.rsplit("/", 1)[-1], head=True)
+            self.send_response(405)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", type=Path, required=True, help="World directory (python -m benchmarks.synthetic)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    args = parser.parse_args()
+
+    with StubServer(World(args.data), args.port, args.latency) as stub:
+        print(f"Serving {args.data} on {stub.url}; URLS for config.yaml:")
+        print(json.dumps(stub.config_urls(sorted(k for k in stub.layers if k not in NHD_LAYER_IDS
+                                                and k != DISTRICT_SERVICE)), indent=2))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Benchmark suite: the pipeline end to end on synthetic districts, offline.
+
+Builds (or reuses) a synthetic world at the given scale (see
+benchmarks.synthetic), serves it from benchmarks.stub_server and runs
+get_data, terrain_derivatives, process_data and push_to_map through
+scripts.pipeline into a scratch directory, with run metrics on (see
+scripts.metrics). Layers are fetched and processed one at a time unless
+--parallel, so step times add up and stay comparable between runs.
+
+Reported per stage (wall, CPU, peak RSS, requests) and per step:
+
+  get_data.download      ArcGIS query paging, including the stub's answers
+  get_data.clip          clipping to the buffered district
+  terrain_derivatives.*  dem_download, slope, vectorize, write
+  process_data.*         standardize, topology, dissolve, export, write
+  kernels.remove_isolated_edges
+                         geometry_ops.remove_isolated_edges on the raw roads,
+                         trails and flowlines (process_data builds the
+                         topology instead, so it is timed on its own)
+
+Each run is appended to benchmarks/results/<scale>.jsonl with the commit it
+ran on and compared with the latest run of the same settings on this machine
+from another commit. Times that grew past --threshold are flagged; --check
+exits non-zero if any did.
+
+Usage (from the Processing dir):
+    python -m benchmarks.suite
+    python -m benchmarks.suite --scale ten --latency 0.02
+    python -m benchmarks.suite --scale statewide --density 0.5 --check
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+
+from benchmarks.stub_server import StubServer
+from benchmarks.synthetic import SCALES, build
+from scripts import geometry_ops, layer_io, metrics, pipeline
+
+PROCESSING_DIR = Path(__file__).parent.parent
+RESULTS_DIR = Path(__file__).parent / "results"
+NETWORK_LAYERS = ("mt_roads", "fs_trails", "nhd_flowline")
+STAGES = ("get_data", "terrain_derivatives", "process_data", "push_to_map")
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=PROCESSING_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def suite_config(stub, world, work_dir, args):
+    with open(PROCESSING_DIR / "config.yaml") as f:
+        config = yaml.safe_load(f)
+
+    config["steps"] = {stage: True for stage in STAGES}
+    config["environment"].update(
+        raw_data_dir=str(work_dir / "Raw"), processed_data_dir=str(work_dir / "Processed"),
+        map_data_dir=str(work_dir / "map"),
+    )
+    config["URLS"] = stub.config_urls([s["name"] for s in config["URLS"]["Feature_Services"]])
+    config["unit"]["District_ID"] = world.aoi_name
+    config["cache"] = {"enabled": False}
+    config.setdefault("access", {})["enabled"] = args.access
+    if not args.parallel:
+        config["acquisition"]["max_workers"] = 1
+        config["processing"]["max_processes"] = 1
+    return config
+
+
+def remove_isolated_edges_seconds(raw_dir):
+    seconds = 0.0
+    for name in NETWORK_LAYERS:
+        path = layer_io.find_layer(raw_dir, name)
+        if path is None:
+            continue
+        gdf = layer_io.read_layer(path)
+        start = time.perf_counter()
+        geometry_ops.remove_isolated_edges(gdf)
+        seconds += time.perf_counter() - start
+    return seconds
+
+
+def run_suite(args):
+    world_dir = args.data or Path(tempfile.gettempdir()) / "hunt-benchmarks" / f"{args.scale}-d{args.density:g}-s{args.seed}"
+    start = time.perf_counter()
+    world = build(args.scale, world_dir, args.density, args.seed)
+    print(f"World {world_dir} ready in {time.perf_counter() - start:.1f}s: "
+          + ", ".join(f"{k} {v}" for k, v in world.meta["features"].items()))
+
+    with tempfile.TemporaryDirectory() as tmp, StubServer(world, latency=args.latency) as stub:
+        work_dir = Path(tmp)
+        config = suite_config(stub, world, work_dir, args)
+        log_path = work_dir / "pipeline.log"
+        print(f"Running the pipeline against {stub.url}...")
+
+        run = metrics.start_run()
+        start = time.perf_counter()
+        with open(log_path, "w") as log, contextlib.redirect_stdout(sys.stdout if args.verbose else log):
+            report = pipeline.run(config, force=True)
+            with metrics.stage("kernels"):
+                run.stage["steps"]["remove_isolated_edges"] = remove_isolated_edges_seconds(work_dir / "Raw")
+        total = time.perf_counter() - start
+
+        failed = [name for name, status in report if status not in ("rebuilt", "up to date")]
+        if failed:
+            print(f"Failed or missing targets: {', '.join(failed)}")
+        return record(args, world, run, total, stub.requests, failed)
+
+
+def record(args, world, run, total, stub_requests, failed):
+    stages, steps = {}, {}
+    for name, stage in run.stages.items():
+        stages[name] = {k: stage[k] for k in ("wall_s", "cpu_s", "peak_rss_mb", "http_requests", "http_bytes", "features")}
+        for step, seconds in stage["steps"].items():
+            steps[f"{name}.{step}"] = seconds
+    return metrics.rounded({
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "settings": {"scale": args.scale, "density": args.density, "seed": args.seed,
+                     "latency": args.latency, "parallel": args.parallel, "access": args.access},
+        "machine": {"node": platform.node(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "features": world.meta["features"],
+        "stub_requests": stub_requests,
+        "failed": failed,
+        "total_s": total,
+        "stages": stages,
+        "steps": steps,
+    })
+
+
+# -----------------------------
+# RESULTS
+# -----------------------------
+def load_results(path):
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline_for(current, history, commit=None):
+    """The latest run with the same settings on this machine from another (or the given) commit."""
+    for past in reversed(history):
+        if past["settings"] != current["settings"] or past["machine"]["node"] != current["machine"]["node"]:
+            continue
+        if commit is not None:
+            if (past["commit"] or "").startswith(commit):
+                return past
+        elif past["commit"] != current["commit"]:
+            return past
+    return None
+
+
+def timings(result):
+    out = {"total": result["total_s"]}
+    out.update({f"stage {name}": stage["wall_s"] for name, stage in result["stages"].items()})
+    out.update(result["steps"])
+    return out
+
+
+def compare(current, baseline, threshold, min_seconds):
+    """Prints current against baseline; returns the names that got slower past threshold."""
+    now, before = timings(current), timings(baseline)
+    print(f"\nAgainst {(baseline['commit'] or '?')[:10]} ({baseline['date']}):")
+    print(f"  {'':<40} {'before':>8} {'now':>8} {'change':>8}")
+    slower = []
+    for name in now:
+        if name not in before:
+            print(f"  {name:<40} {'':>8} {now[name]:8.2f}      new")
+            continue
+        change = (now[name] - before[name]) / before[name] if before[name] else 0.0
+        flag = ""
+        if change > threshold and now[name] - before[name] > min_seconds:
+            flag = "  SLOWER"
+            slower.append(name)
+        print(f"  {name:<40} {before[name]:8.2f} {now[name]:8.2f} {change:+7.0%}{flag}")
+    return slower
+
+
+def print_result(result):
+    print(f"\n  {'stage':<22} {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'requests':>9} {'features':>9}")
+    for name, s in result["stages"].items():
+        features = "" if s["features"] is None else s["features"]
+        print(f"  {name:<22} {s['wall_s']:8.2f} {s['cpu_s']:8.2f} {s['peak_rss_mb'] or 0:8.0f} "
+              f"{s['http_requests']:9d} {features:>9}")
+    print(f"\n  {'step':<40} {'seconds':>8}")
+    for name, seconds in sorted(result["steps"].items(), key=lambda kv: kv[1], reverse=True):
+        print(f"  {name:<40} {seconds:8.2f}")
+    print(f"\nTotal {result['total_s']:.1f}s, {result['stub_requests']} requests to the stub")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(SCALES), default="district")
+    parser.add_argument("--density", type=float, default=1.0, help="Features per district multiplier")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data", type=Path, help="World directory (default: one per scale in the temp dir)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the stub adds to every request")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Keep config.yaml's worker/process counts instead of running one layer at a time")
+    parser.add_argument("--access", action="store_true", help="Also build the access layers (needs scipy)")
+    parser.add_argument("--results", type=Path, default=RESULTS_DIR, help="Where <scale>.jsonl results are kept")
+    parser.add_argument("--no-save", action="store_true", help="Don't append this run to the results")
+    parser.add_argument("--baseline", help="Commit (prefix) to compare with instead of the latest other one")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Relative slowdown that counts as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if anything got slower past the threshold")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's output")
+    args = parser.parse_args()
+
+    result = run_suite(args)
+    print_result(result)
+
+    results_path = args.results / f"{args.scale}.jsonl"
+    history = load_results(results_path)
+    if not args.no_save:
+        args.results.mkdir(parents=True, exist_ok=True)
+        with open(results_path, "a") as f:
+            f.write(json.dumps(result) + "\n")
+        print(f"Saved to {results_path}")
+
+    baseline = baseline_for(result, history, args.baseline)
+    if baseline is None:
+        print("No earlier run with these settings to compare with.")
+        return
+    slower = compare(result, baseline, args.threshold, args.min_seconds)
+    if slower and args.check:
+        sys.exit(f"{len(slower)} timing(s) regressed: {', '.join(slower)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Synthetic districts for the benchmark suite.
+
+Builds hunting districts laid out on a grid in western Montana, the layers
+get_data downloads for them, and 1 x 1 degree DEM tiles:
+
+  roads, trails, NHD flowlines  line networks (nodes joined to their
+                                neighbours) plus a few isolated segments
+  parcels, public lands         a jittered grid that tiles the land, so the
+                                parcel dissolve and coverage simplification
+                                see a real coverage
+  NHD areas and waterbodies,    scattered polygons
+  sheep distribution
+  DEM                           smooth ridges plus short, steep ones, so
+                                there is a slope mask to vectorize
+
+Scales (feature counts are per district, so they grow with the area):
+
+  district   1 district (~40 x 40 km), 1 arc-second DEM
+  ten        10 districts (5 x 2), 2 arc-second DEM
+  statewide  60 districts (10 x 6), 6 arc-second DEM
+
+Everything comes from the seed, so a scale is the same data on every run and
+machine. Attribute names match what field_mappings.json maps from the real
+services. A built world is kept in a directory (services/*.parquet, tiles/,
+world.json) and reused.
+
+Usage (from the Processing dir), to build one and look at it:
+    python -m benchmarks.synthetic --scale district --out /tmp/synthetic
+"""
+import argparse
+import json
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+import shapely
+from rasterio.transform import from_origin
+
+
+ORIGIN = (-113.75, 46.1)      # south-west corner of the district grid
+DISTRICT_SIZE = (0.5, 0.35)   # degrees (lon, lat)
+FIRST_DISTRICT = 100
+DEM_NODATA = -999999.0
+
+# District grid and DEM resolution per scale
+SCALES = {
+    "district": {"cols": 1, "rows": 1, "dem_arcsec": 1.0},
+    "ten": {"cols": 5, "rows": 2, "dem_arcsec": 2.0},
+    "statewide": {"cols": 10, "rows": 6, "dem_arcsec": 6.0},
+}
+
+# Features per district at density 1
+PER_DISTRICT = {"roads": 3000, "trails": 800, "flowlines": 2000, "waterbodies": 150, "areas": 40, "distribution": 6}
+PARCEL_CELL = 0.004  # degrees at density 1
+LAYER_MARGIN = 0.06  # degrees the layers extend past the districts
+
+# Service keys the stub server publishes (see benchmarks.stub_server)
+DISTRICT_SERVICE = "Hunting_Districts"
+NHD_LAYER_IDS = {"nhd_flowline": 6, "nhd_area": 9, "nhd_waterbody": 12}
+
+
+class World:
+    """A built scale: the district layer, service layers and DEM tiles on disk."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        with open(self.root / "world.json") as f:
+            self.meta = json.load(f)
+
+    @property
+    def aoi_name(self):
+        """District NAME the single-district pipeline runs on (the union of all of them when there are several)."""
+        return self.meta["aoi_name"]
+
+    @property
+    def district_names(self):
+        return self.meta["districts"]
+
+    def services(self):
+        """{service key: GeoDataFrame}, districts included."""
+        return {path.stem: gpd.read_parquet(path) for path in sorted((self.root / "services").glob("*.parquet"))}
+
+    def tiles(self):
+        """[(path, (west, south, east, north))] for every DEM tile."""
+        return [(self.root / "tiles" / t["name"], tuple(t["bounds"])) for t in self.meta["tiles"]]
+
+
+# -----------------------------
+# GEOMETRY
+# -----------------------------
+def wobble(coords, amplitude):
+    """Smooth displacement of (n, 2) lon/lat coords; shared vertices move together."""
+    x, y = coords[:, 0], coords[:, 1]
+    dx = amplitude * np.sin(x * 37.0 + y * 11.0) * np.cos(y * 23.0)
+    dy = amplitude * np.cos(x * 29.0 - y * 17.0) * np.sin(x * 13.0)
+    return np.column_stack([x + dx, y + dy])
+
+
+def noise(x, y, seed):
+    """Smooth field in about [-1, 1] used to pick land use."""
+    phase = (seed % 97) * 0.37
+    return (np.sin(x * 9.0 + phase) * np.cos(y * 13.0 - phase)
+            + 0.5 * np.sin(x * 31.0 - y * 27.0 + phase)) / 1.5
+
+
+def districts(cols, rows):
+    boxes, names = [], []
+    for row in range(rows):
+        for col in range(cols):
+            west = ORIGIN[0] + col * DISTRICT_SIZE[0]
+            south = ORIGIN[1] + row * DISTRICT_SIZE[1]
+            boxes.append(shapely.box(west, south, west + DISTRICT_SIZE[0], south + DISTRICT_SIZE[1]))
+            names.append(str(FIRST_DISTRICT + len(names)))
+    # Densified identically, so neighbours share their wobbled edges
+    geoms = shapely.transform(shapely.segmentize(np.array(boxes), 0.01), lambda c: wobble(c, 0.004))
+    return gpd.GeoDataFrame({
+        "NAME": names,
+        "HD_ID": names,
+        "SPECIES": "Bighorn Sheep",
+    }, geometry=geoms, crs=4326)
+
+
+def network(rng, bounds, n_edges, vertices, wiggle):
+    """
+    About n_edges lines joining random nodes to the nodes within reach
+    (three neighbours on average), so most lines share endpoints.
+    """
+    west, south, east, north = bounds
+    n_nodes = max(int(n_edges / 1.5), 4)
+    nodes = np.column_stack([rng.uniform(west, east, n_nodes), rng.uniform(south, north, n_nodes)])
+    reach = np.sqrt(3.0 * (east - west) * (north - south) / (np.pi * n_nodes))
+
+    points = shapely.points(nodes)
+    a, b = shapely.STRtree(points).query(points, predicate="dwithin", distance=reach)
+    keep = a < b
+    a, b = a[keep], b[keep]
+
+    t = np.linspace(0.0, 1.0, vertices + 2)
+    start, end = nodes[a][:, None, :], nodes[b][:, None, :]
+    along = end - start
+    normal = np.stack([-along[..., 1], along[..., 0]], axis=-1)
+    bend = wiggle * np.sin(np.pi * t * rng.integers(1, 4, len(a))[:, None]) * rng.uniform(-1, 1, len(a))[:, None]
+    coords = start + t[None, :, None] * along + bend[..., None] * normal
+    return shapely.linestrings(coords)
+
+
+def isolated_segments(rng, bounds, n, length=0.0005):
+    west, south, east, north = bounds
+    x, y = rng.uniform(west, east, n), rng.uniform(south, north, n)
+    angle = rng.uniform(0, np.pi, n)
+    coords = np.stack([np.column_stack([x, y]),
+                       np.column_stack([x + length * np.cos(angle), y + length * np.sin(angle)])], axis=1)
+    return shapely.linestrings(coords)
+
+
+def blobs(rng, bounds, n, min_radius, max_radius):
+    west, south, east, north = bounds
+    centers = shapely.points(rng.uniform(west, east, n), rng.uniform(south, north, n))
+    geoms = shapely.buffer(centers, rng.uniform(min_radius, max_radius, n), quad_segs=8)
+    return shapely.transform(geoms, lambda c: wobble(c, min_radius * 0.3))
+
+
+def land_grid(rng, bounds, cell, seed):
+    """
+    A jittered grid of cells over bounds: (cells, i, j, field) where field is
+    the land-use noise at each cell center.
+    """
+    west, south, east, north = bounds
+    nx, ny = int(np.ceil((east - west) / cell)), int(np.ceil((north - south) / cell))
+    gx, gy = np.meshgrid(west + np.arange(nx + 1) * cell, south + np.arange(ny + 1) * cell)
+    # Inner nodes move; the outer ones stay on the bounds
+    jitter = rng.uniform(-0.3, 0.3, (2,) + gx.shape) * cell
+    jitter[:, 0, :] = jitter[:, -1, :] = jitter[:, :, 0] = jitter[:, :, -1] = 0
+    gx, gy = gx + jitter[0], gy + jitter[1]
+
+    j, i = np.meshgrid(np.arange(ny), np.arange(nx), indexing="ij")
+    i, j = i.ravel(), j.ravel()
+    corners = [(j, i), (j, i + 1), (j + 1, i + 1), (j + 1, i), (j, i)]
+    coords = np.stack([np.column_stack([gx[r, c], gy[r, c]]) for r, c in corners], axis=1)
+    cells = shapely.polygons(coords)
+    field = noise(west + (i + 0.5) * cell, south + (j + 0.5) * cell, seed)
+    return cells, i, j, field
+
+
+# -----------------------------
+# LAYERS
+# -----------------------------
+def pick(rng, values, n, missing=0.0):
+    out = rng.choice(np.array(values, dtype=object), n)
+    out[rng.random(n) < missing] = None
+    return out
+
+
+def lines_layer(rng, bounds, n_edges, vertices, wiggle, attrs):
+    geoms = np.concatenate([
+        network(rng, bounds, n_edges, vertices, wiggle),
+        isolated_segments(rng, bounds, max(n_edges // 20, 1)),
+    ])
+    data = {name: pick(rng, values, len(geoms), missing) for name, (values, missing) in attrs.items()}
+    return gpd.GeoDataFrame(data, geometry=geoms, crs=4326)
+
+
+def land_layers(rng, bounds, cell, seed):
+    """(parcels, public lands): private cells become parcels, public ones merge into blocks."""
+    cells, i, j, field = land_grid(rng, bounds, cell, seed)
+    private = field > -0.2
+
+    n = int(private.sum())
+    # Owners hold runs of neighbouring cells; a few big owners are scattered
+    owner_key = (i[private] // 3) * 100_003 + j[private] // 2
+    _, owner = np.unique(owner_key, return_inverse=True)
+    owner = rng.permutation(owner.max() + 1)[owner]
+    big = rng.random(n) < 0.05
+    owner[big] = owner.max() + 1 + rng.integers(0, 20, big.sum())
+    parcels = gpd.GeoDataFrame({
+        "OwnerName": [f"Owner {o:06d}" for o in owner],
+        "TotalValue": rng.integers(5_000, 2_000_000, n),
+    }, geometry=cells[private], crs=4326)
+
+    block = (i[~private] // 8) * 100_003 + j[~private] // 8
+    public = pd.DataFrame({"block": block, "cell": np.flatnonzero(~private)})
+    geoms = [shapely.coverage_union_all(cells[group]) for group in public.groupby("block")["cell"].agg(list)]
+    m = len(geoms)
+    public_lands = gpd.GeoDataFrame({
+        "SITETYPE": pick(rng, ["Federal", "State", "FWP"], m),
+        "SITENAME": pick(rng, ["USFS", "BLM", "DNRC", "FWP WMA"], m),
+        "PUBLIC_ACCESS": pick(rng, ["Open", "Restricted"], m),
+    }, geometry=geoms, crs=4326)
+    return parcels, public_lands
+
+
+def polygon_layer(rng, geoms, attrs):
+    data = {name: pick(rng, values, len(geoms), missing) for name, (values, missing) in attrs.items()}
+    return gpd.GeoDataFrame(data, geometry=geoms, crs=4326)
+
+
+def service_layers(district_gdf, density, seed):
+    """{service key: GeoDataFrame} for every service get_data queries."""
+    rng = np.random.default_rng(seed)
+    # Layers run past the districts, so the AOI filter and clip have work to do
+    west, south, east, north = district_gdf.total_bounds
+    bounds = (west - LAYER_MARGIN, south - LAYER_MARGIN, east + LAYER_MARGIN, north + LAYER_MARGIN)
+    area = (bounds[2] - bounds[0]) * (bounds[3] - bounds[1]) / (DISTRICT_SIZE[0] * DISTRICT_SIZE[1])
+    count = {k: max(int(v * density * area), 1) for k, v in PER_DISTRICT.items()}
+    names = [f"{a} {b}" for a in ("Elk", "Bear", "Sheep", "Ridge", "Cabin", "Spring") for b in ("Creek", "Road", "Trail")]
+
+    layers = {}
+    layers["MT_Roads"] = lines_layer(rng, bounds, count["roads"], 6, 0.05, {
+        "LSt_Name": (names, 0.3), "ROADCLASS": (["Local", "Collector", "Forest"], 0.0),
+        "SURFACE": (["Paved", "Gravel", "Dirt"], 0.1), "ACCESS": (["Y", "N", "OPEN", "CLOSED"], 0.1),
+    })
+    layers["FS_Trails"] = lines_layer(rng, bounds, count["trails"], 20, 0.15, {
+        "TRAIL_NAME": (names, 0.2), "TRAIL_TYPE": (["TERRA", "SNOW"], 0.0),
+        "TERRA_MOTORIZED": (["Y", "N"], 0.2), "SNOW_MOTORIZED": (["Y", "N"], 0.5),
+    })
+    flowlines = lines_layer(rng, bounds, count["flowlines"], 12, 0.2, {"GNIS_NAME": (names, 0.6)})
+    layers["nhd_flowline"] = flowlines
+    layers["nhd_area"] = polygon_layer(
+        rng, shapely.buffer(rng.choice(flowlines.geometry.values, count["areas"]), 0.0008),
+        {"GNIS_NAME": (names, 0.5), "FTYPE": ([460, 336, 484], 0.0)})
+    layers["nhd_waterbody"] = polygon_layer(
+        rng, blobs(rng, bounds, count["waterbodies"], 0.0005, 0.003), {"GNIS_NAME": (names, 0.5)})
+    layers["BHS_Distribution"] = polygon_layer(
+        rng, blobs(rng, bounds, count["distribution"], 0.03, 0.12), {"USETYPE": (["G", "GW"], 0.0)})
+    layers["Parcels"], layers["Public_Lands"] = land_layers(rng, bounds, PARCEL_CELL / np.sqrt(density), seed)
+    return layers
+
+
+# -----------------------------
+# DEM
+# -----------------------------
+def elevation(lon, lat):
+    """Meters: broad ridges plus short steep ones (slopes past 45 degrees)."""
+    return (1800.0
+            + 600.0 * np.sin(lon * 7.0) * np.cos(lat * 9.0)
+            + 300.0 * np.sin(lon * 23.0 + 1.0) * np.sin(lat * 19.0)
+            + 250.0 * np.sin(lon * 500.0) * np.cos(lat * 430.0)).astype(np.float32)
+
+
+def write_dem_tiles(bounds, arcsec, out_dir):
+    """1 x 1 degree float32 tiles (TNM naming) covering bounds. Returns [(name, bounds)]."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    res = arcsec / 3600.0
+    size = int(round(1.0 / res))
+    tiles = []
+    for lon in range(int(np.floor(bounds[0])), int(np.ceil(bounds[2]))):
+        for lat in range(int(np.floor(bounds[1])), int(np.ceil(bounds[3]))):
+            name = f"USGS_{arcsec:g}_n{lat + 1}w{abs(lon):03d}.tif"
+            cols = lon + (np.arange(size) + 0.5) * res
+            rows = lat + 1 - (np.arange(size) + 0.5) * res
+            dem = elevation(cols[None, :], rows[:, None])
+            profile = {
+                "driver": "GTiff", "width": size, "height": size, "count": 1, "dtype": "float32",
+                "crs": "EPSG:4269", "transform": from_origin(lon, lat + 1, res, res), "nodata": DEM_NODATA,
+                "compress": "deflate", "tiled": True, "blockxsize": 256, "blockysize": 256,
+            }
+            with rasterio.open(out_dir / name, "w", **profile) as dst:
+                dst.write(dem, 1)
+            tiles.append({"name": name, "bounds": [lon, lat, lon + 1, lat + 1]})
+    return tiles
+
+
+# -----------------------------
+# BUILD
+# -----------------------------
+def build(scale, out_dir, density=1.0, seed=0):
+    """Builds scale into out_dir (reused if it is already there) and returns its World."""
+    out_dir = Path(out_dir)
+    if (out_dir / "world.json").exists():
+        return World(out_dir)
+
+    spec = SCALES[scale]
+    district_gdf = districts(spec["cols"], spec["rows"])
+    layers = service_layers(district_gdf, density, seed)
+
+    names = list(district_gdf["NAME"])
+    aoi_name = names[0]
+    if len(names) > 1:
+        # One district covering them all, so a single-district run sees the whole scale
+        aoi_name = "ALL"
+        union = gpd.GeoDataFrame({"NAME": [aoi_name], "HD_ID": [aoi_name], "SPECIES": ["Bighorn Sheep"]},
+                                 geometry=[shapely.coverage_union_all(district_gdf.geometry.values)], crs=4326)
+        district_gdf = pd.concat([district_gdf, union], ignore_index=True)
+    layers[DISTRICT_SERVICE] = district_gdf
+
+    (out_dir / "services").mkdir(parents=True, exist_ok=True)
+    for key, gdf in layers.items():
+        gdf.to_parquet(out_dir / "services" / f"{key}.parquet")
+
+    # Tiles cover the districts plus the buffer the pipeline adds
+    west, south, east, north = district_gdf.total_bounds
+    tiles = write_dem_tiles((west - 0.05, south - 0.05, east + 0.05, north + 0.05), spec["dem_arcsec"],
+                            out_dir / "tiles")
+
+    meta = {"scale": scale, "density": density, "seed": seed, "aoi_name": aoi_name,
+            "districts": names, "tiles": tiles,
+            "features": {key: len(gdf) for key, gdf in layers.items()}}
+    with open(out_dir / "world.json", "w") as f:
+        json.dump(meta, f, indent=2)
+    return World(out_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="district")
+    parser.add_argument("--density", type=float, default=1.0, help="Features per district multiplier")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args()
+
+    world = build(args.scale, args.out, args.density, args.seed)
+    for key, n in world.meta["features"].items():
+        print(f"  {key:<20} {n:9d}")
+    print(f"  {len(world.meta['tiles'])} DEM tiles in {args.out / 'tiles'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Raster-to-vector benchmark: legacy vectorize_raster + gpd.clip vs vectorize_classes.
+
+The input is a speckled synthetic slope mask (the worst case for polygon
+counts: lots of single-pixel regions along every slope break) on a lat/lon
+grid, clipped to a circular AOI. Reports wall time, polygon and feature counts
+and output GeoJSON size for each path.
+
+Usage (from the Processing dir):
+    python -m benchmarks.vectorize
+    python -m benchmarks.vectorize --size 4000 --sieve 5000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+from rasterio.crs import CRS
+from rasterio.transform import from_origin
+from shapely.geometry import Point
+
+from scripts.terrain_derivatives import (
+    save_clipped, sieve_pixels, slope_props, vectorize_classes, vectorize_raster,
+)
+
+
+def synthetic_mask(size, res_deg=1 / 3600, west=-113.5, north=47.0, seed=0):
+    """Smooth slope field plus per-pixel noise, thresholded at 45 degrees."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size] / size * 12
+    slope = 40 + 12 * np.sin(x) * np.cos(y * 1.3) + rng.normal(0, 4, (size, size))
+    mask = (slope > 45).astype(np.uint8)
+    transform = from_origin(west, north, res_deg, res_deg)
+    center = (west + size * res_deg / 2, north - size * res_deg / 2)
+    aoi = Point(center).buffer(size * res_deg * 0.45)
+    return mask, transform, CRS.from_epsg(4326), aoi
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=2000, help="Raster width/height in pixels")
+    parser.add_argument("--sieve", type=float, default=2000, help="sieve_min_area_m2 for the fast path")
+    args = parser.parse_args()
+
+    mask, transform, crs, aoi = synthetic_mask(args.size)
+    print(f"Mask: {args.size} x {args.size}, {mask.mean() * 100:.1f}% steep")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        start = time.perf_counter()
+        legacy = vectorize_raster(mask, transform, crs, "slope_class", slope_props)
+        n_legacy = len(legacy)
+        save_clipped(legacy, aoi, tmp / "legacy.geojson")
+        t_legacy = time.perf_counter() - start
+
+        results = [("legacy", t_legacy, n_legacy, n_legacy, tmp / "legacy.geojson")]
+        for label, area in (("fast", 0), ("fast + sieve", args.sieve)):
+            start = time.perf_counter()
+            min_pixels = sieve_pixels(area, transform, mask.shape, crs)
+            fast = vectorize_classes(mask, transform, crs, "slope_class", slope_props, aoi, min_pixels)
+            out = tmp / f"{label.replace(' + ', '_')}.geojson"
+            fast.to_file(out, driver="GeoJSON")
+            elapsed = time.perf_counter() - start
+            n_polys = int(sum(len(g.geoms) for g in fast.geometry))
+            results.append((label, elapsed, n_polys, len(fast), out))
+
+        print(f"\n  {'path':<14} {'seconds':>8} {'polygons':>9} {'features':>9} {'MB':>7}")
+        for label, seconds, n_polys, n_features, out in results:
+            mb = out.stat().st_size / (1024 * 1024)
+            print(f"  {label:<14} {seconds:8.2f} {n_polys:9d} {n_features:9d} {mb:7.2f}")
+
+        ref = gpd.read_file(tmp / "legacy.geojson").to_crs(32612).area.sum()
+        fast = gpd.read_file(tmp / "fast.geojson").to_crs(32612).area.sum()
+        print(f"\nArea difference fast vs legacy (pixel-edge AOI vs exact clip): {(fast - ref) / ref * 100:+.2f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Access-distance terrain derivatives.
+
+Rasterizes the access network (roads and trails) onto the DEM grid and derives:
+
+- access_distance: straight-line distance to the nearest road/trail cell, from
+  an exact Euclidean distance transform, measured with per-row cell sizes in
+  meters on lat/lon grids
+- access_time (optional): slope-weighted walking time from access, from a
+  multi-source Dijkstra (heap-based cost-distance) over an 8-connected grid
+  aggregated to access.cost_cell_m, with Tobler's hiking function as the
+  per-cell speed
+
+Both are classified into bands and vectorized like the elevation bands.
+Requires scipy (ndimage for the distance transform, sparse.csgraph for the
+cost-distance).
+"""
+import time
+
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.features import rasterize
+
+from scripts import layer_io, metrics
+from scripts.terrain_derivatives import (
+    bounds_window, cell_size_meters, compute_slope_degrees, geodesic_row_res, is_geographic, write_classes,
+)
+
+
+METERS_PER_MILE = 1609.344
+DEFAULT_LAYERS = ("mt_roads", "fs_trails")
+DEFAULT_DISTANCE_BANDS_MI = (0.25, 0.5, 1.0, 2.0, 3.0)
+DEFAULT_TIME_BANDS_MIN = (15, 30, 60, 120)
+
+
+def read_dem(dem_path, buffered_geom):
+    """DEM window covering the AOI as float32 with nodata as NaN, plus its transform and CRS."""
+    with rasterio.open(dem_path) as src:
+        window = bounds_window(src, buffered_geom.bounds)
+        dem = src.read(1, window=window).astype(np.float32)
+        transform, crs, nodata = src.window_transform(window), src.crs, src.nodata
+    if nodata is not None:
+        dem[dem == nodata] = np.nan
+    return dem, transform, crs
+
+
+def rasterize_access(access_gdfs, shape, transform, crs):
+    """Boolean grid of cells touched by any access line."""
+    geoms = []
+    for gdf in access_gdfs:
+        if gdf is not None and not gdf.empty:
+            geoms.extend(g for g in gdf.to_crs(crs).geometry if g is not None and not g.is_empty)
+    if not geoms:
+        return np.zeros(shape, dtype=bool)
+    burned = rasterize(((g, 1) for g in geoms), out_shape=shape, transform=transform,
+                       fill=0, all_touched=True, dtype="uint8")
+    return burned.astype(bool)
+
+
+def distance_from_access(access, transform, crs):
+    """
+    Meters from each cell to the nearest access cell. On a lat/lon grid the
+    distance transform only picks the nearest access cell (using the center
+    row's cell size); the distance to it is then measured with the per-row
+    cell sizes, so cells far north or south of the center don't carry the
+    center latitude's east-west scale.
+    """
+    from scipy import ndimage
+
+    if not access.any():
+        return np.full(access.shape, np.nan, dtype=np.float32)
+    xres, yres = cell_size_meters(transform, access.shape, crs)
+    if not is_geographic(transform, crs):
+        return ndimage.distance_transform_edt(~access, sampling=(yres, xres)).astype(np.float32)
+
+    near_row, near_col = ndimage.distance_transform_edt(
+        ~access, sampling=(yres, xres), return_distances=False, return_indices=True)
+    n_rows, n_cols = access.shape
+    row_x, row_y = geodesic_row_res(transform, n_rows)
+    # Meters from the first row's center to each row's center
+    northing = np.concatenate(([0.0], np.cumsum(0.5 * (row_y[:-1] + row_y[1:]), dtype=np.float64)))
+    rows = np.arange(n_rows)[:, None]
+    # East-west: the column offset at the mean cell width of the two rows
+    dx = (near_col - np.arange(n_cols)[None, :]) * (0.5 * (row_x[rows] + row_x[near_row]))
+    dy = (northing[near_row] - northing[rows]).astype(np.float32)
+    return np.hypot(dx, dy).astype(np.float32)
+
+
+def aggregate(dem, access, factor):
+    """Block-averages the DEM and ORs the access mask by factor x factor cells."""
+    rows, cols = (dem.shape[0] // factor) * factor, (dem.shape[1] // factor) * factor
+    shape = (rows // factor, factor, cols // factor, factor)
+    blocks = dem[:rows, :cols].reshape(shape)
+    valid = ~np.isnan(blocks)
+    count = valid.sum(axis=(1, 3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        coarse = np.where(valid, blocks, 0).sum(axis=(1, 3)) / count
+    coarse[count == 0] = np.nan
+    return coarse.astype(np.float32), access[:rows, :cols].reshape(shape).any(axis=(1, 3))
+
+
+def tobler_minutes_per_meter(slope_deg):
+    """Walking pace from Tobler's hiking function (6 e^(-3.5|tan s + 0.05|) km/h)."""
+    speed_kmh = 6.0 * np.exp(-3.5 * np.abs(np.tan(np.radians(slope_deg)) + 0.05))
+    return 60.0 / (speed_kmh * 1000.0)
+
+
+def travel_minutes(dem, transform, crs, access, cell_m=60.0, max_slope_deg=60.0):
+    """
+    Minutes of walking from the nearest access cell, on a grid aggregated to
+    about cell_m. Cells steeper than max_slope_deg (or without DEM data) are
+    impassable. Returns an array on the DEM grid (NaN = unreachable).
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import dijkstra
+
+    xres, yres = cell_size_meters(transform, dem.shape, crs)
+    factor = max(1, int(round(2 * cell_m / (xres + yres))))
+    coarse, sources = aggregate(dem, access, factor)
+    coarse_transform = transform * Affine.scale(factor)
+    n_rows, n_cols = coarse.shape
+
+    slope = compute_slope_degrees(coarse, coarse_transform, None, crs=crs, per_row=True)
+    pace = tobler_minutes_per_meter(slope)
+    pace[~(slope <= max_slope_deg)] = np.nan  # NaN slope or too steep
+
+    if is_geographic(coarse_transform, crs):
+        row_x, row_y = geodesic_row_res(coarse_transform, n_rows)
+    else:
+        row_x = np.full(n_rows, abs(coarse_transform.a), dtype=np.float32)
+        row_y = np.full(n_rows, abs(coarse_transform.e), dtype=np.float32)
+
+    # Undirected 8-neighbour edges: E, S, SE, SW. Cost = step length x mean pace.
+    index = np.arange(n_rows * n_cols).reshape(n_rows, n_cols)
+    flat_pace = pace.ravel()
+    src_parts, dst_parts, w_parts = [], [], []
+    for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        c0, c1 = max(0, -dc), n_cols - max(0, dc)
+        a = index[:n_rows - dr, c0:c1]
+        b = index[dr:, c0 + dc:c1 + dc]
+        rows = np.broadcast_to(np.arange(a.shape[0])[:, None], a.shape)
+        step = np.hypot(row_x[rows] * abs(dc), row_y[rows] * dr)
+        cost = step * 0.5 * (flat_pace[a] + flat_pace[b])
+        ok = np.isfinite(cost)
+        src_parts.append(a[ok])
+        dst_parts.append(b[ok])
+        w_parts.append(cost[ok])
+
+    n = n_rows * n_cols
+    graph = coo_matrix((np.concatenate(w_parts), (np.concatenate(src_parts), np.concatenate(dst_parts))),
+                       shape=(n, n)).tocsr()
+    source_idx = np.flatnonzero(sources.ravel() & np.isfinite(flat_pace))
+    if not len(source_idx):
+        return np.full(dem.shape, np.nan, dtype=np.float32)
+
+    minutes = dijkstra(graph, directed=False, indices=source_idx, min_only=True).reshape(n_rows, n_cols)
+    minutes[np.isinf(minutes)] = np.nan
+
+    # Back onto the DEM grid; the trimmed edge rows/cols take the nearest block
+    full = np.repeat(np.repeat(minutes, factor, axis=0), factor, axis=1)
+    pad = ((0, dem.shape[0] - full.shape[0]), (0, dem.shape[1] - full.shape[1]))
+    return np.pad(full, pad, mode="edge").astype(np.float32)
+
+
+def band_classes(values, edges):
+    """1 for values < edges[0], ..., len(edges) + 1 past the last edge, 0 for NaN."""
+    classes = (np.digitize(values, edges) + 1).astype(np.uint8)
+    classes[np.isnan(values)] = 0
+    return classes
+
+
+def band_props(edges, unit, scale=1.0):
+    """props_func for band_classes; edges are in unit, props also carry the raw bounds."""
+    bounds = [0.0] + [float(e) for e in edges] + [None]
+
+    def props(val):
+        low, high = bounds[val - 1], bounds[val]
+        label = f"> {low:g} {unit}" if high is None else f"{low:g}-{high:g} {unit}"
+        return {"label": label, "min": low * scale, "max": None if high is None else high * scale}
+    return props
+
+
+def derive_access(dem_path, buffered_geom, raw_dir, access_opts=None, dem_opts=None, fmt=layer_io.DEFAULT_FORMAT):
+    """
+    Writes access_distance (and access_time when access.travel_time is set)
+    band layers to raw_dir from the DEM mosaic and the raw access layers.
+    """
+    access_opts = access_opts or {}
+    dem_opts = dict(dem_opts or {})
+    layers = access_opts.get("layers", DEFAULT_LAYERS)
+
+    access_gdfs = []
+    for name in layers:
+        path = layer_io.find_layer(raw_dir, name)
+        if path is None:
+            print(f"Access layer {name} not found in {raw_dir}; skipping it.")
+            continue
+        access_gdfs.append(layer_io.read_layer(path))
+
+    start = time.perf_counter()
+    dem, transform, crs = read_dem(dem_path, buffered_geom)
+    access = rasterize_access(access_gdfs, dem.shape, transform, crs)
+    if not access.any():
+        print("No access features inside the DEM; skipping access distance.")
+        return
+    print(f"Rasterized access network: {int(access.sum())} of {access.size} cells "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    start = time.perf_counter()
+    with metrics.step("distance_transform"):
+        distance = distance_from_access(access, transform, crs)
+    distance[np.isnan(dem)] = np.nan
+    print(f"Distance transform: {dem.shape[0]} x {dem.shape[1]} in {time.perf_counter() - start:.1f}s")
+
+    bands_mi = access_opts.get("distance_bands_mi", DEFAULT_DISTANCE_BANDS_MI)
+    write_classes(band_classes(distance / METERS_PER_MILE, bands_mi), transform, crs, "distance_band",
+                  band_props(bands_mi, "mi", METERS_PER_MILE), buffered_geom,
+                  layer_io.layer_path(raw_dir, "access_distance", fmt), dem_opts)
+
+    if access_opts.get("travel_time", True):
+        start = time.perf_counter()
+        with metrics.step("cost_distance"):
+            minutes = travel_minutes(dem, transform, crs, access,
+                                     float(access_opts.get("cost_cell_m", 60.0)),
+                                     float(access_opts.get("max_slope_deg", 60.0)))
+        print(f"Cost-distance (travel time): {time.perf_counter() - start:.1f}s")
+
+        bands_min = access_opts.get("time_bands_min", DEFAULT_TIME_BANDS_MIN)
+        write_classes(band_classes(minutes, bands_min), transform, crs, "time_band",
+                      band_props(bands_min, "min"), buffered_geom,
+                      layer_io.layer_path(raw_dir, "access_time", fmt), dem_opts)
+
+
+def access_outputs(config, raw_dir, fmt):
+    """Layer paths derive_access writes for this config (empty when disabled)."""
+    access_opts = config.get("access", {}) or {}
+    if not access_opts.get("enabled", False):
+        return []
+    outputs = [layer_io.layer_path(raw_dir, "access_distance", fmt)]
+    if access_opts.get("travel_time", True):
+        outputs.append(layer_io.layer_path(raw_dir, "access_time", fmt))
+    return outputs
@@ -0,0 +1,88 @@
+"""
+The area of interest every stage clips and masks to.
+
+An AOI is built once per run from the buffered district: the union of its
+geometry, prepared so repeated predicates against it are fast. clip() sorts
+features into outside / interior / boundary with two prepared predicates, so
+only features crossing the boundary go through an intersection; interior
+features are kept untouched. mask() rasterizes the same geometry for the
+terrain rasters.
+"""
+import geopandas as gpd
+import numpy as np
+import shapely
+from rasterio.features import geometry_mask
+
+
+BUFFER_CRS = "EPSG:32100"  # Montana State Plane (meters) for buffering
+METERS_PER_MILE = 1609.34
+
+OUTSIDE, INTERIOR, BOUNDARY = 0, 1, 2
+
+
+def buffer_geometry(gdf, buffer_miles):
+    """gdf's geometries buffered by buffer_miles (in meters, State Plane), as WGS84."""
+    return gdf.to_crs(BUFFER_CRS).buffer(buffer_miles * METERS_PER_MILE).to_crs("EPSG:4326")
+
+
+class AOI:
+    def __init__(self, geom, crs="EPSG:4326"):
+        self.geom = geom
+        self.crs = crs
+        shapely.prepare(self.geom)
+
+    @classmethod
+    def from_gdf(cls, gdf):
+        """Union of a (WGS84) GeoDataFrame's geometries."""
+        return cls(shapely.union_all(gdf.to_crs("EPSG:4326").geometry.values))
+
+    @classmethod
+    def buffered(cls, district_gdf, buffer_miles):
+        """The district buffered by buffer_miles - the AOI get_data, terrain and batch share."""
+        return cls(shapely.union_all(buffer_geometry(district_gdf, buffer_miles).values))
+
+    @property
+    def bounds(self):
+        return self.geom.bounds
+
+    def classify(self, geoms):
+        """OUTSIDE / INTERIOR / BOUNDARY for each geometry (None counts as outside)."""
+        geoms = np.asarray(geoms, dtype=object)
+        out = np.full(len(geoms), OUTSIDE, dtype=np.uint8)
+        hit = np.flatnonzero(shapely.intersects(self.geom, geoms))
+        interior = shapely.contains_properly(self.geom, geoms[hit])
+        out[hit] = np.where(interior, INTERIOR, BOUNDARY)
+        return out
+
+    def clip(self, gdf):
+        """gpd.clip(gdf, self.geom), cutting only the features that cross the boundary."""
+        if gdf.empty:
+            return gdf
+        if gdf.crs is not None and not gdf.crs.equals(self.crs):
+            gdf = gdf.to_crs(self.crs)
+        geoms = gdf.geometry.values
+        kind = self.classify(geoms)
+
+        keep = kind != OUTSIDE
+        clipped = np.asarray(geoms, dtype=object).copy()
+        cut = np.flatnonzero(kind == BOUNDARY)
+        clipped[cut] = shapely.intersection(clipped[cut], self.geom)
+        keep &= ~shapely.is_empty(clipped)
+
+        out = gdf[keep].copy()
+        out[gdf.geometry.name] = gpd.GeoSeries(clipped[keep], index=out.index, crs=gdf.crs)
+        return out
+
+    def mask(self, shape, transform, all_touched=True):
+        """True for raster cells inside the AOI (raster in the AOI's CRS)."""
+        return geometry_mask([self.geom], out_shape=shape, transform=transform,
+                             invert=True, all_touched=all_touched)
+
+
+def as_aoi(obj):
+    """An AOI from an AOI, a shapely geometry or a GeoDataFrame of district geometry."""
+    if isinstance(obj, AOI):
+        return obj
+    if isinstance(obj, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        return AOI.from_gdf(obj if isinstance(obj, gpd.GeoDataFrame) else gpd.GeoDataFrame(geometry=obj))
+    return AOI(obj)
@@ -0,0 +1,235 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from scripts import metrics
+from scripts.http_cache import CacheMiss, cache_from_config
+
+
+DEFAULT_PAGE_SIZE = 2000
+DEFAULT_MAX_PER_HOST = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+DEFAULT_TIMEOUT = 120
+
+# Status codes worth retrying - throttling and transient gateway errors
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class ArcGISQueryError(RuntimeError):
+    """Raised when an ArcGIS service answers 200 OK with an error payload."""
+
+
+def exceeded_transfer_limit(payload):
+    """True when the service capped the answer (f=json puts the flag at the top, f=geojson under properties)."""
+    return bool(payload.get("exceededTransferLimit") or (payload.get("properties") or {}).get("exceededTransferLimit"))
+
+
+def make_session(max_per_host=DEFAULT_MAX_PER_HOST, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """Builds a pooled requests.Session with retry/backoff on transient errors."""
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset(["GET", "POST"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(max_per_host, 1), max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # Requests and bytes show up in the run report (see scripts.metrics)
+    session.hooks["response"].append(metrics.record_response)
+    return session
+
+
+class ArcGISPager:
+    """
+    Shared paging engine for ArcGIS Feature/Map Service `query` endpoints.
+
+    Asks the service for matching object IDs (or a record count) first, then
+    fetches the pages concurrently over one pooled session. Concurrency is
+    bounded per host so several layers on the same server don't overload it.
+    """
+
+    def __init__(self, session=None, page_size=DEFAULT_PAGE_SIZE, max_per_host=DEFAULT_MAX_PER_HOST,
+                 timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, cache=None):
+        self.session = session or make_session(max_per_host, retries, backoff)
+        self.page_size = int(page_size)
+        self.max_per_host = max(int(max_per_host), 1)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # HTTP
+    # -----------------------------
+    def _slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def _post(self, url, data, stats=None):
+        """
+        POSTs a query form and returns the decoded JSON, retrying ArcGIS error payloads.
+        stats: optional dict whose 'requests' and 'bytes' counters are incremented.
+        """
+        attempt = 0
+        while True:
+            with self._slot(url):
+                if self.cache is not None:
+                    body = self.cache.fetch(self.session, "POST", url, data, self.timeout)
+                else:
+                    resp = self.session.post(url, data=data, timeout=self.timeout)
+                    resp.raise_for_status()
+                    body = resp.content
+            payload = json.loads(body)
+
+            if stats is not None:
+                with self._lock:
+                    stats["requests"] = stats.get("requests", 0) + 1
+                    stats["bytes"] = stats.get("bytes", 0) + len(body)
+
+            error = payload.get("error") if isinstance(payload, dict) else None
+            if not error:
+                return payload
+
+            # Never keep an error payload around as a cached answer
+            if self.cache is not None:
+                self.cache.invalidate("POST", url, data)
+
+            # ArcGIS reports throttling/timeouts as 200 with an error body
+            attempt += 1
+            if attempt > self.retries:
+                raise ArcGISQueryError(f"{url}: {error.get('code')} {error.get('message')}")
+            time.sleep(self.backoff * (2 ** (attempt - 1)))
+
+    # -----------------------------
+    # PAGING
+    # -----------------------------
+    def fetch_object_ids(self, query_url, params, stats=None):
+        """Returns the sorted object IDs matching params, or None if unsupported."""
+        data = dict(params, f="json", returnIdsOnly="true")
+        data.pop("resultOffset", None)
+        data.pop("resultRecordCount", None)
+        try:
+            payload = self._post(query_url, data, stats)
+        except (ArcGISQueryError, requests.RequestException, ValueError, CacheMiss):
+            # CacheMiss: offline and this query was never cached, but the offset pages may be
+            return None
+
+        ids = payload.get("objectIds")
+        if ids is None:
+            return [] if "objectIdFieldName" in payload else None
+        return sorted(ids)
+
+    def fetch_count(self, query_url, params, stats=None):
+        """Returns the matching record count, or None if unsupported."""
+        data = dict(params, f="json", returnCountOnly="true")
+        try:
+            payload = self._post(query_url, data, stats)
+        except (ArcGISQueryError, requests.RequestException, ValueError, CacheMiss):
+            # CacheMiss: offline and this query was never cached, but the offset pages may be
+            return None
+        return payload.get("count")
+
+    def _fetch_id_page(self, query_url, params, ids, stats=None):
+        data = dict(params, objectIds=",".join(str(i) for i in ids))
+        data.pop("where", None)
+        gj = self._post(query_url, data, stats)
+        features = gj.get("features", [])
+
+        if exceeded_transfer_limit(gj) and len(ids) > 1:
+            # Server capped the page below our page size; split and retry both halves
+            mid = len(ids) // 2
+            return self._fetch_id_page(query_url, params, ids[:mid], stats) + \
+                self._fetch_id_page(query_url, params, ids[mid:], stats)
+        return features
+
+    def _fetch_offset_page(self, query_url, params, offset, limit, stats=None):
+        """
+        Records [offset, offset + limit). A service whose maxRecordCount is
+        below limit answers with a short page, so keep paging from where it
+        stopped until the window is full or the records run out.
+        """
+        features = []
+        while len(features) < limit:
+            data = dict(params, resultOffset=offset + len(features), resultRecordCount=limit - len(features))
+            page = self._post(query_url, data, stats).get("features", [])
+            if not page:
+                break
+            features.extend(page)
+        return features
+
+    def _fetch_sequential(self, query_url, params, stats=None):
+        """Plain resultOffset walk for services without ID or count support."""
+        all_features = []
+        while True:
+            data = dict(params, resultOffset=len(all_features), resultRecordCount=self.page_size)
+            gj = self._post(query_url, data, stats)
+            features = gj.get("features", [])
+            all_features.extend(features)
+            # A short page is the last one unless the service says it capped it
+            if not features or (len(features) < self.page_size and not exceeded_transfer_limit(gj)):
+                break
+        return all_features
+
+    def query(self, query_url, params, stats=None):
+        """
+        Fetches every feature matching params from query_url.
+        Returns a list of GeoJSON feature dicts in object ID (or offset) order.
+        stats: optional dict that collects request and byte counts for this query.
+        """
+        params = dict(params)
+        params.setdefault("f", "geojson")
+
+        ids = self.fetch_object_ids(query_url, params, stats)
+        if ids is not None:
+            if not ids:
+                return []
+            chunks = [ids[i:i + self.page_size] for i in range(0, len(ids), self.page_size)]
+            with ThreadPoolExecutor(max_workers=self.max_per_host) as pool:
+                pages = list(pool.map(metrics.bind(lambda c: self._fetch_id_page(query_url, params, c, stats)), chunks))
+            return [feat for page in pages for feat in page]
+
+        count = self.fetch_count(query_url, params, stats)
+        if count is None:
+            return self._fetch_sequential(query_url, params, stats)
+        if count == 0:
+            return []
+
+        offsets = list(range(0, count, self.page_size))
+        with ThreadPoolExecutor(max_workers=self.max_per_host) as pool:
+            pages = list(pool.map(metrics.bind(
+                lambda o: self._fetch_offset_page(query_url, params, o, min(self.page_size, count - o), stats)
+            ), offsets))
+        return [feat for page in pages for feat in page]
+
+
+def pager_from_config(config):
+    """Builds an ArcGISPager from the optional `acquisition` section of config.yaml."""
+    opts = config.get("acquisition", {}) or {}
+    return ArcGISPager(
+        page_size=opts.get("page_size", DEFAULT_PAGE_SIZE),
+        max_per_host=opts.get("max_per_host", DEFAULT_MAX_PER_HOST),
+        timeout=opts.get("timeout", DEFAULT_TIMEOUT),
+        retries=opts.get("retries", DEFAULT_RETRIES),
+        backoff=opts.get("backoff", DEFAULT_BACKOFF),
+        cache=cache_from_config(config),
+    )
@@ -0,0 +1,170 @@
+"""
+Multi-district batch mode.
+
+Fetches every district in one query, downloads each feature service and the
+DEM mosaic once for the union of all buffered districts, partitions the
+features to each district with a spatial index, and then builds each district
+(clip + write raw, terrain derivatives, process_data) on a process pool.
+Outputs go to per-district subdirectories (HD_<id>) of the raw, processed and
+map data dirs.
+"""
+import copy
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import geopandas as gpd
+
+from scripts import access_distance, get_data, layer_io, metrics, process_data, terrain_derivatives
+from scripts.aoi import AOI
+from scripts.arcgis_paging import pager_from_config
+
+
+PROCESSING_DIR = Path(__file__).parent.parent
+
+
+def district_config(config, district_id):
+    """Copy of config pointing the unit and every data dir at one district."""
+    cfg = copy.deepcopy(config)
+    cfg["unit"]["District_ID"] = district_id
+    for key in ("raw_data_dir", "processed_data_dir", "map_data_dir"):
+        cfg["environment"][key] = str(Path(config["environment"][key]) / f"HD_{district_id}")
+    return cfg
+
+
+def partition(layer_gdf, district_geoms):
+    """
+    Splits one union-wide layer into per-district subsets with a single bulk
+    spatial index query. Returns {district_id: GeoDataFrame} (unclipped).
+    """
+    ids = list(district_geoms)
+    if layer_gdf.empty:
+        return {d: layer_gdf for d in ids}
+
+    geoms = gpd.GeoSeries([district_geoms[d] for d in ids], crs=layer_gdf.crs)
+    geom_idx, feat_idx = layer_gdf.sindex.query(geoms, predicate="intersects")
+
+    parts = {}
+    for pos, district_id in enumerate(ids):
+        parts[district_id] = layer_gdf.iloc[feat_idx[geom_idx == pos]]
+    return parts
+
+
+def build_district(cfg, district_gdf, buffered_geom, layers, merged_dem):
+    """
+    Worker: clips and writes this district's share of every layer, then runs
+    terrain derivatives from the shared mosaic and process_data.
+    layers: {file_name: GeoDataFrame} already partitioned to this district.
+    """
+    district_id = cfg["unit"]["District_ID"]
+    start = time.perf_counter()
+
+    raw_dir = PROCESSING_DIR / cfg["environment"]["raw_data_dir"]
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    fmt = layer_io.intermediate_format(cfg)
+    layer_io.write_layer(district_gdf, layer_io.layer_path(raw_dir, "hunting_district", fmt))
+
+    # The same prepared AOI clips every layer and masks the terrain rasters
+    aoi = AOI(buffered_geom)
+    for file_name, gdf in layers.items():
+        if gdf.empty:
+            continue
+        clipped = aoi.clip(gdf)
+        if not clipped.empty:
+            layer_io.write_layer(clipped, layer_io.layer_path(raw_dir, file_name, fmt))
+
+    if merged_dem is not None:
+        # Districts already run one per process, so terrain stays single-threaded here
+        dem_opts = dict(cfg.get("dem", {}), workers=1)
+        terrain_derivatives.derive_terrain(merged_dem, aoi, raw_dir, dem_opts, fmt)
+        access_opts = cfg.get("access", {}) or {}
+        if access_opts.get("enabled", False):
+            access_distance.derive_access(merged_dem, aoi, raw_dir, access_opts, dem_opts, fmt)
+
+    # Layers are processed sequentially for the same reason
+    failed = process_data.main(dict(cfg, processing=dict(cfg.get("processing") or {}, max_processes=1)))
+    if failed:
+        raise RuntimeError(f"process_data failed for {', '.join(failed)}")
+    return district_id, time.perf_counter() - start
+
+
+def fetch_layer(file_name, fetch):
+    with metrics.layer(file_name):
+        gdf = fetch()
+        metrics.count_features(len(gdf))
+    return gdf
+
+
+def run(config, district_ids=None):
+    """
+    Builds every district in district_ids (None = every district the service has).
+    """
+    batch_opts = config.get("batch", {}) or {}
+    max_processes = int(batch_opts.get("max_processes", 4))
+    buffer_miles = config["unit"].get("buffer_distance_miles", 1.0)
+
+    with metrics.stage("get_data"):
+        pager = pager_from_config(config)
+        districts = get_data.get_hunting_districts(config, district_ids, pager.cache)
+        print(f"Batch: {len(districts)} districts")
+
+        # Buffered geometry per district, and the union that drives the shared downloads
+        district_geoms = {}
+        for _, row in districts.iterrows():
+            one = gpd.GeoDataFrame([row], geometry="geometry", crs=districts.crs)
+            district_geoms[row["NAME"]] = AOI.buffered(one, buffer_miles).geom
+        union_gdf = gpd.GeoDataFrame(geometry=list(district_geoms.values()), crs="EPSG:4326").dissolve()
+
+        # 1. One download per layer for the whole batch
+        jobs = get_data.layer_jobs(config, union_gdf, pager)
+        max_workers = int(config.get("acquisition", {}).get("max_workers", 1))
+        layers = {}
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as pool:
+            futures = {pool.submit(fetch_layer, file_name, fetch): (name, file_name) for name, file_name, fetch in jobs}
+            for future in as_completed(futures):
+                name, file_name = futures[future]
+                try:
+                    layers[file_name] = future.result()
+                    print(f"Fetched {name}: {len(layers[file_name])} features")
+                except Exception as e:
+                    print(f"Error acquiring {name}: {e}")
+
+    # 2. One DEM mosaic for the whole batch
+    with metrics.stage("terrain_derivatives"):
+        raw_root = PROCESSING_DIR / config["environment"]["raw_data_dir"]
+        mosaic_name = "dem_merged_batch.vrt" if config.get("dem", {}).get("windowed") else "dem_merged_batch.tif"
+        merged_dem = terrain_derivatives.fetch_dem(
+            config, union_gdf.total_bounds, raw_root / "dem_tiles", raw_root / mosaic_name)
+
+    # 3. Partition with a spatial index, then build districts across processes
+    with metrics.stage("districts"):
+        parts = {name: partition(gdf, district_geoms) for name, gdf in layers.items()}
+
+        print(f"Building districts with {max_processes} process(es)...")
+        results = []
+        with ProcessPoolExecutor(max_workers=max_processes) as pool:
+            futures = {}
+            for _, row in districts.iterrows():
+                district_id = row["NAME"]
+                district_gdf = gpd.GeoDataFrame([row], geometry="geometry", crs=districts.crs)
+                district_layers = {name: p[district_id] for name, p in parts.items()}
+                future = pool.submit(
+                    build_district, district_config(config, district_id), district_gdf,
+                    district_geoms[district_id], district_layers, merged_dem,
+                )
+                futures[future] = district_id
+
+            for future in as_completed(futures):
+                district_id = futures[future]
+                try:
+                    _, seconds = future.result()
+                    print(f"District {district_id} built in {seconds:.1f}s")
+                    results.append((district_id, "ok", seconds))
+                except Exception as e:
+                    print(f"District {district_id} failed: {e}")
+                    results.append((district_id, "failed", 0.0))
+
+    failed = [d for d, status, _ in results if status == "failed"]
+    print(f"Batch complete: {len(results) - len(failed)} built, {len(failed)} failed"
+          + (f": {', '.join(failed)}." if failed else "."))
+    return results
@@ -1,12 +1,42 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
 
+from scripts import metrics, topology
 
-import geopandas as gpd
-from shapely.geometry import LineString, MultiLineString, Point
+
+METERS_PER_DEGREE = 111_320.0  # tolerance conversion for lat/lon layers
+
+
+def line_endpoints(geoms):
+    """
+    Start and end points of every LineString / MultiLineString part.
+    Returns (points, owner) where owner is the position in geoms each point
+    came from; other geometry types and empty lines have no endpoints.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    # LineString, LinearRing, MultiLineString
+    is_line = np.isin(shapely.get_type_id(geoms), (1, 2, 5))
+    rows = np.flatnonzero(is_line)
+    parts, part_row = shapely.get_parts(geoms[rows], return_index=True)
+    valid = shapely.get_num_coordinates(parts) >= 2
+    parts, part_row = parts[valid], rows[part_row[valid]]
+
+    points = np.concatenate([shapely.get_point(parts, 0), shapely.get_point(parts, -1)])
+    owner = np.concatenate([part_row, part_row])
+    return points, owner
 
 
 def remove_isolated_edges(gdf: gpd.GeoDataFrame, tolerance: float = 0.0) -> gpd.GeoDataFrame:
-    
+    """
+    Drops lines none of whose endpoints touch another line (or come within
+    tolerance of one, via a buffer around the endpoint). Lines sharing an
+    index label don't count as connected to each other.
+    """
     if gdf.empty:
         return gdf.copy()
 
@@ -17,86 +47,219 @@ def remove_isolated_edges(gdf: gpd.GeoDataFrame, tolerance: float = 0.0) -> gpd.
     if lines.empty:
         return lines
 
-    sindex = lines.sindex
-    geoms = lines.geometry
-
-    def endpoints(geom):
-        if geom is None:
-            return []
-        if isinstance(geom, LineString):
-            coords = list(geom.coords)
-            if len(coords) < 2:
-                return []
-            return [Point(coords[0]), Point(coords[-1])]
-        if isinstance(geom, MultiLineString):
-            pts = []
-            for part in geom.geoms:
-                coords = list(part.coords)
-                if len(coords) >= 2:
-                    pts.append(Point(coords[0]))
-                    pts.append(Point(coords[-1]))
-            return pts
-        return []
-
-    keep_mask = []
-
-    for idx, geom in geoms.items():
-        pts = endpoints(geom)
-        if not pts:
-            keep_mask.append(False)
+    points, owner = line_endpoints(lines.geometry.to_numpy())
+    query_geoms = points if tolerance <= 0 else shapely.buffer(points, tolerance)
+
+    # One bulk query for every endpoint; touching counts as intersecting
+    point_idx, candidate = lines.sindex.query(query_geoms, predicate="intersects")
+
+    # Drop matches against the endpoint's own line
+    labels = lines.index.to_numpy()
+    other = labels[candidate] != labels[owner[point_idx]]
+
+    connected = np.zeros(len(lines), dtype=bool)
+    connected[owner[point_idx[other]]] = True
+    return lines.loc[connected].copy()
+
+def remove_lines_with_no_name(gdf):
+    if 'Name' in gdf.columns:
+        return gdf[gdf['Name'].notna()]
+    return gdf
+
+def dissolve_by_name(gdf, method="unary", presimplify_m=0.0, workers=1):
+    """
+    Merges parcels by Owner. method: 'unary' (GeoDataFrame.dissolve) or
+    'coverage' (see coverage_dissolve, which also takes presimplify_m and workers).
+    """
+    if 'Owner' not in gdf.columns:
+        return gdf
+    if method == "coverage":
+        return coverage_dissolve(gdf, "Owner", presimplify_m, workers)
+    return gdf.dissolve("Owner")
+
+def coverage_dissolve(gdf, by, presimplify_m=0.0, workers=1):
+    """
+    gdf.dissolve(by) for polygons that tile without overlapping, like parcels.
+    Groups of one valid polygon keep it as is. Other groups are merged with
+    coverage_union_all, which drops the shared edges instead of overlaying the
+    polygons; a group that isn't a valid coverage (GEOS raises, or the result
+    is invalid) falls back to union_all.
+    presimplify_m: coverage-simplify the layer first (shared edges stay shared).
+    workers: threads for the group unions (0 = one per core).
+    """
+    gdf = gdf[gdf[by].notna() & gdf.geometry.notna()]
+    if presimplify_m:
+        gdf = simplify_for_export(gdf, presimplify_m, coverage=True)
+    geoms = gdf.geometry.to_numpy()
+
+    codes, _ = pd.factorize(gdf[by], sort=True)
+    order = np.argsort(codes, kind="stable")
+    groups = np.split(order, np.flatnonzero(np.diff(codes[order])) + 1) if len(order) else []
+
+    valid = shapely.is_valid(geoms)
+
+    def union(group):
+        if len(group) == 1 and valid[group[0]]:
+            return geoms[group[0]]
+        try:
+            merged = shapely.coverage_union_all(geoms[group])
+            if shapely.is_valid(merged):
+                return merged
+        except shapely.errors.GEOSException:
+            pass
+        return shapely.union_all(geoms[group])
+
+    def union_chunk(chunk):
+        return [union(groups[i]) for i in chunk]
+
+    workers = workers or os.cpu_count() or 1
+    chunks = np.array_split(np.arange(len(groups)), max(1, min(len(groups), workers * 4)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        merged = [g for part in pool.map(union_chunk, chunks) for g in part]
+
+    # Same shape as dissolve: index by, geometry first, 'first' of the other columns
+    attrs = pd.DataFrame(gdf.drop(columns=gdf.geometry.name)).groupby(by, sort=True).first()
+    geometry = gpd.GeoSeries(merged, index=attrs.index, crs=gdf.crs)
+    return gpd.GeoDataFrame({gdf.geometry.name: geometry}, geometry=gdf.geometry.name, crs=gdf.crs).join(attrs)
+
+def drop_degenerate_parts(geoms):
+    """
+    Removes empty, zero-area and zero-length parts. Multi-part geometries stay
+    multi-part; geometries with no parts left become None.
+    """
+    parts, index = shapely.get_parts(geoms, return_index=True)
+    # Repaired geometries can nest multi-parts in collections; flatten fully
+    while np.isin(shapely.get_type_id(parts), (4, 5, 6, 7)).any():
+        parts, sub = shapely.get_parts(parts, return_index=True)
+        index = index[sub]
+    dims = shapely.get_dimensions(parts)
+    size = np.where(dims == 2, shapely.area(parts), np.where(dims == 1, shapely.length(parts), 1.0))
+    keep = ~shapely.is_empty(parts) & (size > 0)
+    parts, index, dims = parts[keep], index[keep], dims[keep]
+
+    out = np.full(len(geoms), None, dtype=object)
+    multi = {2: shapely.multipolygons, 1: shapely.multilinestrings, 0: shapely.multipoints}
+    for group in np.split(np.arange(len(index)), np.flatnonzero(np.diff(index)) + 1):
+        if not len(group):
             continue
+        i = index[group[0]]
+        if shapely.get_type_id(geoms[i]) in (4, 5, 6, 7):
+            top = dims[group].max()
+            out[i] = multi[top](parts[group][dims[group] == top])
+        else:
+            out[i] = parts[group[0]]
+    return out
 
-        connected = False
 
-        for pt in pts:
-            query_geom = pt if tolerance <= 0 else pt.buffer(tolerance)
+def simplify_for_export(gdf, simplify_tolerance_m=0.0, decimals=None, coverage=False):
+    """
+    Export-time generalization for one layer.
 
-            # candidates are index positions from spatial index
-            candidate_pos = list(sindex.intersection(query_geom.bounds))
-            if not candidate_pos:
-                continue
+    - simplify_tolerance_m: topology-preserving simplification tolerance in
+      meters (converted to degrees for lat/lon layers). With coverage=True,
+      polygon features that tile without overlaps are simplified as a
+      coverage so neighbours keep sharing the same edges.
+    - decimals: coordinates are rounded to this many decimals, so vertices
+      shared between features and layers stay identical.
+    Empty and degenerate parts are dropped afterwards.
+    """
+    if gdf.empty:
+        return gdf
 
-            candidates = lines.iloc[candidate_pos]
+    # to_numpy() is the GeoDataFrame's own array; copy so the caller's stays as is
+    geoms = gdf.geometry.to_numpy().copy()
+    if simplify_tolerance_m:
+        tolerance = simplify_tolerance_m
+        if gdf.crs is not None and gdf.crs.is_geographic:
+            tolerance = simplify_tolerance_m / METERS_PER_DEGREE
 
-            # remove self
-            candidates = candidates[candidates.index != idx]
-            if candidates.empty:
-                continue
+        individual = np.ones(len(geoms), dtype=bool)
+        if coverage and np.all(shapely.get_dimensions(geoms) == 2):
+            # Features that overlap or don't match their neighbours' edges
+            # can't be simplified as a coverage; only those go one by one
+            individual = ~shapely.is_empty(shapely.coverage_invalid_edges(geoms))
+            if individual.any():
+                print(f"  {individual.sum()} features break the coverage; simplifying them individually")
+            geoms[~individual] = shapely.coverage_simplify(geoms[~individual], tolerance)
+        geoms[individual] = shapely.simplify(geoms[individual], tolerance, preserve_topology=True)
 
-            if tolerance <= 0:
-                # exact: endpoint intersects another line (touching counts as intersects)
-                if candidates.intersects(pt).any():
-                    connected = True
-                    break
-            else:
-                # tolerant: endpoint buffer intersects another line
-                if candidates.intersects(query_geom).any():
-                    connected = True
-                    break
+    if decimals is not None:
+        # Pointwise rounding keeps edges shared between features identical
+        # (set_precision repairs each feature on its own and can split them);
+        # only features that come out invalid are repaired
+        geoms = shapely.transform(geoms, lambda c: np.round(c, int(decimals)))
+        geoms = shapely.remove_repeated_points(geoms)
+        invalid = ~shapely.is_valid(geoms)
+        geoms[invalid] = shapely.make_valid(geoms[invalid], method="structure", keep_collapsed=False)
 
-        keep_mask.append(connected)
+    geoms = drop_degenerate_parts(geoms)
+    gdf = gdf.set_geometry(gpd.GeoSeries(geoms, index=gdf.index, crs=gdf.crs))
+    return gdf[gdf.geometry.notna()]
 
-    return lines.loc[keep_mask].copy()
 
-def remove_lines_with_no_name(gdf):
-    if 'Name' in gdf.columns:
-        return gdf[gdf['Name'].notna()]
-    return gdf
+def geometry_size(gdf):
+    """(vertex count, bytes of GeoJSON geometry) for a size report."""
+    geoms = gdf.geometry.to_numpy()
+    vertices = int(shapely.get_num_coordinates(geoms).sum())
+    nbytes = sum(len(g) for g in shapely.to_geojson(geoms[~shapely.is_missing(geoms)]))
+    return vertices, nbytes
 
-def dissolve_by_name(gdf):
-    if 'Owner' in gdf.columns:
-        return gdf.dissolve("Owner")
-    return gdf
+
+NETWORK_LAYERS = ("flowline", "trail", "road")
+
+def is_network_layer(file):
+    return any(key in file.name for key in NETWORK_LAYERS)
+
+def network_graph(gdf, snap_tolerance_m=0.0):
+    """Topology of a line layer; graph row i is gdf row i."""
+    if gdf.crs is None:
+        raise ValueError("GeoDataFrame has no CRS. Set gdf.crs before building topology.")
+    tolerance = snap_tolerance_m
+    if gdf.crs.is_geographic:
+        tolerance = snap_tolerance_m / METERS_PER_DEGREE
+    return topology.build_graph(gdf.geometry.to_numpy(), tolerance)
+
+def build_network(gdf, snap_tolerance_m=0.0):
+    """
+    Builds a line layer's topology once and drops its isolated edges with it
+    (the rows remove_isolated_edges would keep). Returns (lines, graph) where
+    graph row i is lines row i.
+
+    With a snap tolerance the two can differ: endpoints snap to nodes by
+    chains of neighbours within tolerance, so a line can join another whose
+    nearest endpoint is further than tolerance away, where
+    remove_isolated_edges only checks each endpoint's own buffer. The tests
+    check that they agree on the shipped network layers.
+    """
+    if gdf.crs is None:
+        raise ValueError("GeoDataFrame has no CRS. Set gdf.crs before building topology.")
+
+    lines = gdf[gdf.geometry.notna()]
+    graph = network_graph(lines, snap_tolerance_m)
+
+    keep = np.flatnonzero(graph.connected_rows())
+    return lines.iloc[keep].copy(), graph.subgraph(keep)
 
 def main(file,gdf,field_mappings):
-    if "flowline" in file.name:
-        gdf = remove_isolated_edges(gdf)
-        gdf = remove_lines_with_no_name(gdf)
-    if "trail" in file.name:
-        gdf = remove_isolated_edges(gdf)
-    if "road" in file.name:
-        gdf = remove_isolated_edges(gdf)
+    """
+    Returns (gdf, graph). graph is the topology of road, trail and flowline
+    layers (see scripts.topology), None for other layers.
+    """
+    if gdf is None:
+        # Not in field_mappings.json: nothing to do
+        return None, None
+    graph = None
+    if is_network_layer(file):
+        topology_opts = field_mappings.get(f"{file.stem}.geojson", {}).get("topology", {})
+        with metrics.step("topology"):
+            gdf, graph = build_network(gdf, topology_opts.get("snap_tolerance_m", 0.0))
+        print(f"Topology {file.stem}: {graph.summary()}")
+    if "flowline" in file.name and 'Name' in gdf.columns:
+        named = np.flatnonzero(gdf['Name'].notna().to_numpy())
+        gdf, graph = gdf.iloc[named], graph.subgraph(named)
     if "parcels" in file.name:
-        gdf = dissolve_by_name(gdf)
+        dissolve_opts = field_mappings.get(f"{file.stem}.geojson", {}).get("dissolve", {})
+        with metrics.step("dissolve"):
+            gdf = dissolve_by_name(gdf, **dissolve_opts)
     
-    return gdf
+    return gdf, graph
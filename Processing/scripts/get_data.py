@@ -1,12 +1,112 @@
 import requests
 import geopandas as gpd
+import shapely
 from shapely.geometry import shape, box
+from shapely.geometry.polygon import orient
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-def get_hunting_district(config):
+from scripts import layer_io, metrics
+from scripts.aoi import AOI, as_aoi, buffer_geometry
+from scripts.arcgis_paging import ArcGISPager, pager_from_config
+
+# NHD MapServer layer IDs: 6 (Flowline), 9 (Area), 12 (Waterbody)
+NHD_LAYERS = {
+    "Flowline": 6,
+    "Area": 9,
+    "Waterbody": 12
+}
+
+def envelope_params(bbox):
+    """Query params for an intersects-envelope search in WGS84."""
+    west, south, east, north = bbox
+    return {
+        "f": "geojson",
+        "where": "1=1",
+        "outFields": "*",
+        "returnGeometry": "true",
+        "geometry": f"{west},{south},{east},{north}",
+        "geometryType": "esriGeometryEnvelope",
+        "spatialRel": "esriSpatialRelIntersects",
+        "inSR": 4326,
+        "outSR": 4326,
+    }
+
+def esri_polygon(geom, tolerance=0.0005, max_vertices=1000):
+    """
+    Generalizes geom into an esriGeometryPolygon JSON string in WGS84.
+    The polygon is grown by the tolerance before simplifying so the filter
+    never drops features that touch the real boundary; the tolerance is
+    doubled until the vertex count fits under max_vertices.
+    """
+    simplified = geom.buffer(tolerance).simplify(tolerance, preserve_topology=True)
+    while shapely.get_num_coordinates(simplified) > max_vertices:
+        tolerance *= 2
+        simplified = geom.buffer(tolerance).simplify(tolerance, preserve_topology=True)
+
+    polygons = getattr(simplified, "geoms", [simplified])
+    rings = []
+    for poly in polygons:
+        # Esri wants clockwise outer rings and counter-clockwise holes
+        poly = orient(poly, sign=-1.0)
+        rings.append([list(c) for c in poly.exterior.coords])
+        rings.extend([list(c) for c in ring.coords] for ring in poly.interiors)
+
+    return json.dumps({"rings": rings, "spatialReference": {"wkid": 4326}})
+
+def spatial_query_params(district_geom, spatial_filter=None):
+    """
+    Query params for a district search. spatial_filter (config
+    acquisition.spatial_filter) picks the envelope or a generalized polygon and
+    optionally asks the server to generalize returned geometry.
+    """
+    spatial_filter = spatial_filter or {}
+    params = envelope_params(district_geom.bounds)
+
+    if spatial_filter.get("mode", "envelope") == "polygon":
+        params["geometry"] = esri_polygon(
+            district_geom,
+            spatial_filter.get("simplify_tolerance", 0.0005),
+            spatial_filter.get("max_vertices", 1000),
+        )
+        params["geometryType"] = "esriGeometryPolygon"
+
+    if spatial_filter.get("max_allowable_offset") is not None:
+        params["maxAllowableOffset"] = spatial_filter["max_allowable_offset"]
+    if spatial_filter.get("geometry_precision") is not None:
+        params["geometryPrecision"] = spatial_filter["geometry_precision"]
+    return params
+
+def report_filter_savings(pager, query_url, bbox, layer_name, n_features, stats):
+    """Compares a polygon-filtered download against what the envelope query would have returned."""
+    envelope_count = pager.fetch_count(query_url, envelope_params(bbox))
+    if envelope_count is None:
+        return None
+
+    saved = max(envelope_count - n_features, 0)
+    bytes_per_feature = stats.get("bytes", 0) / n_features if n_features else 0
+    saved_mb = saved * bytes_per_feature / (1024 * 1024)
+    print(f"{layer_name}: polygon filter returned {n_features} of {envelope_count} envelope features "
+          f"({saved} features, ~{saved_mb:.1f} MB saved)")
+    return {"envelope_features": envelope_count, "features_saved": saved, "bytes_saved": int(saved * bytes_per_feature)}
+
+def get_hunting_district(config, cache=None):
+    return get_hunting_districts(config, [config['unit']['District_ID']], cache)
+
+def get_hunting_districts(config, district_ids=None, cache=None):
+    """
+    Fetches one or more hunting districts in a single query.
+    district_ids: list of district NAMEs, or None for every district in the service.
+    """
     url = config['URLS']['Hunting_Districts']
-    query = f"NAME = '{config['unit']['District_ID']}'"
+    if district_ids:
+        names = ", ".join(f"'{d}'" for d in district_ids)
+        query = f"NAME IN ({names})"
+    else:
+        query = "1=1"
     
     query_url = f"{url}/query"
 
@@ -18,150 +118,171 @@ def get_hunting_district(config):
         "outSR": 4326
     }
 
-    response = requests.get(query_url, params=params)
-    response.raise_for_status()
-    data = response.json()
+    if cache is not None:
+        data = cache.fetch_json(requests, "GET", query_url, params)
+    else:
+        response = requests.get(query_url, params=params, hooks=metrics.HOOKS)
+        response.raise_for_status()
+        data = response.json()
 
     if not data.get("features"):
-        raise ValueError(f"No features found for District_ID: {config['unit']['District_ID']}")
+        raise ValueError(f"No features found for District_ID: {', '.join(str(d) for d in district_ids or [])}")
 
     gdf = gpd.read_file(requests.compat.json.dumps(data))
     gdf.crs = "EPSG:4326"
     return gdf
 
-def download_nhd_layer(config, layer_id, bbox):
-    """Downloads NHD data for a specific layer within a bounding box."""
+def download_nhd_layer(config, layer_id, bbox, pager=None, geom=None):
+    """
+    Downloads NHD data for a specific layer within a bounding box.
+    If geom is given, the acquisition.spatial_filter settings are used to filter by it server side.
+    """
     base_url = config['URLS']['NHD_MAPSERVER']
     query_url = f"{base_url}/{layer_id}/query"
     
-    west, south, east, north = bbox
-    
-    all_features = []
-    result_offset = 0
-    page_size = 2000
-
-    while True:
-        params = {
-            "f": "geojson",
-            "where": "1=1",
-            "outFields": "*",
-            "returnGeometry": "true",
-            "geometry": f"{west},{south},{east},{north}",
-            "geometryType": "esriGeometryEnvelope",
-            "spatialRel": "esriSpatialRelIntersects",
-            "inSR": 4326,
-            "outSR": 4326,
-            "resultOffset": result_offset,
-            "resultRecordCount": page_size,
-        }
-
-        resp = requests.get(query_url, params=params, timeout=120)
-        resp.raise_for_status()
-        gj = resp.json()
-
-        features = gj.get("features", [])
-        if not features:
-            break
-
-        all_features.extend(features)
-
-        if len(features) < page_size:
-            break
-
-        result_offset += page_size
+    pager = pager or ArcGISPager()
+    if geom is None:
+        params = envelope_params(bbox)
+    else:
+        params = spatial_query_params(geom, config.get('acquisition', {}).get('spatial_filter'))
+    with metrics.step("download"):
+        all_features = pager.query(query_url, params)
 
     if not all_features:
         return gpd.GeoDataFrame(columns=['geometry'], crs="EPSG:4326")
 
-    gdf = gpd.GeoDataFrame.from_features(
-        {"type": "FeatureCollection", "features": all_features},
-        crs="EPSG:4326",
-    )
+    with metrics.step("parse"):
+        gdf = gpd.GeoDataFrame.from_features(
+            {"type": "FeatureCollection", "features": all_features},
+            crs="EPSG:4326",
+        )
     return gdf
 
-def get_nhd_data(config, district_gdf):
-    """Fetches NHD data for Flowlines, Areas, and Waterbodies and clips them."""
-    # Get bounding box of the district
-    bbox = district_gdf.total_bounds
-    district_geom = district_gdf.unary_union
-    
-    # Layer IDs: 6 (Flowline), 9 (Area), 12 (Waterbody)
-    layers = {
-        "Flowline": 6,
-        "Area": 9,
-        "Waterbody": 12
-    }
+def get_nhd_data(config, district, pager=None):
+    """
+    Fetches NHD data for Flowlines, Areas, and Waterbodies and clips them.
+    district: an AOI or the district GeoDataFrame.
+    """
+    aoi = as_aoi(district)
     
     nhd_results = {}
     
-    for layer_name, layer_id in layers.items():
+    for layer_name, layer_id in NHD_LAYERS.items():
         print(f"Downloading NHD {layer_name}...")
-        layer_gdf = download_nhd_layer(config, layer_id, bbox)
-        
-        if not layer_gdf.empty:
-            print(f"Clipping {layer_name} to district boundary...")
-            # Clip to the exact district geometry
-            clipped_gdf = gpd.clip(layer_gdf, district_geom)
-            nhd_results[layer_name] = clipped_gdf
-        else:
-            nhd_results[layer_name] = layer_gdf
+        layer_gdf = download_nhd_layer(config, layer_id, aoi.bounds, pager)
+        # Clip to the exact district geometry
+        nhd_results[layer_name] = clip_nhd_layer(layer_gdf, aoi)
             
     return nhd_results
 
-def fetch_arcgis_features(service_url, district_gdf, layer_name):
-    """Generic fetcher for ArcGIS Feature/Map Services with spatial query and clipping."""
-    bbox = district_gdf.total_bounds
-    district_geom = district_gdf.unary_union
+def fetch_arcgis_features(service_url, district, layer_name, pager=None, spatial_filter=None):
+    """
+    Generic fetcher for ArcGIS Feature/Map Services with spatial query and clipping.
+    district: an AOI (see scripts.aoi) or the district GeoDataFrame.
+    spatial_filter: optional acquisition.spatial_filter settings (envelope vs polygon query).
+    """
+    aoi = as_aoi(district)
+    bbox = aoi.bounds
+    spatial_filter = spatial_filter or {}
     
     query_url = f"{service_url}/query"
-    west, south, east, north = bbox
-    
+
     print(f"Downloading {layer_name}...")
-    all_features = []
-    result_offset = 0
-    page_size = 2000
-
-    while True:
-        params = {
-            "f": "geojson",
-            "where": "1=1",
-            "outFields": "*",
-            "returnGeometry": "true",
-            "geometry": f"{west},{south},{east},{north}",
-            "geometryType": "esriGeometryEnvelope",
-            "spatialRel": "esriSpatialRelIntersects",
-            "inSR": 4326,
-            "outSR": 4326,
-            "resultOffset": result_offset,
-            "resultRecordCount": page_size,
-        }
-
-        resp = requests.get(query_url, params=params, timeout=120)
-        resp.raise_for_status()
-        gj = resp.json()
-
-        features = gj.get("features", [])
-        if not features:
-            break
-
-        all_features.extend(features)
-
-        if len(features) < page_size:
-            break
-
-        result_offset += page_size
+    pager = pager or ArcGISPager()
+    stats = {}
+    with metrics.step("download"):
+        all_features = pager.query(query_url, spatial_query_params(aoi.geom, spatial_filter), stats)
+
+    if spatial_filter.get("mode") == "polygon" and spatial_filter.get("report_savings"):
+        report_filter_savings(pager, query_url, bbox, layer_name, len(all_features), stats)
 
     if not all_features:
         return gpd.GeoDataFrame(columns=['geometry'], crs="EPSG:4326")
 
-    layer_gdf = gpd.GeoDataFrame.from_features(
-        {"type": "FeatureCollection", "features": all_features},
-        crs="EPSG:4326",
-    )
+    with metrics.step("parse"):
+        layer_gdf = gpd.GeoDataFrame.from_features(
+            {"type": "FeatureCollection", "features": all_features},
+            crs="EPSG:4326",
+        )
     
     print(f"Clipping {layer_name} to district boundary...")
-    clipped_gdf = gpd.clip(layer_gdf, district_geom)
-    return clipped_gdf
+    with metrics.step("clip"):
+        return aoi.clip(layer_gdf)
+
+def clip_nhd_layer(layer_gdf, district):
+    if layer_gdf.empty:
+        return layer_gdf
+    print("Clipping NHD layer to district boundary...")
+    with metrics.step("clip"):
+        return as_aoi(district).clip(layer_gdf)
+
+def acquire_layer(name, file_name, fetch, raw_data_dir, fmt=layer_io.DEFAULT_FORMAT):
+    """
+    Fetches, clips and writes one layer. Never raises - failures are recorded
+    in the returned result so one bad service doesn't stop the others.
+    """
+    result = {"name": name, "status": "ok", "features": 0, "seconds": 0.0, "path": None, "error": None}
+    start = time.perf_counter()
+    with metrics.layer(file_name):
+        try:
+            gdf = fetch()
+            if gdf.empty:
+                print(f"No {name} data found in this area.")
+                result["status"] = "empty"
+            else:
+                with metrics.step("write"):
+                    out_path = layer_io.write_layer(gdf, layer_io.layer_path(raw_data_dir, file_name, fmt))
+                print(f"Saved {name} as {file_name} to {out_path}")
+                metrics.count_features(len(gdf))
+                result["features"] = len(gdf)
+                result["path"] = str(out_path)
+        except Exception as e:
+            print(f"Error acquiring {name}: {e}")
+            result["status"] = "failed"
+            result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def print_acquisition_summary(results):
+    print("\nAcquisition summary:")
+    for r in sorted(results, key=lambda r: r["seconds"], reverse=True):
+        line = f"  {r['name']:<20} {r['status']:<7} {r['features']:>8} features {r['seconds']:>8.1f}s"
+        if r["error"]:
+            line += f"  ({r['error']})"
+        print(line)
+    failed = [r["name"] for r in results if r["status"] == "failed"]
+    if failed:
+        print(f"  {len(failed)} layer(s) failed: {', '.join(failed)}")
+
+def buffer_district(district_gdf, buffer_miles):
+    # Buffered in meters in Montana State Plane, like AOI.buffered
+    return gpd.GeoDataFrame(geometry=buffer_geometry(district_gdf, buffer_miles))
+
+def layer_file_name(name):
+    # Rename BHS_Distribution to distribution
+    return "distribution" if name == "BHS_Distribution" else name.lower()
+
+def layer_jobs(config, buffered_gdf, pager):
+    """
+    Returns (name, file_name, fetch) for every Feature_Service and NHD layer,
+    where fetch() downloads and clips the layer to buffered_gdf.
+    """
+    spatial_filter = config.get('acquisition', {}).get('spatial_filter')
+    # One prepared AOI shared by every layer's query and clip
+    aoi = AOI.from_gdf(buffered_gdf)
+
+    jobs = []
+    for service in config['URLS'].get('Feature_Services', []):
+        name = service['name']
+        jobs.append((name, layer_file_name(name),
+                     lambda url=service['url'], name=name: fetch_arcgis_features(url, aoi, name, pager, spatial_filter)))
+
+    # NHD Data (special case with multiple layers)
+    for layer_name, layer_id in NHD_LAYERS.items():
+        jobs.append((layer_name, f"nhd_{layer_name.lower()}",
+                     lambda layer_id=layer_id: clip_nhd_layer(
+                         download_nhd_layer(config, layer_id, aoi.bounds, pager, aoi.geom), aoi)))
+    return jobs
 
 def main(config):
     # Ensure output directory exists
@@ -169,56 +290,44 @@ def main(config):
     config_dir = Path(__file__).parent.parent
     raw_data_dir = config_dir / config['environment']['raw_data_dir']
     raw_data_dir.mkdir(parents=True, exist_ok=True)
+    fmt = layer_io.intermediate_format(config)
+
+    # One pooled pager shared by every service and NHD layer
+    pager = pager_from_config(config)
 
     print(f"Fetching Hunting District {config['unit']['District_ID']}...")
-    district_gdf = get_hunting_district(config)
-    dist_path = raw_data_dir / "hunting_district.geojson"
-    district_gdf.to_file(dist_path, driver="GeoJSON")
+    with metrics.layer("hunting_district"):
+        district_gdf = get_hunting_district(config, pager.cache)
+        metrics.count_features(len(district_gdf))
+    dist_path = layer_io.write_layer(district_gdf, layer_io.layer_path(raw_data_dir, "hunting_district", fmt))
     print(f"Saved district to {dist_path}")
 
     
     # Calculate buffered geometry for context
     buffer_miles = config['unit'].get('buffer_distance_miles', 1.0)
     print(f"Buffering district by {buffer_miles} miles for context...")
+    buffered_gdf = buffer_district(district_gdf, buffer_miles)
     
-    # Reproject to Montana State Plane (EPSG:32100) for accurate meters buffering
-    district_projected = district_gdf.to_crs("EPSG:32100")
-    buffered_series = district_projected.buffer(buffer_miles * 1609.34) # Convert miles to meters
-    buffered_gdf = gpd.GeoDataFrame(geometry=buffered_series.to_crs("EPSG:4326"))
-    
-    # Process generic feature services
-    if 'Feature_Services' in config['URLS']:
-        for service in config['URLS']['Feature_Services']:
-            name = service['name']
-            url = service['url']
-            
-            # Use buffered_gdf for fetching context data
-            gdf = fetch_arcgis_features(url, buffered_gdf, name)
-            
-            if not gdf.empty:
-                # Rename BHS_Distribution to distribution
-                if name == "BHS_Distribution":
-                    file_name = "distribution"
-                else:
-                    file_name = name.lower()
-                    
-                out_path = raw_data_dir / f"{file_name}.geojson"
-                gdf.to_file(out_path, driver="GeoJSON")
-                print(f"Saved {name} as {file_name} to {out_path}")
-            else:
-                print(f"No {name} data found in this area.")
+    max_workers = int(config.get('acquisition', {}).get('max_workers', 1))
 
-    # NHD Data (special case with multiple layers)
-    # Use buffered_gdf for NHD as well
-    nhd_data = get_nhd_data(config, buffered_gdf)
-    
-    for layer_name, gdf in nhd_data.items():
-        if not gdf.empty:
-            out_path = raw_data_dir / f"nhd_{layer_name.lower()}.geojson"
-            gdf.to_file(out_path, driver="GeoJSON")
-            print(f"Saved {layer_name} to {out_path}")
-        else:
-            print(f"No {layer_name} data found in this area.")
+    # Use buffered_gdf for fetching context data
+    jobs = layer_jobs(config, buffered_gdf, pager)
+
+    print(f"Acquiring {len(jobs)} layers with {max_workers} worker(s)...")
+    results = []
+    if max_workers <= 1:
+        for job in jobs:
+            results.append(acquire_layer(*job, raw_data_dir, fmt))
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(acquire_layer, *job, raw_data_dir, fmt) for job in jobs]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+    print_acquisition_summary(results)
+    if pager.cache is not None:
+        print(f"  {pager.cache.summary()}")
+    return results
 
 if __name__ == "__main__":
     import yaml
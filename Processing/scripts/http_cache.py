@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from scripts import metrics
+
+
+DEFAULT_TTL_HOURS = 24
+DEFAULT_MAX_SIZE_MB = 2048
+
+
+class CacheMiss(LookupError):
+    """Raised in offline mode when a request has no cached response."""
+
+
+def cache_key(method, url, params=None):
+    """Stable hash of a request: method, URL and sorted query/form params."""
+    query = urlencode(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    raw = f"{method.upper()} {url}?{query}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk HTTP response cache for the acquisition step.
+
+    Each entry is a `<key>.body` file plus a `<key>.json` sidecar with the URL,
+    validators (ETag / Last-Modified) and fetch time. Entries older than the TTL
+    are revalidated with a conditional request when the server gave us a
+    validator, and refetched otherwise. The directory is kept under max_bytes by
+    evicting least-recently-used bodies (access time is tracked via mtime).
+    """
+
+    def __init__(self, cache_dir, ttl_hours=DEFAULT_TTL_HOURS, max_size_mb=DEFAULT_MAX_SIZE_MB, offline=False):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = float(ttl_hours) * 3600.0
+        self.max_bytes = int(float(max_size_mb) * 1024 * 1024)
+        self.offline = bool(offline)
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    # -----------------------------
+    # ENTRY IO
+    # -----------------------------
+    def _paths(self, key):
+        shard = self.cache_dir / key[:2]
+        return shard / f"{key}.body", shard / f"{key}.json"
+
+    def _load(self, key):
+        body_path, meta_path = self._paths(key)
+        if not body_path.exists() or not meta_path.exists():
+            return None, None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            body = body_path.read_bytes()
+            # Touch so LRU eviction sees this entry as recently used
+            os.utime(body_path, None)
+        except (OSError, ValueError):
+            # Also an entry evicted by another thread between the checks and here
+            return None, None
+        return body, meta
+
+    def _store(self, key, body, meta):
+        body_path, meta_path = self._paths(key)
+        body_path.parent.mkdir(parents=True, exist_ok=True)
+
+        old_size = body_path.stat().st_size if body_path.exists() else 0
+
+        # Write to temp files then rename so concurrent readers never see partial entries
+        tmp_body = body_path.with_suffix(f".body.{threading.get_ident()}.tmp")
+        tmp_meta = meta_path.with_suffix(f".json.{threading.get_ident()}.tmp")
+        tmp_body.write_bytes(body)
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_body, body_path)
+        os.replace(tmp_meta, meta_path)
+
+        with self._lock:
+            self._total_bytes = self._size_on_disk() if self._total_bytes is None else self._total_bytes
+            self._total_bytes += len(body) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _touch_meta(self, key, meta):
+        _, meta_path = self._paths(key)
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+
+    def _size_on_disk(self):
+        return sum(p.stat().st_size for p in self.cache_dir.glob("*/*.body"))
+
+    def _evict(self):
+        """Drops least-recently-used entries until the cache fits in max_bytes. Caller holds the lock."""
+        bodies = sorted(self.cache_dir.glob("*/*.body"), key=lambda p: p.stat().st_mtime)
+        for body_path in bodies:
+            if self._total_bytes <= self.max_bytes:
+                break
+            size = body_path.stat().st_size
+            body_path.unlink(missing_ok=True)
+            body_path.with_suffix(".json").unlink(missing_ok=True)
+            self._total_bytes -= size
+
+    def invalidate(self, method, url, params=None):
+        body_path, meta_path = self._paths(cache_key(method, url, params))
+        body_path.unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+
+    # -----------------------------
+    # FETCH
+    # -----------------------------
+    def fetch(self, session, method, url, params=None, timeout=120):
+        """
+        Returns the response body for the request, from cache when fresh.
+        GET sends params in the query string, POST sends them as a form body.
+        """
+        key = cache_key(method, url, params)
+        body, meta = self._load(key)
+
+        if body is not None:
+            fresh = time.time() - meta.get("fetched_at", 0) < self.ttl
+            if fresh or self.offline:
+                with self._lock:
+                    self.hits += 1
+                return body
+        elif self.offline:
+            raise CacheMiss(f"Offline mode: no cached response for {url}")
+
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        if method.upper() == "POST":
+            resp = session.post(url, data=params, headers=headers, timeout=timeout, hooks=metrics.HOOKS)
+        else:
+            resp = session.get(url, params=params, headers=headers, timeout=timeout, hooks=metrics.HOOKS)
+
+        if resp.status_code == 304 and body is not None:
+            with self._lock:
+                self.revalidated += 1
+            meta["fetched_at"] = time.time()
+            self._touch_meta(key, meta)
+            return body
+
+        resp.raise_for_status()
+        with self._lock:
+            self.misses += 1
+        body = resp.content
+        self._store(key, body, {
+            "url": url,
+            "method": method.upper(),
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        })
+        return body
+
+    def fetch_json(self, session, method, url, params=None, timeout=120):
+        return json.loads(self.fetch(session, method, url, params, timeout))
+
+    def summary(self):
+        return f"cache hits: {self.hits}, revalidated: {self.revalidated}, downloaded: {self.misses}"
+
+
+def cache_from_config(config):
+    """Builds a ResponseCache from the optional `cache` section of config.yaml, or None if disabled."""
+    opts = config.get("cache", {}) or {}
+    if not opts.get("enabled", False):
+        return None
+
+    processing_dir = Path(__file__).parent.parent
+    return ResponseCache(
+        processing_dir / opts.get("dir", "Data/Cache"),
+        ttl_hours=opts.get("ttl_hours", DEFAULT_TTL_HOURS),
+        max_size_mb=opts.get("max_size_mb", DEFAULT_MAX_SIZE_MB),
+        offline=opts.get("offline", False),
+    )
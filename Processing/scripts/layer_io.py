@@ -0,0 +1,261 @@
+"""
+Reading and writing layers between pipeline stages.
+
+Raw and processed layers are written in the intermediate format set by
+environment.intermediate_format ('parquet' = GeoParquet, the default, or
+'geojson'). Readers accept either, so a data dir written by an older run
+still works. Writing a layer removes its file in the other format, and where
+both exist anyway the newer one is read, so switching formats never leaves
+a stage reading stale data. GeoJSON is only required at the push_to_map
+boundary.
+
+iter_batches / LayerWriter stream a layer in fixed-size batches for layers
+too large to hold in memory.
+"""
+import json
+import os
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+
+DEFAULT_FORMAT = "parquet"
+SUFFIXES = {"parquet": ".parquet", "geojson": ".geojson"}
+
+
+def intermediate_format(config):
+    fmt = (config.get("environment", {}) or {}).get("intermediate_format", DEFAULT_FORMAT)
+    if fmt not in SUFFIXES:
+        raise ValueError(f"Unknown intermediate_format {fmt!r}; expected one of {sorted(SUFFIXES)}")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("pyarrow is not installed; writing intermediates as GeoJSON")
+            return "geojson"
+    return fmt
+
+
+def layer_path(directory, name, fmt):
+    return directory / f"{name}{SUFFIXES[fmt]}"
+
+
+def _newest(paths):
+    return max(paths, key=lambda p: p.stat().st_mtime)
+
+
+def list_layers(directory):
+    """Layer files in directory, one per layer name (the newer file if both formats exist)."""
+    layers = {}
+    for suffix in SUFFIXES.values():
+        for path in directory.glob(f"*{suffix}"):
+            layers.setdefault(path.stem, []).append(path)
+    return [_newest(layers[name]) for name in sorted(layers)]
+
+
+def find_layer(directory, name):
+    """Path of the named layer in any format (the newer file if both exist), or None."""
+    paths = [directory / f"{name}{suffix}" for suffix in SUFFIXES.values()]
+    paths = [p for p in paths if p.exists()]
+    return _newest(paths) if paths else None
+
+
+def remove_siblings(path):
+    """Deletes the layer's file in the other format(s), left by a run with another intermediate_format."""
+    for suffix in SUFFIXES.values():
+        other = path.with_name(f"{path.stem}{suffix}")
+        if suffix != path.suffix and other.exists():
+            other.unlink()
+
+
+def layer_columns(path):
+    """Attribute column names of a layer file without reading its features."""
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        names = pq.read_schema(path).names
+        return [n for n in names if n != "geometry"]
+    import pyogrio
+    return list(pyogrio.read_info(path)["fields"])
+
+
+def read_layer(path, columns=None):
+    """Reads a layer, optionally only the given attribute columns (plus geometry)."""
+    if path.suffix == ".parquet":
+        return gpd.read_parquet(path, columns=None if columns is None else list(columns) + ["geometry"])
+    return gpd.read_file(path, columns=columns)
+
+
+def write_layer(gdf, path, **geojson_opts):
+    """Writes gdf as GeoParquet or GeoJSON depending on the path suffix."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".parquet":
+        # Named indexes (e.g. after a dissolve) become columns, as to_file does
+        if any(name is not None for name in gdf.index.names):
+            gdf = gdf.reset_index()
+        gdf.to_parquet(path, index=False)
+    else:
+        gdf.to_file(path, driver="GeoJSON", **geojson_opts)
+    remove_siblings(path)
+    return path
+
+
+# -----------------------------
+# STREAMING
+# -----------------------------
+def _from_wkb_frame(df, geom_col, crs):
+    geometry = gpd.GeoSeries.from_wkb(df[geom_col].to_numpy(), index=df.index, crs=crs)
+    return gpd.GeoDataFrame(df.drop(columns=geom_col), geometry=geometry, crs=crs)
+
+
+def iter_batches(path, columns=None, batch_size=50_000):
+    """
+    Yields the layer as GeoDataFrames of at most batch_size features, reading
+    only the given attribute columns (plus geometry).
+    """
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        geo = json.loads(parquet.schema_arrow.metadata[b"geo"])
+        geom_col = geo["primary_column"]
+        # GeoParquet: a missing crs means OGC:CRS84, an explicit null means none
+        crs = geo["columns"][geom_col].get("crs", "OGC:CRS84")
+        read_cols = None if columns is None else list(columns) + [geom_col]
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=read_cols):
+            yield _from_wkb_frame(batch.to_pandas(), geom_col, crs)
+        return
+
+    import pyogrio
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        # Without Arrow, page through the file (each page re-scans up to its offset)
+        offset = 0
+        while True:
+            gdf = pyogrio.read_dataframe(path, columns=columns, skip_features=offset, max_features=batch_size)
+            if gdf.empty:
+                return
+            yield gdf
+            offset += len(gdf)
+
+    with pyogrio.open_arrow(path, columns=columns, batch_size=batch_size, use_pyarrow=True) as (meta, reader):
+        geom_col = meta["geometry_name"] or "wkb_geometry"
+        for batch in reader:
+            yield _from_wkb_frame(batch.to_pandas(), geom_col, meta["crs"])
+
+
+class LayerWriter:
+    """
+    Appends GeoDataFrame batches to a GeoParquet or GeoJSON file (by suffix),
+    holding only one batch in memory. All batches must share one schema; the
+    first batch's CRS is used for the file.
+
+    Batches go to <path>.partial, which replaces path only when the writer is
+    closed without an error, so a failed stream leaves the previous output
+    (and its other-format sibling) as it was.
+    """
+
+    def __init__(self, path, **geojson_opts):
+        self.path = path
+        self.partial_path = path.with_name(f"{path.name}.partial")
+        self.precision = geojson_opts.get("COORDINATE_PRECISION")
+        self.count = 0
+        self._sink = None
+        self._schema = None
+        self._empty = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, gdf):
+        if gdf.empty:
+            if self._empty is None:
+                self._empty = gdf
+            return
+        if any(name is not None for name in gdf.index.names):
+            gdf = gdf.reset_index()
+        if self.path.suffix == ".parquet":
+            table = self._arrow_table(gdf)
+            if self._sink is None:
+                self._open_parquet(gdf.crs)
+            self._sink.write_table(table)
+        else:
+            if self._sink is None:
+                self._open_geojson(gdf.crs)
+            self._write_features(gdf)
+        self.count += len(gdf)
+
+    def close(self):
+        """Finishes the file and moves it into place."""
+        if self._sink is None:
+            # Nothing written: an empty layer still replaces whatever an earlier run left
+            empty = self._empty if self._empty is not None else gpd.GeoDataFrame(geometry=gpd.GeoSeries([]))
+            if self.path.suffix == ".parquet":
+                self._arrow_table(empty)
+                self._open_parquet(empty.crs)
+            else:
+                self._open_geojson(empty.crs)
+        if self.path.suffix != ".parquet":
+            self._sink.write("\n]\n}\n")
+        self._sink.close()
+        self._sink = None
+        os.replace(self.partial_path, self.path)
+        remove_siblings(self.path)
+
+    def abort(self):
+        """Drops what was written, leaving any previous output in place."""
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+        self.partial_path.unlink(missing_ok=True)
+
+    # GeoParquet: one row group per batch, WKB geometry, 'geo' schema metadata
+    def _arrow_table(self, gdf):
+        import pyarrow as pa
+        attrs = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+        attrs["geometry"] = shapely.to_wkb(gdf.geometry.values)
+        if self._schema is None:
+            table = pa.Table.from_pandas(attrs, preserve_index=False)
+            # An all-null column in the first batch can't fix the column type
+            fields = [pa.field(f.name, pa.binary() if f.name == "geometry" else pa.string())
+                      if pa.types.is_null(f.type) else f for f in table.schema]
+            self._schema = pa.schema(fields, metadata=table.schema.metadata)
+        return pa.Table.from_pandas(attrs, schema=self._schema, preserve_index=False)
+
+    def _open_parquet(self, crs):
+        import pyarrow.parquet as pq
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        geo = {"version": "1.0.0", "primary_column": "geometry",
+               "columns": {"geometry": {"encoding": "WKB", "geometry_types": [],
+                                        "crs": crs.to_json_dict() if crs is not None else None}}}
+        metadata = {**(self._schema.metadata or {}), b"geo": json.dumps(geo).encode()}
+        self._sink = pq.ParquetWriter(self.partial_path, self._schema.with_metadata(metadata))
+
+    # GeoJSON: the FeatureCollection is written by hand around each batch's features
+    def _open_geojson(self, crs):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._sink = open(self.partial_path, "w", encoding="utf-8")
+        header = {"type": "FeatureCollection", "name": self.path.stem}
+        epsg = crs.to_epsg() if crs is not None else None
+        if epsg not in (None, 4326):
+            header["crs"] = {"type": "name", "properties": {"name": f"urn:ogc:def:crs:EPSG::{epsg}"}}
+        self._sink.write(json.dumps(header)[:-1] + ',\n"features": [\n')
+
+    def _write_features(self, gdf):
+        geoms = gdf.geometry.values
+        if self.precision is not None:
+            geoms = shapely.transform(geoms, lambda xy: xy.round(self.precision))
+        attrs = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+        records = attrs.astype(object).where(attrs.notna(), None).to_dict("records")
+        features = (
+            f'{{"type": "Feature", "properties": {json.dumps(props, default=str)}, "geometry": {geom or "null"}}}'
+            for props, geom in zip(records, shapely.to_geojson(geoms))
+        )
+        sep = ",\n" if self.count else ""
+        self._sink.write(sep + ",\n".join(features))
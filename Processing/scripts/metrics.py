@@ -0,0 +1,352 @@
+"""
+Run metrics and profiling.
+
+A run (start_run) records, per stage and per layer:
+  wall_s / cpu_s   - wall and CPU seconds (a stage's CPU includes its threads
+                     and the worker processes it waited for)
+  peak_rss_mb      - peak resident memory during the stage (Linux resets the
+                     high-water mark per stage; elsewhere it is the process peak,
+                     and null on Windows)
+  http_requests / http_bytes
+                   - requests made and response body bytes, counted by a
+                     requests response hook (see record_response)
+  features         - features written
+  steps            - seconds spent in named steps (download, clip, topology,
+                     vectorize, ...) so a slow layer shows where its time went
+write_report dumps it all as JSON. With profiling on, each stage also runs
+under cProfile (or pyinstrument) and its output is saved next to the report.
+
+Nothing is recorded while no run is active, so the stage scripts can still be
+run on their own.
+"""
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    # POSIX only; on Windows peak memory and worker CPU go unrecorded
+    resource = None
+
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+_run = None
+_local = threading.local()
+
+
+def new_record():
+    return {"wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": None, "http_requests": 0, "http_bytes": 0,
+            "features": None, "steps": {}}
+
+
+class Run:
+    def __init__(self, profile=None, profile_dir=None):
+        self.id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.started = time.time()
+        self.profile = profile
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.stages = {}
+        self.stage_name = None
+        self.lock = threading.Lock()
+
+    @property
+    def stage(self):
+        return self.stages.get(self.stage_name)
+
+    def to_dict(self):
+        stages = self.stages.values()
+        return {
+            "run_id": self.id,
+            "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+            "wall_s": time.time() - self.started,
+            "peak_rss_mb": max((s["peak_rss_mb"] or 0 for s in stages), default=None),
+            "http_requests": sum(s["http_requests"] for s in stages),
+            "http_bytes": sum(s["http_bytes"] for s in stages),
+            "stages": self.stages,
+        }
+
+
+def start_run(profile=None, profile_dir=None):
+    """Starts recording. profile: None, 'cprofile' or 'pyinstrument'."""
+    global _run
+    _run = Run(profile, profile_dir)
+    return _run
+
+
+def current_run():
+    return _run
+
+
+# -----------------------------
+# MEASUREMENTS
+# -----------------------------
+def peak_rss_mb():
+    # VmHWM is per process image (ru_maxrss survives exec) and can be reset
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak_rss():
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def children_cpu():
+    """CPU seconds of waited-for child processes, or None where that isn't available."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def start_profiler(kind):
+    if kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed; profiling with cProfile")
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def save_profile(profiler, out_dir, name):
+    """Writes <name>.prof + <name>.txt (cProfile) or <name>.html + <name>.txt (pyinstrument)."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    name = name.replace(":", "-")  # target names, e.g. process:parcels
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.dump_stats(out_dir / f"{name}.prof")
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(40)
+        (out_dir / f"{name}.txt").write_text(text.getvalue())
+    else:
+        profiler.stop()
+        (out_dir / f"{name}.html").write_text(profiler.output_html())
+        (out_dir / f"{name}.txt").write_text(profiler.output_text())
+    print(f"Profile for {name} saved to {out_dir}")
+
+
+# -----------------------------
+# SCOPES
+# -----------------------------
+@contextmanager
+def stage(name):
+    """Measures a pipeline stage; layers and steps inside it are recorded under it."""
+    if _run is None:
+        yield None
+        return
+    record = _run.stages.setdefault(name, {**new_record(), "layers": {}})
+    _run.stage_name = name
+    reset_peak_rss()
+    profiler = start_profiler(_run.profile) if _run.profile else None
+    wall, cpu, child_cpu = time.perf_counter(), time.process_time(), children_cpu()
+    try:
+        yield record
+    finally:
+        record["wall_s"] += time.perf_counter() - wall
+        record["cpu_s"] += time.process_time() - cpu
+        if child_cpu is not None:
+            record["cpu_s"] += children_cpu() - child_cpu
+        peak = peak_rss_mb()
+        if peak is not None:
+            record["peak_rss_mb"] = max(record["peak_rss_mb"] or 0, peak)
+        if profiler is not None:
+            save_profile(profiler, _run.profile_dir or Path.cwd(), name)
+        _run.stage_name = None
+
+
+@contextmanager
+def layer(name):
+    """Measures one layer of the current stage on this thread (CPU is this thread's)."""
+    if _run is None or _run.stage is None:
+        yield None
+        return
+    with _run.lock:
+        record = _run.stage["layers"].setdefault(name, new_record())
+    with use_scope(record):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] += time.perf_counter() - wall
+            record["cpu_s"] += time.thread_time() - cpu
+
+
+def current_scope():
+    """The layer record this thread is working on, if any."""
+    return getattr(_local, "layer", None)
+
+
+@contextmanager
+def use_scope(record):
+    """Attributes this thread's steps and requests to record (e.g. in a worker thread)."""
+    previous = current_scope()
+    _local.layer = record
+    try:
+        yield
+    finally:
+        _local.layer = previous
+
+
+def bind(func):
+    """func wrapped to run under the calling thread's layer scope, for thread pools."""
+    record = current_scope()
+    if record is None:
+        return func
+
+    def bound(*args, **kwargs):
+        with use_scope(record):
+            return func(*args, **kwargs)
+    return bound
+
+
+def targets():
+    # The thread's layer and its stage, so stage totals include every layer
+    if _run is None or _run.stage is None:
+        return []
+    scope = current_scope()
+    return [_run.stage] if scope is None else [_run.stage, scope]
+
+
+@contextmanager
+def step(name):
+    """Adds the time spent in the block to the current layer's (and stage's) steps[name]."""
+    records = targets()
+    if not records:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _run.lock:
+            for record in records:
+                record["steps"][name] = record["steps"].get(name, 0.0) + elapsed
+
+
+def count_features(n):
+    """Adds n written features to the current layer (and stage)."""
+    records = targets()
+    if not records:
+        return
+    with _run.lock:
+        for record in records:
+            record["features"] = (record["features"] or 0) + int(n)
+
+
+def record_response(response, *args, **kwargs):
+    """
+    requests response hook counting each request and its body bytes. Streamed
+    responses count their Content-Length; others are read here, as requests
+    would do right after the hook anyway.
+    """
+    records = targets()
+    if not records:
+        return response
+    if kwargs.get("stream"):
+        n_bytes = int(response.headers.get("Content-Length") or 0)
+    else:
+        n_bytes = len(response.content)
+    with _run.lock:
+        for record in records:
+            record["http_requests"] += 1
+            record["http_bytes"] += n_bytes
+    return response
+
+
+HOOKS = {"response": [record_response]}
+
+
+# -----------------------------
+# WORKER PROCESSES
+# -----------------------------
+def measured_job(stage_name, name, func, args, profile=None, profile_dir=None):
+    """
+    Runs func(*args) in a worker process under a fresh run and returns
+    (result, stage record) so the parent can merge_stage it. With profile,
+    the job is profiled on its own as <stage_name>.<name>, since the parent's
+    profile only sees it waiting on the pool.
+    """
+    start_run()
+    with stage(stage_name) as record:
+        profiler = start_profiler(profile) if profile else None
+        try:
+            result = func(*args)
+        finally:
+            if profiler is not None:
+                save_profile(profiler, profile_dir or Path.cwd(), f"{stage_name}.{name}")
+    return result, record
+
+
+def merge_stage(worker_record):
+    """Adds a worker's layers to the current stage; each gets the worker's peak RSS."""
+    if _run is None or _run.stage is None:
+        return
+    with _run.lock:
+        for name, record in worker_record["layers"].items():
+            record["peak_rss_mb"] = worker_record["peak_rss_mb"]
+            _run.stage["layers"][name] = record
+            for key in ("http_requests", "http_bytes"):
+                _run.stage[key] += record[key]
+            if record["features"] is not None:
+                _run.stage["features"] = (_run.stage["features"] or 0) + record["features"]
+            for step_name, seconds in record["steps"].items():
+                _run.stage["steps"][step_name] = _run.stage["steps"].get(step_name, 0.0) + seconds
+
+
+# -----------------------------
+# REPORT
+# -----------------------------
+def write_report(out_dir):
+    """Writes run-<id>.json to out_dir and returns its path (None with no run)."""
+    if _run is None:
+        return None
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"run-{_run.id}.json"
+    with open(path, "w") as f:
+        json.dump(rounded(_run.to_dict()), f, indent=2)
+    return path
+
+
+def rounded(value, digits=3):
+    if isinstance(value, dict):
+        return {k: rounded(v, digits) for k, v in value.items()}
+    if isinstance(value, float):
+        return round(value, digits)
+    return value
+
+
+def print_summary():
+    if _run is None:
+        return
+    print(f"  {'stage':<22} {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'requests':>9} {'MB down':>8} {'features':>9}")
+    for name, s in _run.stages.items():
+        features = "" if s["features"] is None else s["features"]
+        print(f"  {name:<22} {s['wall_s']:8.1f} {s['cpu_s']:8.1f} {s['peak_rss_mb'] or 0:8.0f} "
+              f"{s['http_requests']:9d} {s['http_bytes'] / 1024 ** 2:8.1f} {features:>9}")
+        slowest = sorted(s["steps"].items(), key=lambda kv: kv[1], reverse=True)[:3]
+        if slowest:
+            print("    " + ", ".join(f"{k} {v:.1f}s" for k, v in slowest))
@@ -0,0 +1,310 @@
+"""
+Incremental pipeline runner.
+
+Every output is produced by a target whose fingerprint covers its input files,
+the slice of config / field_mappings it reads and the source of the code that
+builds it. Fingerprints are kept in Data/build_state.json; a target whose
+fingerprint is unchanged and whose outputs still exist is skipped.
+
+Targets:
+  get_data                 - stage-level, always runs: the services can change at
+                             any time, and the HTTP cache (config.yaml cache) is
+                             what keeps an unchanged refetch cheap
+  terrain_derivatives      - stage-level, inputs = raw hunting district
+                             (+ raw roads/trails when access is enabled)
+  process:<layer>          - one per raw file listed in field_mappings.json
+                             (network layers also write <layer>.graph.npz);
+                             built on processing.max_processes processes
+  push_to_map              - stage-level, inputs = every processed file; publishes
+                             content-hashed GeoJSON + manifest.json (changed layers only)
+  vector_tiles             - stage-level, inputs = every processed file
+"""
+import hashlib
+import json
+from pathlib import Path
+
+from scripts import (
+    access_distance, aoi, arcgis_paging, geometry_ops, get_data, http_cache, layer_io, metrics, process_data,
+    terrain_derivatives, tile_download, push_to_map, topology, vector_tiles,
+)
+
+
+PROCESSING_DIR = Path(__file__).parent.parent
+STATE_FILE = "build_state.json"
+
+
+# -----------------------------
+# FINGERPRINTS
+# -----------------------------
+def file_digest(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def code_version(*modules):
+    """Hash of the source files of the given modules."""
+    h = hashlib.sha256()
+    for module in modules:
+        h.update(Path(module.__file__).read_bytes())
+    return h.hexdigest()
+
+
+def fingerprint(inputs, settings, code):
+    """Combines input file digests, a JSON-able settings slice and a code hash."""
+    h = hashlib.sha256()
+    for path in sorted(inputs, key=str):
+        h.update(Path(path).name.encode("utf-8"))
+        h.update(file_digest(path).encode("ascii"))
+    h.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    h.update(code.encode("ascii"))
+    return h.hexdigest()
+
+
+class BuildState:
+    """Fingerprint of the last successful build of each target."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.records = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.records = json.load(f)
+
+    def is_current(self, target, fp):
+        if target.always_stale or self.records.get(target.name) != fp:
+            return False
+        return all(Path(p).exists() for p in target.outputs)
+
+    def record(self, target, fp):
+        self.records[target.name] = fp
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.records, f, indent=2, sort_keys=True)
+
+
+class Target:
+    def __init__(self, name, layer, inputs, outputs, settings, code, action, job=None, always_stale=False):
+        self.name = name
+        self.layer = layer
+        self.inputs = inputs
+        self.outputs = outputs
+        self.settings = settings
+        self.code = code
+        self.action = action
+        # (func, args) equivalent of action that can be sent to a worker process
+        self.job = job
+        # Rebuilt on every run, for outputs that depend on more than the fingerprint sees
+        self.always_stale = always_stale
+
+    def size(self):
+        return sum(Path(p).stat().st_size for p in self.inputs if Path(p).exists())
+
+    def fingerprint(self):
+        missing = [p for p in self.inputs if not Path(p).exists()]
+        if missing:
+            return None
+        return fingerprint(self.inputs, self.settings, self.code)
+
+
+# -----------------------------
+# TARGETS
+# -----------------------------
+def data_dirs(config):
+    raw_dir = PROCESSING_DIR / config["environment"]["raw_data_dir"]
+    processed_dir = PROCESSING_DIR / config["environment"]["processed_data_dir"]
+    return raw_dir, processed_dir
+
+
+def get_data_targets(config):
+    raw_dir, _ = data_dirs(config)
+    fmt = layer_io.intermediate_format(config)
+    settings = {k: config.get(k) for k in ("URLS", "unit", "acquisition")}
+    settings["format"] = fmt
+    # The services are the real input and aren't fingerprinted, so this always
+    # runs; responses still within cache.ttl_hours come from the cache
+    return [Target(
+        "get_data", "get_data", [], [layer_io.layer_path(raw_dir, "hunting_district", fmt)], settings,
+        code_version(get_data, aoi, arcgis_paging, http_cache, layer_io), lambda: get_data.main(config),
+        always_stale=True,
+    )]
+
+
+def terrain_targets(config):
+    raw_dir, _ = data_dirs(config)
+    fmt = layer_io.intermediate_format(config)
+    inputs = [layer_io.find_layer(raw_dir, "hunting_district") or layer_io.layer_path(raw_dir, "hunting_district", fmt)]
+    outputs = [layer_io.layer_path(raw_dir, "elevation_bands", fmt), layer_io.layer_path(raw_dir, "slope_mask", fmt)]
+    access_outputs = access_distance.access_outputs(config, raw_dir, fmt)
+    if access_outputs:
+        # Access rasters are burned from the raw roads/trails
+        layers = config["access"].get("layers", access_distance.DEFAULT_LAYERS)
+        inputs += [p for p in (layer_io.find_layer(raw_dir, name) for name in layers) if p is not None]
+        outputs += access_outputs
+    return [Target(
+        "terrain_derivatives", "terrain_derivatives", inputs, outputs,
+        {"unit": config.get("unit"), "dem": config.get("dem"), "access": config.get("access"), "format": fmt,
+         "tnm_products": config["URLS"].get("TNM_Products")},
+        code_version(terrain_derivatives, access_distance, aoi, http_cache, tile_download, layer_io),
+        lambda: terrain_derivatives.main(config),
+    )]
+
+
+def process_targets(config):
+    raw_dir, processed_dir = data_dirs(config)
+    fmt = layer_io.intermediate_format(config)
+    field_mappings = process_data.load_field_mappings() or {}
+    code = code_version(process_data, process_data.geometry_ops, layer_io, topology)
+    # Streaming only changes how a layer is read, not its output, so it isn't fingerprinted
+    batch_size = int((config.get("processing", {}) or {}).get("stream_batch_size", 0) or 0)
+
+    targets = []
+    for file in layer_io.list_layers(raw_dir):
+        key = process_data.mapping_key(file)
+        if key not in field_mappings:
+            continue
+        outputs = [layer_io.layer_path(processed_dir, file.stem, fmt)]
+        if geometry_ops.is_network_layer(file):
+            outputs.append(topology.graph_path(outputs[0]))
+        args = (file, field_mappings, processed_dir, fmt, batch_size)
+        targets.append(Target(
+            f"process:{file.stem}", file.stem, [file], outputs,
+            field_mappings[key], code,
+            lambda args=args: process_data.process_file(*args), (process_data.process_file, args),
+        ))
+    return targets
+
+
+def push_targets(config):
+    _, processed_dir = data_dirs(config)
+    dest_path = push_to_map.map_data_path(config)
+    # Unchanged layers are reused from the current manifest, so one target is enough
+    return [Target(
+        "push_to_map", "push_to_map", layer_io.list_layers(processed_dir),
+        [push_to_map.manifest_path(dest_path)], config.get("publish"),
+        code_version(push_to_map, layer_io), lambda: push_to_map.push_to_map(config),
+    )]
+
+
+def tile_targets(config):
+    _, processed_dir = data_dirs(config)
+    return [Target(
+        "vector_tiles", "vector_tiles", layer_io.list_layers(processed_dir),
+        [vector_tiles.tiles_dir(config) / "metadata.json"], config.get("tiles"),
+        code_version(vector_tiles), lambda: vector_tiles.build_tiles(config),
+    )]
+
+
+# Stage name in config['steps'] -> target builder. Later stages are built after
+# earlier ones run so they see the files those stages wrote.
+STAGES = [
+    ("get_data", get_data_targets),
+    ("terrain_derivatives", terrain_targets),
+    ("process_data", process_targets),
+    ("push_to_map", push_targets),
+    ("vector_tiles", tile_targets),
+]
+
+
+# -----------------------------
+# RUNNER
+# -----------------------------
+def selected(target, only):
+    if not only:
+        return True
+    names = {o.lower() for o in only}
+    return target.layer.lower() in names or target.name.lower() in names
+
+
+def stage_processes(config, stage):
+    """Worker processes for a stage's targets (process_data only; 1 = in process)."""
+    if stage != "process_data":
+        return 1
+    return int((config.get("processing", {}) or {}).get("max_processes", 1) or 1)
+
+
+def build_jobs(to_build, state, max_processes):
+    """
+    Builds (target, fingerprint) pairs from their jobs, largest inputs first,
+    on up to max_processes processes. A failed target is reported and left
+    unrecorded (so the next run retries it) without stopping the others.
+    """
+    by_name = {target.name: (target, fp) for target, fp in to_build}
+    jobs = [(target.name, target.size(), *target.job) for target, _ in to_build]
+    print(f"Building {len(jobs)} targets with up to {max_processes} process(es)...")
+
+    report = []
+    for name, _, seconds, error in process_data.run_jobs(jobs, max_processes):
+        target, fp = by_name[name]
+        if error is not None:
+            print(f"  {name:<36} FAILED: {error!r}")
+            report.append((name, "failed"))
+            continue
+        state.record(target, fp)
+        state.save()
+        print(f"  {name:<36} rebuilt ({seconds:.1f}s)")
+        report.append((name, "rebuilt"))
+    return report
+
+
+def build_stage(to_build, state, max_processes):
+    """Builds a stage's (target, fingerprint) pairs, recording each one that succeeds."""
+    if all(target.job for target, _ in to_build):
+        return build_jobs(to_build, state, max_processes)
+
+    report = []
+    for target, fp in to_build:
+        print(f"Building {target.name}...")
+        target.action()
+        # Record the fingerprint of the inputs we actually built from
+        state.record(target, fp)
+        state.save()
+        print(f"  {target.name:<36} rebuilt")
+        report.append((target.name, "rebuilt"))
+    return report
+
+
+def run(config, only=None, dry_run=False, force=False):
+    """
+    Runs every enabled stage, skipping targets whose fingerprint is unchanged.
+    only: layer names (e.g. FS_Trails) or target names to restrict the run to.
+    dry_run: report what would rebuild without running anything.
+    force: rebuild selected targets regardless of fingerprints.
+    """
+    raw_dir, _ = data_dirs(config)
+    state = BuildState(raw_dir.parent / STATE_FILE)
+
+    report = []
+    for stage, build_targets in STAGES:
+        if not config["steps"].get(stage):
+            continue
+
+        print(50 * "-")
+        print(f"Stage: {stage}")
+        to_build = []
+        for target in build_targets(config):
+            if not selected(target, only):
+                continue
+
+            fp = target.fingerprint()
+            if fp is None:
+                status = "missing inputs"
+            elif not force and state.is_current(target, fp):
+                status = "up to date"
+            else:
+                status = "would rebuild" if dry_run else "rebuilt"
+
+            if status == "rebuilt":
+                to_build.append((target, fp))
+            else:
+                print(f"  {target.name:<36} {status}")
+                report.append((target.name, status))
+
+        if to_build:
+            with metrics.stage(stage):
+                report += build_stage(to_build, state, stage_processes(config, stage))
+    return report
@@ -1,70 +1,295 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 import geopandas as gpd
 import json
+import tempfile
+import time
 
-from scripts import geometry_ops
+from scripts import geometry_ops, layer_io, metrics, topology
 
-def standardize_schema(file, field_mappings):
-    if file.name not in field_mappings:
-        print(f"Skipping {file.name}: not in field mappings")
-        return None
+def mapping_key(file):
+    # field_mappings.json is keyed by layer name as <name>.geojson, whatever
+    # format the intermediate file is in
+    return f"{file.stem}.geojson"
 
-    # rename fields first
-    field_map = field_mappings[file.name]['field_map']
-    keep_cols = list(field_mappings[file.name]['field_map'].values())
-    
-    print(f"Standardizing {file.name}...")
-    gdf = gpd.read_file(file)
-    
-    # case-insensitive rename
-    actual_columns = {col.lower(): col for col in gdf.columns}
+def source_columns(file, field_map):
+    """
+    The file's columns the field map reads (matched case-insensitively) and
+    the rename to their standard names.
+    """
+    by_lower = {col.lower(): col for col in layer_io.layer_columns(file)}
     rename_map = {}
     for source_col, dest_col in field_map.items():
-        if source_col.lower() in actual_columns:
-            rename_map[actual_columns[source_col.lower()]] = dest_col
-    
+        if source_col.lower() in by_lower:
+            rename_map[by_lower[source_col.lower()]] = dest_col
+    return list(rename_map), rename_map
+
+def standardize_batch(gdf, rename_map, keep_cols, value_map):
+    """Rename, projection and value maps for one GeoDataFrame (a whole layer or a batch of it)."""
     gdf = gdf.rename(columns=rename_map)
-    
+
     # Ensure geometry is preserved and only keep requested columns
     cols_to_keep = [c for c in keep_cols if c in gdf.columns]
     gdf = gdf[cols_to_keep + ['geometry']]
 
     # map values
-    value_map = field_mappings[file.name].get('value_maps', {})
     for col, mapping in value_map.items():
         if col in gdf.columns:
             # fillna(gdf[col]) keeps values not in mapping unchanged
             gdf[col] = gdf[col].map(mapping).fillna(gdf[col])
-            
+
     return gdf
 
+def standardized_batches(file, field_mappings, batch_size):
+    """Yields the standardized layer batch by batch (see layer_io.iter_batches)."""
+    key = mapping_key(file)
+    field_map = field_mappings[key]['field_map']
+    columns, rename_map = source_columns(file, field_map)
+    value_map = field_mappings[key].get('value_maps', {})
+    for batch in layer_io.iter_batches(file, columns, batch_size):
+        yield standardize_batch(batch, rename_map, list(field_map.values()), value_map)
 
-    
-    
+def standardize_schema(file, field_mappings):
+    key = mapping_key(file)
+    if key not in field_mappings:
+        print(f"Skipping {file.name}: not in field mappings")
+        return None
 
-def main(config):
-    data_dir = Path(config['environment']['raw_data_dir'])
-    dest_dir = Path(config['environment']['processed_data_dir'])
-    dest_dir.mkdir(parents=True, exist_ok=True)
-    
-    field_mappings_path = Path("field_mappings.json")
+    print(f"Standardizing {file.name}...")
+    field_map = field_mappings[key]['field_map']
+    # Only read the columns the field map uses
+    columns, rename_map = source_columns(file, field_map)
+    gdf = layer_io.read_layer(file, columns)
+    return standardize_batch(gdf, rename_map, list(field_map.values()), field_mappings[key].get('value_maps', {}))
+
+def load_field_mappings():
+    field_mappings_path = Path(__file__).parent.parent / "field_mappings.json"
     if not field_mappings_path.exists():
         print("Error: field_mappings.json not found")
-        return
+        return None
 
     with open(field_mappings_path) as f:
-        field_mappings = json.load(f)
+        return json.load(f)
 
-    files = list(data_dir.glob("*.geojson"))
-    for file in files:
-        gdf = standardize_schema(file, field_mappings)
-        gdf = geometry_ops.main(file,gdf,field_mappings)
+def export_layer(gdf, name, export_opts):
+    """Applies the layer's export options and prints its before/after size."""
+    vertices, nbytes = geometry_ops.geometry_size(gdf)
+    gdf = geometry_ops.simplify_for_export(gdf, **export_opts)
+    out_vertices, out_bytes = geometry_ops.geometry_size(gdf)
+    print(f"Export {name}: {vertices} -> {out_vertices} vertices, "
+          f"{nbytes / 1024:.0f} -> {out_bytes / 1024:.0f} KB of geometry "
+          f"({(1 - out_bytes / max(nbytes, 1)) * 100:.0f}% smaller)")
+    return gdf
+
+def streamable(file, field_mappings):
+    """
+    True when every step for the layer works feature by feature. Topology,
+    the parcel dissolve and coverage simplification need the whole layer;
+    for those only standardize is streamed (see standardize_streamed).
+    """
+    export_opts = field_mappings[mapping_key(file)].get("export") or {}
+    return not (geometry_ops.is_network_layer(file) or "parcels" in file.name or export_opts.get("coverage"))
+
+def stream_file(file, field_mappings, dest_dir, fmt, batch_size):
+    """
+    process_file in batches of batch_size features: each batch is read,
+    standardized, simplified for export and appended to the output, so memory
+    stays bounded by the batch size.
+    """
+    print(f"Streaming {file.name} in batches of {batch_size}...")
+    export_opts = field_mappings[mapping_key(file)].get("export")
+    write_opts = {}
+    if export_opts and export_opts.get("decimals") is not None and fmt == "geojson":
+        write_opts["COORDINATE_PRECISION"] = int(export_opts["decimals"])
+
+    start = time.perf_counter()
+    out_path = layer_io.layer_path(dest_dir, file.stem, fmt)
+    with layer_io.LayerWriter(out_path, **write_opts) as writer, metrics.step("stream"):
+        for batch in standardized_batches(file, field_mappings, batch_size):
+            if export_opts:
+                batch = geometry_ops.simplify_for_export(batch, **export_opts)
+            writer.write(batch)
+    elapsed = time.perf_counter() - start
+    metrics.count_features(writer.count)
+    print(f"Saved processed file to {out_path}: {writer.count} features in {elapsed:.1f}s "
+          f"({writer.count / max(elapsed, 1e-9):.0f} features/s)")
+    return out_path
+
+def standardize_streamed(file, field_mappings, batch_size, dest_dir, fmt):
+    """
+    standardize_schema in batches: the standardized layer is streamed to an
+    intermediate file and read back, so the raw layer is never held whole and
+    only the mapped columns reach the whole-layer steps (e.g. the parcel
+    dissolve gets geometry, Owner and Total_Value).
+    """
+    print(f"Standardizing {file.name} in batches of {batch_size}...")
+    with tempfile.TemporaryDirectory(dir=dest_dir) as tmp:
+        path = layer_io.layer_path(Path(tmp), file.stem, fmt)
+        with layer_io.LayerWriter(path) as writer:
+            for batch in standardized_batches(file, field_mappings, batch_size):
+                writer.write(batch)
+        return layer_io.read_layer(path)
+
+def process_file(file, field_mappings, dest_dir, fmt=layer_io.DEFAULT_FORMAT, batch_size=None):
+    """
+    batch_size: stream layers that allow it (see streamable) in batches of
+    this many features instead of loading them whole; other layers still
+    stream their standardize step.
+    """
+    with metrics.layer(file.stem):
+        batched = bool(batch_size) and mapping_key(file) in field_mappings
+        if batched and streamable(file, field_mappings):
+            return stream_file(file, field_mappings, dest_dir, fmt, batch_size)
+
+        with metrics.step("standardize"):
+            if batched:
+                dest_dir.mkdir(parents=True, exist_ok=True)
+                gdf = standardize_streamed(file, field_mappings, batch_size, dest_dir, fmt)
+            else:
+                gdf = standardize_schema(file, field_mappings)
+        if gdf is None:
+            return None
+        gdf, graph = geometry_ops.main(file,gdf,field_mappings)
         if gdf is not None:
-            out_path = dest_dir / file.name
-            gdf.to_file(out_path, driver="GeoJSON")
-            print(f"Saved processed file to {out_path}")
+            write_opts = {}
+            layer_opts = field_mappings[mapping_key(file)]
+            export_opts = layer_opts.get("export")
+            if export_opts:
+                with metrics.step("export"):
+                    gdf = export_layer(gdf, file.name, export_opts)
+                    if graph is not None:
+                        # Simplifying and rounding move vertices and junctions, so
+                        # the saved graph is rebuilt from the geometry as published
+                        snap_m = layer_opts.get("topology", {}).get("snap_tolerance_m", 0.0)
+                        graph = geometry_ops.network_graph(gdf, snap_m)
+                if export_opts.get("decimals") is not None and fmt == "geojson":
+                    write_opts["COORDINATE_PRECISION"] = int(export_opts["decimals"])
+
+            with metrics.step("write"):
+                out_path = layer_io.write_layer(gdf, layer_io.layer_path(dest_dir, file.stem, fmt), **write_opts)
+                if graph is not None:
+                    graph.save(topology.graph_path(out_path))
+            metrics.count_features(len(gdf))
+            print(f"Saved processed file to {out_path} ({out_path.stat().st_size / 1024:.0f} KB)")
+            return out_path
+        return None
+
+def timed_job(func, args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def run_pool(jobs, workers, run=None):
+    """
+    Runs jobs on one pool of workers processes, yielding (name, result,
+    seconds, error) as they finish. Returns the jobs left unfinished, in
+    submit order, when a worker died (e.g. killed for running out of memory)
+    and took the pool down with it.
+    """
+    unfinished = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for i, (name, _, func, args) in enumerate(jobs):
+            try:
+                if run is not None:
+                    future = pool.submit(metrics.measured_job, run.stage_name, name, timed_job, (func, args),
+                                         run.profile, run.profile_dir)
+                else:
+                    future = pool.submit(timed_job, func, args)
+            except BrokenProcessPool:
+                unfinished += range(i, len(jobs))
+                break
+            futures[future] = i
+        for future in as_completed(futures):
+            name = jobs[futures[future]][0]
+            try:
+                if run is not None:
+                    (result, seconds), record = future.result()
+                    metrics.merge_stage(record)
+                else:
+                    result, seconds = future.result()
+                yield name, result, seconds, None
+            except BrokenProcessPool:
+                unfinished.append(futures[future])
+            except Exception as e:
+                yield name, None, 0.0, e
+    return [jobs[i] for i in sorted(unfinished)]
+
+def run_jobs(jobs, max_processes=1):
+    """
+    Runs (name, size, func, args) jobs, largest size first, on up to
+    max_processes processes (1 = in this process). A job that raises doesn't
+    stop the others. Yields (name, result, seconds, error) as jobs finish.
+    """
+    jobs = sorted(jobs, key=lambda job: job[1], reverse=True)
+    if max_processes <= 1 or len(jobs) <= 1:
+        for name, _, func, args in jobs:
+            try:
+                result, seconds = timed_job(func, args)
+                yield name, result, seconds, None
+            except Exception as e:
+                yield name, None, 0.0, e
+        return
+
+    # The pool queue is FIFO, so the largest layers start first and the small
+    # ones fill in around them. Workers send their layer metrics back with the
+    # result when a run is being recorded.
+    run = metrics.current_run()
+    workers = min(max_processes, len(jobs))
+    while jobs:
+        jobs = yield from run_pool(jobs, workers, run)
+        if not jobs:
+            return
+        # A dead worker breaks every pending job, not just its own: retry the
+        # unfinished ones with fewer workers (less memory) until, with one, the
+        # job that was running when the pool broke is known to be the culprit.
+        if workers == 1:
+            name = jobs.pop(0)[0]
+            yield name, None, 0.0, BrokenProcessPool(f"worker process died while running {name}")
+        workers = max(workers // 2, 1)
+        if jobs:
+            print(f"A worker process died; retrying {len(jobs)} unfinished job(s) with {workers} process(es)")
+
+def main(config):
+    # Resolve data dirs relative to the Processing dir, like the other steps
+    processing_dir = Path(__file__).parent.parent
+    data_dir = processing_dir / config['environment']['raw_data_dir']
+    dest_dir = processing_dir / config['environment']['processed_data_dir']
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    
+    field_mappings = load_field_mappings()
+    if field_mappings is None:
+        return
+
+    fmt = layer_io.intermediate_format(config)
+    processing_opts = config.get('processing', {}) or {}
+    batch_size = int(processing_opts.get('stream_batch_size', 0) or 0)
+    max_processes = int(processing_opts.get('max_processes', 1) or 1)
+
+    jobs = []
+    for file in layer_io.list_layers(data_dir):
+        if mapping_key(file) not in field_mappings:
+            print(f"Skipping {file.name}: not in field mappings")
+            continue
+        jobs.append((file.name, file.stat().st_size, process_file,
+                     (file, field_mappings, dest_dir, fmt, batch_size)))
+
+    start = time.perf_counter()
+    failed = []
+    for name, _, seconds, error in run_jobs(jobs, max_processes):
+        if error is not None:
+            print(f"Error processing {name}: {error!r}")
+            failed.append(name)
+        else:
+            print(f"Processed {name} in {seconds:.1f}s")
+    print(f"process_data: {len(jobs) - len(failed)} of {len(jobs)} layers in "
+          f"{time.perf_counter() - start:.1f}s with {max_processes} process(es)"
+          + (f"; failed: {', '.join(failed)}" if failed else ""))
+    return failed
 
 if __name__ == "__main__":
     import yaml
     config = yaml.safe_load(open("P:\\0_Projects\\onX\\onX-Hunt-Project\\Processing\\config.yaml"))
-    main(config)
\ No newline at end of file
+    if main(config):
+        raise SystemExit(1)
\ No newline at end of file
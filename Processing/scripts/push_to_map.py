@@ -1,38 +1,263 @@
+"""
+Publish stage: processed layers -> the map's data dir.
+
+Every layer is published as GeoJSON under a content-hashed name
+(assets/<layer>.<hash>.geojson), next to pre-built .gz and .br variants,
+and listed in manifest.json, which is the only file the map needs to know
+by name:
+
+  {"version": ..., "published": ...,
+   "layers": {"parcels": {"url": "assets/parcels.3f9c0a1b2d4e.geojson", "sha256": ..., "bytes": ...,
+                          "encodings": {"gzip": bytes, "br": bytes}, "source": ...,
+                          "grid": {"cell": 0.05, "chunks": {"-2293_974": {"url": ..., "bytes": ...,
+                                                                          "encodings": {...}}}}}}}
+
+Layers listed in publish.grid are also split into a grid of cell x cell
+degree chunks (keyed "<floor(lon / cell)>_<floor(lat / cell)>") so the map
+can fetch only the chunks in view. A feature goes to every chunk it touches
+with the same id, for the map to drop the duplicates.
+
+Hashed files never change once written, so they can be cached forever and
+only layers whose content changed are converted, copied and compressed again
+(a layer whose processed file has the same digest as last time reuses its
+published file). A run writes its new files into a staging dir, moves them
+into assets/ and then renames the new manifest over the old one, so the map
+sees either the previous dataset or the new one, never a mix. Files of the
+previous manifest are kept for maps that loaded it; older ones are removed.
+"""
+import gzip
+import hashlib
+import json
+import os
 import shutil
+import math
+import tempfile
+from datetime import datetime
 from pathlib import Path
 
+import numpy as np
+import shapely
+
+from scripts import layer_io, metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MANIFEST = "manifest.json"
+ASSETS_DIR = "assets"
+HASH_LENGTH = 12  # hex digits of the content hash kept in file names
+ENCODINGS = {"gzip": ".gz", "br": ".br"}
+
+
+def map_data_path(config):
+    processing_dir = Path(__file__).parent.parent
+    return (processing_dir / Path(config['environment']['map_data_dir'])).resolve()
+
+def manifest_path(dest_path):
+    return dest_path / MANIFEST
+
+def publish_options(config):
+    """(encodings to pre-compress, brotli quality, {layer: grid cell in degrees})"""
+    opts = config.get('publish', {}) or {}
+    encodings = [e for e in opts.get('encodings', list(ENCODINGS)) if e in ENCODINGS]
+    if "br" in encodings and brotli is None:
+        print("brotli is not installed; skipping .br variants")
+        encodings.remove("br")
+    grid = {name.lower(): float(cell) for name, cell in (opts.get('grid', {}) or {}).items()}
+    return encodings, int(opts.get('brotli_quality', 11)), grid
+
+def load_manifest(dest_path):
+    path = manifest_path(dest_path)
+    if not path.exists():
+        return {"layers": {}}
+    with open(path) as f:
+        return json.load(f)
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# -----------------------------
+# ONE LAYER
+# -----------------------------
+def compress(path, encodings, brotli_quality=11):
+    """Writes <path>.gz / <path>.br next to path; returns {encoding: bytes}."""
+    data = path.read_bytes()
+    sizes = {}
+    for encoding in encodings:
+        if encoding == "gzip":
+            # mtime=0 keeps the output identical for identical input
+            packed = gzip.compress(data, compresslevel=9, mtime=0)
+        else:
+            packed = brotli.compress(data, quality=brotli_quality)
+        Path(f"{path}{ENCODINGS[encoding]}").write_bytes(packed)
+        sizes[encoding] = len(packed)
+    return sizes
+
+def asset_files(dest_path, entry):
+    """The published files of a manifest entry (whole layer and grid chunks) and their compressed variants."""
+    paths = []
+    for item in [entry, *(entry.get("grid") or {}).get("chunks", {}).values()]:
+        path = dest_path / item["url"]
+        paths += [path] + [Path(f"{path}{ENCODINGS[e]}") for e in item.get("encodings", {})]
+    return paths
+
+def is_reusable(dest_path, entry, source, encodings, cell):
+    if entry is None or entry.get("source") != source:
+        return False
+    if sorted(entry.get("encodings", {})) != sorted(encodings):
+        return False
+    if (entry.get("grid") or {}).get("cell") != cell:
+        return False
+    return all(p.exists() for p in asset_files(dest_path, entry))
+
+def write_chunks(gdf, layer, cell, staging_dir, encodings, brotli_quality=11):
+    """Writes gdf as a grid of cell x cell degree GeoJSON chunks into staging_dir; returns the grid entry."""
+    gdf = gdf.to_crs(4326).reset_index(drop=True)
+    geoms = gdf.geometry.values
+    bounds = gdf.total_bounds
+    if not np.isfinite(bounds).all():
+        return {"cell": cell, "chunks": {}}
+    minx, miny, maxx, maxy = bounds
+    gx, gy = np.meshgrid(np.arange(math.floor(minx / cell), math.floor(maxx / cell) + 1),
+                         np.arange(math.floor(miny / cell), math.floor(maxy / cell) + 1))
+    gx, gy = gx.ravel(), gy.ravel()
+    cells = shapely.box(gx * cell, gy * cell, (gx + 1) * cell, (gy + 1) * cell)
+    cell_idx, feat_idx = shapely.STRtree(geoms).query(cells, predicate="intersects")
+
+    features = json.loads(gdf.to_json(drop_id=True))["features"]
+    for i, feature in enumerate(features):
+        feature["id"] = i
+
+    chunks = {}
+    for c in np.unique(cell_idx):
+        data = json.dumps(
+            {"type": "FeatureCollection", "features": [features[i] for i in feat_idx[cell_idx == c]]},
+            separators=(",", ":"),
+        ).encode("utf-8")
+        key = f"{gx[c]}_{gy[c]}"
+        url = f"{ASSETS_DIR}/{layer}.{key}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}.geojson"
+        path = staging_dir / url
+        path.write_bytes(data)
+        chunks[key] = {"url": url, "bytes": len(data), "encodings": compress(path, encodings, brotli_quality)}
+    return {"cell": cell, "chunks": chunks}
+
+def publish_file(file, dest_path, staging_dir, encodings, brotli_quality=11, cell=None, previous=None):
+    """
+    Publishes one processed layer into staging_dir (as it will sit under
+    dest_path) and returns its manifest entry. cell: grid cell size in degrees
+    to also publish it as chunks. previous: the layer's entry in the current
+    manifest, reused as is when the processed file hasn't changed.
+    """
+    with metrics.layer(file.stem):
+        with metrics.step("hash"):
+            source = sha256_file(file)
+        if is_reusable(dest_path, previous, source, encodings, cell):
+            print(f"Unchanged {file.name}")
+            return previous
+
+        work_path = staging_dir / f"{file.stem}.geojson"
+        gdf = None
+        if file.suffix == ".geojson":
+            # The map only reads GeoJSON, whatever the intermediate format
+            with metrics.step("copy"):
+                shutil.copy(file, work_path)
+        else:
+            with metrics.step("convert"):
+                gdf = layer_io.read_layer(file)
+                layer_io.write_layer(gdf, work_path)
+            metrics.count_features(len(gdf))
+
+        with metrics.step("hash"):
+            digest = sha256_file(work_path)
+        url = f"{ASSETS_DIR}/{file.stem}.{digest[:HASH_LENGTH]}.geojson"
+        staged = staging_dir / url
+        staged.parent.mkdir(parents=True, exist_ok=True)
+        work_path.replace(staged)
+        with metrics.step("compress"):
+            sizes = compress(staged, encodings, brotli_quality)
+
+        entry = {"url": url, "sha256": digest, "bytes": staged.stat().st_size, "encodings": sizes, "source": source}
+        if cell:
+            with metrics.step("chunk"):
+                if gdf is None:
+                    gdf = layer_io.read_layer(file)
+                entry["grid"] = write_chunks(gdf, file.stem, cell, staging_dir, encodings, brotli_quality)
+            print(f"Published {file.name} as {url} and {len(entry['grid']['chunks'])} grid chunks")
+        else:
+            print(f"Published {file.name} as {url}")
+        return entry
+
+
+# -----------------------------
+# PUBLISH
+# -----------------------------
+def swap_in(staging_dir, dest_path, manifest):
+    """Moves the staged assets into place, then the manifest; the manifest rename is the switch."""
+    staged_assets = staging_dir / ASSETS_DIR
+    if staged_assets.exists():
+        (dest_path / ASSETS_DIR).mkdir(parents=True, exist_ok=True)
+        for path in staged_assets.iterdir():
+            os.replace(path, dest_path / ASSETS_DIR / path.name)
+
+    staged_manifest = staging_dir / MANIFEST
+    with open(staged_manifest, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(staged_manifest, manifest_path(dest_path))
+
+def prune(dest_path, *manifests):
+    """Removes assets no given manifest refers to, and the unhashed GeoJSON of earlier versions."""
+    keep = {p.name for m in manifests for entry in m["layers"].values() for p in asset_files(dest_path, entry)}
+    removed = 0
+    assets_dir = dest_path / ASSETS_DIR
+    old_files = list(assets_dir.iterdir()) if assets_dir.exists() else []
+    old_files += list(dest_path.glob("*.geojson"))
+    for path in old_files:
+        if path.is_file() and path.name not in keep:
+            path.unlink()
+            removed += 1
+    return removed
+
 def push_to_map(config):
+    """Publishes every processed layer; returns the manifest path."""
     print("Pushing data to map...")
-    
+
     processing_dir = Path(__file__).parent.parent
-    
-    dirs_to_check = [
-        processing_dir / config['environment']['processed_data_dir']
-    ]
-
-    dest_dir = Path(config['environment']['map_data_dir'])
-    dest_path = (processing_dir / dest_dir).resolve()
-    
-    if not dest_path.exists():
-        print(f"Creating destination directory: {dest_path}")
-        dest_path.mkdir(parents=True, exist_ok=True)
-    else:
-        print(f"Clearing old GeoJSON files from {dest_path}...")
-        for old_file in dest_path.glob("*.geojson"):
-            old_file.unlink()
-
-    count = 0
-    for source_dir in dirs_to_check:
-        print(f"DEBUG: Checking {source_dir.resolve()}")
-        if not source_dir.exists():
-            print(f"DEBUG: {source_dir} does not exist!")
-            continue
-            
-        print(f"Scanning {source_dir.name}...")
-        files = list(source_dir.glob("*.geojson"))
+    source_dir = processing_dir / config['environment']['processed_data_dir']
+    dest_path = map_data_path(config)
+    dest_path.mkdir(parents=True, exist_ok=True)
+    encodings, brotli_quality, grid = publish_options(config)
+
+    files = layer_io.list_layers(source_dir) if source_dir.exists() else []
+    if not files:
+        print(f"No processed layers in {source_dir}")
+
+    current = load_manifest(dest_path)
+    layers = {}
+    # Same filesystem as dest_path, so the renames in swap_in are atomic
+    with tempfile.TemporaryDirectory(prefix=".staging-", dir=dest_path) as staging:
+        staging_dir = Path(staging)
         for file in files:
-            shutil.copy(file, dest_path / file.name)
-            print(f"Copied {file.name}")
-            count += 1
-            
-    print(f"Pushed {count} files to map.")
\ No newline at end of file
+            layers[file.stem] = publish_file(
+                file, dest_path, staging_dir, encodings, brotli_quality,
+                grid.get(file.stem.lower()), current["layers"].get(file.stem),
+            )
+
+        version = hashlib.sha256(json.dumps(
+            {name: [entry["sha256"], (entry.get("grid") or {}).get("cell")] for name, entry in layers.items()},
+            sort_keys=True,
+        ).encode("utf-8")).hexdigest()[:HASH_LENGTH]
+        manifest = {"version": version, "published": datetime.now().isoformat(timespec="seconds"), "layers": layers}
+        swap_in(staging_dir, dest_path, manifest)
+
+    changed = sum(1 for name, entry in layers.items() if current["layers"].get(name) is not entry)
+    removed = prune(dest_path, manifest, current)
+    print(f"Published {len(layers)} layers ({changed} changed, {removed} old files removed), version {version}.")
+    return manifest_path(dest_path)
@@ -5,18 +5,28 @@ os.environ["PROJ_LIB"] = str(proj_dir)
 
 
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from xml.sax.saxutils import escape
 import math
+import time
 
 import numpy as np
 import rasterio
 from rasterio.merge import merge
-from rasterio.features import shapes
+from rasterio.features import shapes, sieve
+from rasterio.windows import Window
 from rasterio.warp import calculate_default_transform, reproject, Resampling
 import requests
 import geopandas as gpd
+import pandas as pd
+import shapely
 from shapely.geometry import shape
 
+from scripts import layer_io, metrics
+from scripts.aoi import AOI, as_aoi
+from scripts.http_cache import cache_from_config
+from scripts.tile_download import download_tiles
 
 
 # Use the working hostname
@@ -35,14 +45,16 @@ PROJECTED_CRS = "EPSG:3857"
 # -----------------------------
 # TNM HELPERS
 # -----------------------------
-def tnm_search_dem_tiles(bbox):
+def tnm_search_dem_items(bbox, cache=None, products_url=TNM_PRODUCTS_URL):
     """
-    Returns a list of download URLs for DEM tiles that intersect the bbox.
+    Returns the TNM product items (downloadURL, sizeInBytes, ...) for DEM tiles that intersect the bbox.
     bbox: (min_lon, min_lat, max_lon, max_lat) in WGS84
+    cache: optional ResponseCache for the product search pages
+    products_url: the TNM products API (URLS.TNM_Products in config.yaml overrides it)
     """
     bbox_str = ",".join(str(v) for v in bbox)
 
-    urls = []
+    found = []
     offset = 0
 
     while True:
@@ -55,41 +67,32 @@ def tnm_search_dem_tiles(bbox):
             "offset": str(offset),
         }
 
-        r = requests.get(TNM_PRODUCTS_URL, params=params, timeout=120)
-        r.raise_for_status()
-        data = r.json()
+        if cache is not None:
+            data = cache.fetch_json(requests, "GET", products_url, params)
+        else:
+            r = requests.get(products_url, params=params, timeout=120, hooks=metrics.HOOKS)
+            r.raise_for_status()
+            data = r.json()
 
         items = data.get("items", [])
         if not items:
             break
 
         for item in items:
-            url = item.get("downloadURL")
-            if url:
-                urls.append(url)
+            if item.get("downloadURL"):
+                found.append(item)
 
         if len(items) < MAX_ITEMS:
             break
 
         offset += MAX_ITEMS
 
-    return urls
+    return found
 
 
-def download_file(url, out_path):
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-
-    if out_path.exists() and out_path.stat().st_size > 0:
-        return out_path
-
-    with requests.get(url, stream=True, timeout=300) as r:
-        r.raise_for_status()
-        with open(out_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=1024 * 1024):
-                if chunk:
-                    f.write(chunk)
-
-    return out_path
+def tnm_search_dem_tiles(bbox, cache=None, products_url=TNM_PRODUCTS_URL):
+    """Returns a list of download URLs for DEM tiles that intersect the bbox."""
+    return [item["downloadURL"] for item in tnm_search_dem_items(bbox, cache, products_url)]
 
 
 # -----------------------------
@@ -125,22 +128,85 @@ def merge_geotiffs(tif_paths, out_tif):
             s.close()
 
 
-def compute_slope_degrees(dem, transform, nodata_value):
+# GDAL band type names for the dtypes TNM DEMs come in
+GDAL_TYPES = {
+    "uint8": "Byte", "int16": "Int16", "uint16": "UInt16", "int32": "Int32",
+    "uint32": "UInt32", "float32": "Float32", "float64": "Float64",
+}
+
+
+def build_vrt(tif_paths, out_vrt):
     """
-    Computes slope (degrees) using finite differences.
-    Handles WGS84 input by estimating meters/degree based on center latitude.
+    Writes a mosaic VRT referencing tif_paths instead of materializing a merge.
+    Assumes the tiles share CRS, resolution and dtype, as TNM 1/3 arc-second tiles do.
     """
-    dem = dem.astype(np.float32)
+    tiles = []
+    for p in tif_paths:
+        with rasterio.open(p) as src:
+            tiles.append((Path(p).resolve(), src.bounds, src.width, src.height))
+            crs_wkt, (res_x, res_y) = src.crs.to_wkt(), src.res
+            dtype, nodata = src.dtypes[0], src.nodata
+
+    left = min(b.left for _, b, _, _ in tiles)
+    top = max(b.top for _, b, _, _ in tiles)
+    right = max(b.right for _, b, _, _ in tiles)
+    bottom = min(b.bottom for _, b, _, _ in tiles)
+    width = int(round((right - left) / res_x))
+    height = int(round((top - bottom) / res_y))
+
+    nodata_xml = f"<NODATA>{nodata}</NODATA>" if nodata is not None else ""
+    sources = []
+    for path, b, w, h in tiles:
+        x_off = int(round((b.left - left) / res_x))
+        y_off = int(round((top - b.top) / res_y))
+        sources.append(
+            f'    <ComplexSource>\n'
+            f'      <SourceFilename relativeToVRT="0">{escape(str(path))}</SourceFilename>\n'
+            f'      <SourceBand>1</SourceBand>\n'
+            f'      <SrcRect xOff="0" yOff="0" xSize="{w}" ySize="{h}"/>\n'
+            f'      <DstRect xOff="{x_off}" yOff="{y_off}" xSize="{w}" ySize="{h}"/>\n'
+            f'      {nodata_xml}\n'
+            f'    </ComplexSource>'
+        )
+
+    nodata_band = f"    <NoDataValue>{nodata}</NoDataValue>\n" if nodata is not None else ""
+    xml = (
+        f'<VRTDataset rasterXSize="{width}" rasterYSize="{height}">\n'
+        f'  <SRS>{escape(crs_wkt)}</SRS>\n'
+        f'  <GeoTransform>{left!r}, {res_x!r}, 0.0, {top!r}, 0.0, {-res_y!r}</GeoTransform>\n'
+        f'  <VRTRasterBand dataType="{GDAL_TYPES.get(dtype, "Float32")}" band="1">\n'
+        f'{nodata_band}'
+        + "\n".join(sources) +
+        f'\n  </VRTRasterBand>\n'
+        f'</VRTDataset>\n'
+    )
+
+    out_vrt.parent.mkdir(parents=True, exist_ok=True)
+    out_vrt.write_text(xml)
+    return out_vrt
+
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_E2 = 6.69437999014e-3
 
-    if nodata_value is not None:
-        dem_mask = dem == nodata_value
-    else:
-        dem_mask = np.zeros(dem.shape, dtype=bool)
 
+def is_geographic(transform, crs=None):
+    """True for lat/lon rasters. Uses the CRS when known, else falls back to the pixel size."""
+    if crs is not None:
+        return bool(crs.is_geographic)
+    return transform.a < 1.0 # simplistic check for degrees vs meters
+
+
+def cell_size_meters(transform, shape, crs=None):
+    """
+    (xres, yres) in meters for a raster of the given shape.
+    Handles WGS84 input by estimating meters/degree based on center latitude.
+    """
     # Determine resolution in meters
     # If using WGS84 (degrees), scale x/y to meters
-    if transform.a < 1.0: # simplistic check for degrees vs meters
-        height, width = dem.shape
+    if is_geographic(transform, crs):
+        height, width = shape
         # Center lat
         center_x, center_y = transform * (width / 2, height / 2)
         lat_rad = math.radians(center_y)
@@ -157,8 +223,52 @@ def compute_slope_degrees(dem, transform, nodata_value):
         # Assumed projected meters
         xres = transform.a
         yres = abs(transform.e)
+    return xres, yres
+
+
+def geodesic_row_res(transform, n_rows):
+    """
+    Per-row (xres, yres) in meters for a lat/lon raster, from the WGS84
+    ellipsoid at each row's center latitude. Returns two float32 arrays of
+    length n_rows, usable as a lookup for any window sharing these rows.
+    """
+    lat = np.radians(transform.f + transform.e * (np.arange(n_rows) + 0.5))
+    sin2 = np.sin(lat) ** 2
+    w = np.sqrt(1.0 - WGS84_E2 * sin2)
+    # Meridian (M) and prime vertical (N) radii of curvature
+    m_per_deg_lat = np.radians(1.0) * WGS84_A * (1.0 - WGS84_E2) / w ** 3
+    m_per_deg_lon = np.radians(1.0) * WGS84_A * np.cos(lat) / w
+    xres = (abs(transform.a) * m_per_deg_lon).astype(np.float32)
+    yres = (abs(transform.e) * m_per_deg_lat).astype(np.float32)
+    return xres, yres
+
+
+def compute_slope_degrees(dem, transform, nodata_value, res=None, crs=None, per_row=False, row_res=None):
+    """
+    Computes slope (degrees) using finite differences.
+    res: optional (xres, yres) in meters; by default derived from transform
+    (see cell_size_meters). Windowed callers pass the full raster's res so
+    every window uses the same cell size.
+    per_row: for lat/lon DEMs, use the geodesic cell size of each row instead
+    of one center-latitude size; row_res is an optional precomputed
+    geodesic_row_res lookup for these rows.
+    """
+    dem = dem.astype(np.float32)
+
+    if nodata_value is not None:
+        dem_mask = dem == nodata_value
+    else:
+        dem_mask = np.zeros(dem.shape, dtype=bool)
+
+    if per_row and is_geographic(transform, crs):
+        xres, yres = row_res if row_res is not None else geodesic_row_res(transform, dem.shape[0])
+        dz_dy, dz_dx = np.gradient(dem)
+        dz_dx /= xres[:, None]
+        dz_dy /= yres[:, None]
+    else:
+        xres, yres = res if res is not None else cell_size_meters(transform, dem.shape, crs)
+        dz_dy, dz_dx = np.gradient(dem, yres, xres)
 
-    dz_dy, dz_dx = np.gradient(dem, yres, xres)
     slope_rad = np.arctan(np.sqrt(dz_dx * dz_dx + dz_dy * dz_dy))
     slope_deg = slope_rad * (180.0 / math.pi)
 
@@ -167,6 +277,90 @@ def compute_slope_degrees(dem, transform, nodata_value):
     return slope_deg
 
 
+# -----------------------------
+# TILED MULTI-CORE ENGINE
+# -----------------------------
+def row_chunks(n_rows, workers, chunk_rows=None):
+    """(start, stop) row ranges splitting n_rows into roughly 4 chunks per worker."""
+    if chunk_rows is None:
+        chunk_rows = max(64, -(-n_rows // (workers * 4)))
+    return [(r, min(r + chunk_rows, n_rows)) for r in range(0, n_rows, chunk_rows)]
+
+
+def resolve_workers(workers):
+    # 0 / None = one per core
+    return workers or os.cpu_count() or 1
+
+
+def tiled_slope_degrees(dem, transform, nodata_value, res=None, workers=None, chunk_rows=None, out=None,
+                        crs=None, per_row=False):
+    """
+    Multi-threaded compute_slope_degrees with bit-identical output.
+
+    The DEM is split into row chunks padded with a one-row halo, so np.gradient
+    sees the same neighbours as on the whole array. Each chunk's temporaries are
+    reused in place and the result is written straight into a preallocated
+    float32 buffer; NumPy releases the GIL inside these ufuncs so threads scale
+    across cores.
+    """
+    workers = resolve_workers(workers)
+    height, width = dem.shape
+    per_row = per_row and is_geographic(transform, crs)
+    if per_row:
+        xres_rows, yres_rows = geodesic_row_res(transform, height)
+    else:
+        xres, yres = res if res is not None else cell_size_meters(transform, dem.shape, crs)
+    if out is None:
+        out = np.empty(dem.shape, dtype=np.float32)
+
+    def run(chunk):
+        r0, r1 = chunk
+        h0, h1 = max(r0 - 1, 0), min(r1 + 1, height)
+        block = dem[h0:h1].astype(np.float32)
+        if block.shape[0] < 2:
+            # np.gradient needs two rows; only possible for a one-row DEM
+            out[r0:r1] = compute_slope_degrees(dem[r0:r1], transform, nodata_value, res=res, crs=crs)
+            return
+
+        if per_row:
+            dz_dy, dz_dx = np.gradient(block)
+            dz_dx /= xres_rows[h0:h1, None]
+            dz_dy /= yres_rows[h0:h1, None]
+        else:
+            dz_dy, dz_dx = np.gradient(block, yres, xres)
+        inner = slice(r0 - h0, r0 - h0 + (r1 - r0))
+        dz_dx, dz_dy = dz_dx[inner], dz_dy[inner]
+
+        np.multiply(dz_dx, dz_dx, out=dz_dx)
+        np.multiply(dz_dy, dz_dy, out=dz_dy)
+        np.add(dz_dx, dz_dy, out=dz_dx)
+        np.sqrt(dz_dx, out=dz_dx)
+        np.arctan(dz_dx, out=dz_dx)
+        np.multiply(dz_dx, 180.0 / math.pi, out=out[r0:r1])
+
+        if nodata_value is not None:
+            out[r0:r1][block[inner] == nodata_value] = np.nan
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run, row_chunks(height, workers, chunk_rows)))
+    return out
+
+
+def tiled_classify_bands(data, edges, nodata_value, workers=None, chunk_rows=None, out=None):
+    """Multi-threaded classify_bands with bit-identical output, written into a preallocated uint8 buffer."""
+    workers = resolve_workers(workers)
+    if out is None:
+        out = np.empty(data.shape, dtype=np.uint8)
+
+    def run(chunk):
+        r0, r1 = chunk
+        out[r0:r1] = classify_bands(data[r0:r1], edges, nodata_value)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run, row_chunks(data.shape[0], workers, chunk_rows)))
+    return out
+
+
 # -----------------------------
 # CLASSIFICATION + VECTORIZATION
 # -----------------------------
@@ -217,6 +411,72 @@ def vectorize_raster(class_raster, transform, crs, field_name, props_func=None):
     return gpd.GeoDataFrame.from_features(feats, crs=crs)
 
 
+def sieve_pixels(min_area_m2, transform, shape, crs=None):
+    """Minimum region size in pixels for a minimum area in square meters."""
+    if not min_area_m2:
+        return 0
+    xres, yres = cell_size_meters(transform, shape, crs)
+    return int(math.ceil(min_area_m2 / (xres * yres)))
+
+
+def vectorize_classes(class_raster, transform, crs, field_name, props_func=None, aoi=None, min_pixels=0):
+    """
+    Fast path for vectorize_raster.
+
+    - aoi: pixels outside it (all_touched) are zeroed before vectorizing, so
+      no vector clip is needed afterwards
+    - min_pixels: regions smaller than this are sieved into their neighbours
+    - geometries are built in bulk with shapely 2 array constructors and
+      collected into one MultiPolygon per class value
+
+    Returns one feature per class value > 0.
+    """
+    start = time.perf_counter()
+    inside = None
+    if aoi is not None:
+        inside = as_aoi(aoi).mask(class_raster.shape, transform)
+        class_raster = np.where(inside, class_raster, 0).astype(np.uint8)
+    if min_pixels > 1:
+        class_raster = sieve(class_raster, size=min_pixels)
+        if inside is not None:
+            # Sieving can fill small gaps outside the AOI edge; cut them back off
+            class_raster[~inside] = 0
+
+    coords, ring_ids, poly_ids, values = [], [], [], []
+    n_rings = 0
+    for geom, val in shapes(class_raster, mask=class_raster > 0, transform=transform):
+        for ring in geom["coordinates"]:
+            coords.append(ring)
+            ring_ids.append(np.full(len(ring), n_rings))
+            poly_ids.append(len(values))
+            n_rings += 1
+        values.append(int(val))
+
+    if not values:
+        return gpd.GeoDataFrame(columns=["geometry"], crs=crs)
+
+    rings = shapely.linearrings(np.concatenate(coords), indices=np.concatenate(ring_ids))
+    polygons = shapely.polygons(rings, indices=np.asarray(poly_ids))
+
+    # Polygons from shapes() never overlap, so a per-class dissolve is just grouping
+    values = np.asarray(values)
+    order = np.argsort(values, kind="stable")
+    classes = np.unique(values)
+    multi = shapely.multipolygons(polygons[order], indices=np.searchsorted(classes, values[order]))
+
+    rows = []
+    for val in classes:
+        props = {field_name: int(val)}
+        if props_func:
+            props.update(props_func(int(val)))
+        rows.append(props)
+
+    gdf = gpd.GeoDataFrame(rows, geometry=multi, crs=crs)
+    print(f"Vectorized {field_name}: {len(values)} polygons -> {len(gdf)} features "
+          f"in {time.perf_counter() - start:.2f}s")
+    return gdf
+
+
 # -----------------------------
 # MAIN
 # -----------------------------
@@ -232,16 +492,16 @@ def main(config):
     processed_root.mkdir(parents=True, exist_ok=True)
 
     # Read hunting district
-    dist_path = raw_root / "hunting_district.geojson"
-    if not dist_path.exists():
-        print(f"Error: {dist_path} not found. Try Hunting_District.geojson...")
-        dist_path = raw_root / "Hunting_District.geojson"
+    dist_path = layer_io.find_layer(raw_root, "hunting_district")
+    if dist_path is None:
+        print(f"Error: hunting_district not found in {raw_root}. Try Hunting_District...")
+        dist_path = layer_io.find_layer(raw_root, "Hunting_District")
         
-    if not dist_path.exists():
-        print(f"Error: {dist_path} not found. Run get_data step first.")
+    if dist_path is None:
+        print(f"Error: no hunting district in {raw_root}. Run get_data step first.")
         return
 
-    dist_gdf = gpd.read_file(dist_path)
+    dist_gdf = layer_io.read_layer(dist_path)
     if dist_gdf.empty:
         print("Error: Hunting_District.geojson is empty.")
         return
@@ -251,53 +511,170 @@ def main(config):
 
     
     buffer_miles = float(config["unit"].get("buffer_distance_miles", 1.0))
-    # 1 deg ~= 69 miles. 
-    buffer_deg = buffer_miles / 69.0
-    
-    dist_wgs84 = dist_gdf.to_crs("EPSG:4326")
-    # Buffer in degrees (approx)
-    buffered_geom = dist_wgs84.geometry.unary_union.buffer(buffer_deg)
-    
-    minx, miny, maxx, maxy = buffered_geom.bounds
-    bbox = (minx, miny, maxx, maxy)
+    buffered_geom = district_aoi(dist_gdf, buffer_miles)
+    bbox = buffered_geom.bounds
 
-    print(f"Buffer: {buffer_miles} miles (~{buffer_deg:.4f} deg)")
-    print(f"TNM bbox (WGS84): {bbox}")
+    dem_opts = config.get("dem", {})
+    windowed = bool(dem_opts.get("windowed", False))
+
+    merged_wgs84 = raw_root / ("dem_merged.vrt" if windowed else "dem_merged.tif")
+    if not fetch_dem(config, bbox, dem_raw_dir, merged_wgs84):
+        return
+
+    fmt = layer_io.intermediate_format(config)
+    derive_terrain(merged_wgs84, buffered_geom, raw_root, dem_opts, fmt)
+
+    access_opts = config.get("access", {}) or {}
+    if access_opts.get("enabled", False):
+        from scripts.access_distance import derive_access
+        derive_access(merged_wgs84, buffered_geom, raw_root, access_opts, dem_opts, fmt)
+
+
+def district_aoi(dist_gdf, buffer_miles):
+    """The district buffered by buffer_miles, as the AOI get_data clips to (see scripts.aoi)."""
+    print(f"Buffer: {buffer_miles} miles")
+    return AOI.buffered(dist_gdf, buffer_miles)
+
+
+def fetch_dem(config, bbox, dem_raw_dir, merged_path):
+    """
+    Searches TNM, downloads the tiles covering bbox and merges them to
+    merged_path. A .vrt merged_path builds a VRT instead of a merged GeoTIFF.
+    """
+    print(f"TNM bbox (WGS84): {tuple(bbox)}")
 
     # TNM query + download
     print("Searching TNM for DEM tiles...")
     try:
-        urls = tnm_search_dem_tiles(bbox)
+        with metrics.step("dem_search"):
+            items = tnm_search_dem_items(bbox, cache_from_config(config),
+                                         config['URLS'].get('TNM_Products', TNM_PRODUCTS_URL))
     except Exception as e:
         print(f"Error searching TNM: {e}")
-        return
+        return None
 
-    if not urls:
+    if not items:
         print("No DEM tiles found for bbox.")
-        return
+        return None
+
+    workers = int(config.get("dem", {}).get("download_workers", 4))
+    print(f"Found {len(items)} tiles. Downloading with {workers} worker(s)...")
+    dem_raw_dir.mkdir(parents=True, exist_ok=True)
+    with metrics.step("dem_download"):
+        tif_paths = download_tiles(items, dem_raw_dir, max_workers=workers)
+
+    # Merge, or just reference the tiles from a VRT for windowed processing
+    with metrics.step("dem_merge"):
+        if merged_path.suffix.lower() == ".vrt":
+            print("Building VRT mosaic...")
+            build_vrt(tif_paths, merged_path)
+        else:
+            print("Merging tiles...")
+            merge_geotiffs(tif_paths, merged_path)
+    return merged_path
+
+
+def bounds_window(src, bounds):
+    """Pixel window of src covering bounds, clamped to the raster."""
+    left, bottom, right, top = bounds
+    row_start, col_start = src.index(left, top)
+    row_stop, col_stop = src.index(right, bottom)
+    row_start, col_start = max(row_start, 0), max(col_start, 0)
+    row_stop, col_stop = min(row_stop + 1, src.height), min(col_stop + 1, src.width)
+    return Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+
+
+def elevation_edges(min_elev, max_elev):
+    # Elevation bands: 1000 ft increments
+    interval_m = 1000.0 * 0.3048
+    start_m = math.floor(min_elev / interval_m) * interval_m
+    end_m = math.ceil(max_elev / interval_m) * interval_m
+    return np.arange(start_m, end_m + interval_m, interval_m).astype(float)
+
+
+def elevation_props(elev_edges):
+    def elev_props(val):
+        idx = val - 1
+        if idx < 0 or idx + 1 >= len(elev_edges):
+            return {}
+        low = float(elev_edges[idx])
+        high = float(elev_edges[idx + 1])
+        low_ft = int(round(low / 0.3048))
+        high_ft = int(round(high / 0.3048))
+        return {"label": f"{low_ft}-{high_ft} ft", "min_m": low, "max_m": high}
+    return elev_props
 
-    print(f"Found {len(urls)} tiles. Downloading...")
-    tif_paths = []
-    for url in urls:
-        fname = url.split("/")[-1].split("?")[0]
-        if not fname.lower().endswith((".tif", ".tiff")):
-            fname += ".tif"
-        out_path = dem_raw_dir / fname
-        download_file(url, out_path)
-        tif_paths.append(out_path)
-
-    # Merge
-    merged_wgs84 = raw_root / "dem_merged.tif"
-    print("Merging tiles...")
-    merge_geotiffs(tif_paths, merged_wgs84)
+
+def slope_props(val):
+    return {"label": "> 45 degrees", "min_deg": 45}
+
+
+def slope_mask_classes(slope):
+    slope_mask = np.zeros(slope.shape, dtype=np.uint8)
+    
+    # Handle NaNs in slope (where DEM was nodata)
+    valid_slope = ~np.isnan(slope)
+    # Set pixels > 45 to 1
+    slope_mask[valid_slope & (slope > 45)] = 1
+    return slope_mask
+
+
+def save_clipped(gdf, buffered_geom, out_path):
+    # Clip to buffered AOI
+    with metrics.step("clip"):
+        gdf = as_aoi(buffered_geom).clip(gdf)
+    save_layer(gdf, out_path)
+
+
+def save_layer(gdf, out_path):
+    with metrics.step("write"):
+        layer_io.write_layer(gdf, out_path)
+    metrics.count_features(len(gdf))
+    print(f"Saved: {out_path}")
+
+
+def write_classes(class_raster, transform, crs, field_name, props_func, buffered_geom, out_path, dem_opts):
+    """Vectorizes a class raster to out_path with the fast or legacy (vectorize + clip) path."""
+    with metrics.layer(out_path.stem):
+        if dem_opts.get("vectorize", "fast") == "fast":
+            min_pixels = sieve_pixels(dem_opts.get("sieve_min_area_m2", 0), transform, class_raster.shape, crs)
+            with metrics.step("vectorize"):
+                gdf = vectorize_classes(class_raster, transform, crs, field_name, props_func, buffered_geom, min_pixels)
+            save_layer(gdf, out_path)
+        else:
+            with metrics.step("vectorize"):
+                gdf = vectorize_raster(class_raster, transform, crs, field_name, props_func)
+            save_clipped(gdf, buffered_geom, out_path)
+
+
+def derive_terrain(merged_wgs84, buffered_geom, out_dir, dem_opts=None, fmt=layer_io.DEFAULT_FORMAT):
+    """
+    Builds elevation bands and the slope mask for buffered_geom (an AOI, see
+    district_aoi, or a shapely geometry) from a DEM mosaic. Only the window
+    covering the AOI is read, so one mosaic can serve several districts.
+    dem_opts (config 'dem' section):
+      windowed: process the AOI block by block (see derive_terrain_windowed)
+      block_size: window size for windowed mode
+      workers: != 1 runs classification and slope on the tiled multi-core
+               engine (0 = one thread per core)
+      slope_cell_size: 'per_row' (geodesic size per row) or 'center'
+      vectorize: 'fast' (see vectorize_classes) or 'legacy'
+      sieve_min_area_m2: regions below this area are sieved out in fast mode
+    """
+    dem_opts = dem_opts or {}
+    workers = int(dem_opts.get("workers", 1))
+    per_row = dem_opts.get("slope_cell_size", "per_row") == "per_row"
+    if dem_opts.get("windowed", False):
+        return derive_terrain_windowed(merged_wgs84, buffered_geom, out_dir, dem_opts, fmt)
 
     # SKIP REPROJECTION 
     # Use merged_wgs84 directly
     
-    # Read DEM
+    # Read DEM (only the AOI window)
     with rasterio.open(merged_wgs84) as src:
-        dem = src.read(1)
-        transform = src.transform
+        window = bounds_window(src, buffered_geom.bounds)
+        dem = src.read(1, window=window)
+        transform = src.window_transform(window)
         nodata = src.nodata
         crs = src.crs
 
@@ -315,62 +692,186 @@ def main(config):
     max_elev = float(np.max(dem[valid_mask]))
     print(f"Elevation range (m): {min_elev:.2f} - {max_elev:.2f}")
 
-    # Elevation bands: 1000 ft increments
-    interval_m = 1000.0 * 0.3048
-    start_m = math.floor(min_elev / interval_m) * interval_m
-    end_m = math.ceil(max_elev / interval_m) * interval_m
-    elev_edges = np.arange(start_m, end_m + interval_m, interval_m).astype(float)
-
+    elev_edges = elevation_edges(min_elev, max_elev)
     print(f"Elevation band edges (m): {elev_edges}")
-    elev_classes = classify_bands(dem.astype(np.float32), elev_edges, nodata)
-
-    def elev_props(val):
-        idx = val - 1
-        if idx < 0 or idx + 1 >= len(elev_edges):
-            return {}
-        low = float(elev_edges[idx])
-        high = float(elev_edges[idx + 1])
-        low_ft = int(round(low / 0.3048))
-        high_ft = int(round(high / 0.3048))
-        return {"label": f"{low_ft}-{high_ft} ft", "min_m": low, "max_m": high}
+    if workers == 1:
+        elev_classes = classify_bands(dem.astype(np.float32), elev_edges, nodata)
+    else:
+        elev_classes = tiled_classify_bands(dem, elev_edges, nodata, workers)
 
     print("Vectorizing elevation bands...")
-    elev_gdf = vectorize_raster(elev_classes, transform, crs, "band_id", elev_props)
-
-    # Clip to buffered AOI
-    clip_gdf = gpd.GeoDataFrame(geometry=[buffered_geom], crs="EPSG:4326")
-    elev_gdf = gpd.clip(elev_gdf, clip_gdf)
-
-    out_elev = raw_root / "elevation_bands.geojson"
-    elev_gdf.to_file(out_elev, driver="GeoJSON")
-    print(f"Saved: {out_elev}")
+    write_classes(elev_classes, transform, crs, "band_id", elevation_props(elev_edges),
+                  buffered_geom, layer_io.layer_path(out_dir, "elevation_bands", fmt), dem_opts)
 
     # Slope mask (> 45 degrees)
     print("Computing slope (Geodesic)...")
-    slope = compute_slope_degrees(dem, transform, nodata)
+    with metrics.step("slope"):
+        if workers == 1:
+            slope = compute_slope_degrees(dem, transform, nodata, crs=crs, per_row=per_row)
+        else:
+            slope = tiled_slope_degrees(dem, transform, nodata, workers=workers, crs=crs, per_row=per_row)
 
     print("Creating slope mask > 45 degrees...")
-    slope_mask = np.zeros(slope.shape, dtype=np.uint8)
-    
-    # Handle NaNs in slope (where DEM was nodata)
-    valid_slope = ~np.isnan(slope)
-    # Set pixels > 45 to 1
-    slope_mask[valid_slope & (slope > 45)] = 1
-
-    def slope_props(val):
-        return {"label": "> 45 degrees", "min_deg": 45}
+    slope_mask = slope_mask_classes(slope)
 
     print("Vectorizing slope mask...")
-    slope_gdf = vectorize_raster(slope_mask, transform, crs, "slope_class", slope_props)
-    
-    # Clip
-    clip_gdf = gpd.GeoDataFrame(geometry=[buffered_geom], crs="EPSG:4326")
-    slope_gdf = gpd.clip(slope_gdf, clip_gdf)
-    
+    write_classes(slope_mask, transform, crs, "slope_class", slope_props,
+                  buffered_geom, layer_io.layer_path(out_dir, "slope_mask", fmt), dem_opts)
 
-    out_slope = raw_root / "slope_mask.geojson"
-    slope_gdf.to_file(out_slope, driver="GeoJSON")
-    print(f"Saved: {out_slope}")
+    print("Terrain Derivatives complete.")
+
+
+# -----------------------------
+# WINDOWED (OUT-OF-CORE) PROCESSING
+# -----------------------------
+def iter_blocks(window, block_size):
+    """Yields block_size x block_size sub-windows tiling window."""
+    row_end = window.row_off + window.height
+    col_end = window.col_off + window.width
+    for row in range(window.row_off, row_end, block_size):
+        for col in range(window.col_off, col_end, block_size):
+            yield Window(col, row, min(block_size, col_end - col), min(block_size, row_end - row))
+
+
+def read_with_halo(src, block, halo=1):
+    """
+    Reads block plus a halo of neighbouring pixels (clamped to the raster) so
+    gradients at block edges match a whole-array computation.
+    Returns (data, inner, halo_window) where data[inner] is the block itself.
+    """
+    row0 = max(block.row_off - halo, 0)
+    col0 = max(block.col_off - halo, 0)
+    row1 = min(block.row_off + block.height + halo, src.height)
+    col1 = min(block.col_off + block.width + halo, src.width)
+    halo_window = Window(col0, row0, col1 - col0, row1 - row0)
+    data = src.read(1, window=halo_window)
+    inner = (
+        slice(block.row_off - row0, block.row_off - row0 + block.height),
+        slice(block.col_off - col0, block.col_off - col0 + block.width),
+    )
+    return data, inner, halo_window
+
+
+def window_elevation_range(src, window, block_size):
+    """Min/max of valid cells in window, accumulated block by block."""
+    nodata = src.nodata
+    min_elev, max_elev = math.inf, -math.inf
+    for block in iter_blocks(window, block_size):
+        data = src.read(1, window=block)
+        valid = data != nodata if nodata is not None else np.ones(data.shape, dtype=bool)
+        if np.any(valid):
+            min_elev = min(min_elev, float(np.min(data[valid])))
+            max_elev = max(max_elev, float(np.max(data[valid])))
+    if min_elev > max_elev:
+        return None
+    return min_elev, max_elev
+
+
+def vectorize_raster_file(path, field_name, props_func=None, strip_rows=2048, aoi=None, min_area_m2=None):
+    """
+    Vectorizes a class raster on disk in horizontal strips so only one strip is
+    in memory at a time. Polygons cut at strip seams are dissolved back together.
+
+    min_area_m2=None keeps the legacy per-polygon output; any other value uses
+    vectorize_classes per strip (masked to aoi, sieved per strip) and returns
+    one feature per class.
+    """
+    fast = min_area_m2 is not None
+    parts = []
+    with rasterio.open(path) as src:
+        crs = src.crs
+        for row in range(0, src.height, strip_rows):
+            strip = Window(0, row, src.width, min(strip_rows, src.height - row))
+            data, transform = src.read(1, window=strip), src.window_transform(strip)
+            if fast:
+                min_pixels = sieve_pixels(min_area_m2, transform, data.shape, crs)
+                gdf = vectorize_classes(data, transform, crs, field_name, props_func, aoi, min_pixels)
+            else:
+                gdf = vectorize_raster(data, transform, crs, field_name, props_func)
+            if not gdf.empty:
+                parts.append(gdf)
+
+    if not parts:
+        return gpd.GeoDataFrame(columns=["geometry"], crs=crs)
+    if len(parts) == 1:
+        return parts[0]
+
+    gdf = gpd.GeoDataFrame(pd.concat(parts, ignore_index=True), crs=crs)
+    gdf = gdf.dissolve(field_name, as_index=False)
+    if fast:
+        return gdf
+    return gdf.explode(index_parts=False).reset_index(drop=True)
+
+
+def derive_terrain_windowed(dem_path, buffered_geom, out_dir, dem_opts=None, fmt=layer_io.DEFAULT_FORMAT):
+    """
+    Out-of-core version of derive_terrain. Works on a VRT (or any raster) in
+    block_size windows: one pass for the elevation range, one pass that reads
+    each block with a one-pixel halo and writes elevation classes and the slope
+    mask to tiled uint8 GeoTIFFs, then vectorizes those in strips. Peak memory
+    is bounded by the block and strip sizes, not the AOI.
+    """
+    dem_opts = dem_opts or {}
+    block_size = int(dem_opts.get("block_size", 256))
+    per_row = dem_opts.get("slope_cell_size", "per_row") == "per_row"
+    with rasterio.open(dem_path) as src:
+        aoi = bounds_window(src, buffered_geom.bounds)
+        nodata = src.nodata
+        aoi_transform = src.window_transform(aoi)
+
+        elev_range = window_elevation_range(src, aoi, block_size)
+        if elev_range is None:
+            print("Error: DEM has no valid cells.")
+            return
+        min_elev, max_elev = elev_range
+        print(f"Elevation range (m): {min_elev:.2f} - {max_elev:.2f}")
+
+        elev_edges = elevation_edges(min_elev, max_elev)
+        print(f"Elevation band edges (m): {elev_edges}")
+
+        # One cell size for the whole AOI, as the in-memory path uses
+        # (per_row mode derives each row's size from its own latitude instead)
+        res = cell_size_meters(aoi_transform, (aoi.height, aoi.width), src.crs)
+
+        profile = {
+            "driver": "GTiff", "height": aoi.height, "width": aoi.width, "count": 1,
+            "dtype": "uint8", "nodata": 0, "crs": src.crs, "transform": aoi_transform,
+            "compress": "lzw", "tiled": True, "blockxsize": 256, "blockysize": 256,
+        }
+        elev_tif = out_dir / "elevation_classes.tif"
+        slope_tif = out_dir / "slope_classes.tif"
+
+        print(f"Classifying and computing slope in {block_size}px windows...")
+        with rasterio.open(elev_tif, "w", **profile) as elev_dst, rasterio.open(slope_tif, "w", **profile) as slope_dst, \
+                metrics.step("slope"):
+            for block in iter_blocks(aoi, block_size):
+                data, inner, halo_window = read_with_halo(src, block)
+                dst_window = Window(block.col_off - aoi.col_off, block.row_off - aoi.row_off, block.width, block.height)
+
+                elev_classes = classify_bands(data[inner].astype(np.float32), elev_edges, nodata)
+                elev_dst.write(elev_classes, 1, window=dst_window)
+
+                slope = compute_slope_degrees(data, src.window_transform(halo_window), nodata, res=res,
+                                              crs=src.crs, per_row=per_row)
+                slope_dst.write(slope_mask_classes(slope[inner]), 1, window=dst_window)
+
+    outputs = (
+        ("elevation bands", elev_tif, "band_id", elevation_props(elev_edges), "elevation_bands"),
+        ("slope mask", slope_tif, "slope_class", slope_props, "slope_mask"),
+    )
+    for label, tif, field_name, props_func, layer_name in outputs:
+        out_path = layer_io.layer_path(out_dir, layer_name, fmt)
+        print(f"Vectorizing {label}...")
+        with metrics.layer(layer_name):
+            if dem_opts.get("vectorize", "fast") == "fast":
+                with metrics.step("vectorize"):
+                    gdf = vectorize_raster_file(tif, field_name, props_func, aoi=buffered_geom,
+                                                min_area_m2=dem_opts.get("sieve_min_area_m2", 0))
+                save_layer(gdf, out_path)
+            else:
+                with metrics.step("vectorize"):
+                    gdf = vectorize_raster_file(tif, field_name, props_func)
+                save_clipped(gdf, buffered_geom, out_path)
 
     print("Terrain Derivatives complete.")
 
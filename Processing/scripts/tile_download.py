@@ -0,0 +1,189 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from scripts.arcgis_paging import DEFAULT_BACKOFF, make_session
+
+
+CHUNK_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 2.0  # seconds between progress lines
+
+
+class TileIntegrityError(IOError):
+    """Raised when a downloaded tile doesn't match its expected size or checksum."""
+
+
+class DownloadProgress:
+    """Thread-safe byte/tile counters with throttled progress output."""
+
+    def __init__(self, n_tiles, total_bytes=None):
+        self.n_tiles = n_tiles
+        self.total_bytes = total_bytes
+        self.tiles_done = 0
+        self.bytes_done = 0
+        self.start = time.perf_counter()
+        self._last_print = 0.0
+        self._lock = threading.Lock()
+
+    def add_bytes(self, n):
+        with self._lock:
+            self.bytes_done += n
+            now = time.perf_counter()
+            if now - self._last_print >= PROGRESS_INTERVAL:
+                self._last_print = now
+                print(f"  {self.line()}")
+
+    def tile_done(self):
+        with self._lock:
+            self.tiles_done += 1
+
+    def line(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-6)
+        mb = self.bytes_done / (1024 * 1024)
+        total = f"/{self.total_bytes / (1024 * 1024):.1f}" if self.total_bytes else ""
+        return (f"DEM tiles {self.tiles_done}/{self.n_tiles}, "
+                f"{mb:.1f}{total} MB, {mb / elapsed:.1f} MB/s")
+
+
+def md5sum(path):
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def remote_size(session, url):
+    """Content-Length reported by a HEAD request, or None."""
+    try:
+        r = session.head(url, allow_redirects=True, timeout=60)
+        r.raise_for_status()
+    except Exception:
+        return None
+    length = r.headers.get("Content-Length")
+    return int(length) if length else None
+
+
+def is_retryable(error):
+    """Short transfers and dropped connections resume; a 4xx response won't change on retry."""
+    response = getattr(error, "response", None)
+    return response is None or response.status_code >= 500 or response.status_code == 429
+
+
+def is_complete(path, expected_size=None, md5=None):
+    if not path.exists():
+        return False
+    if expected_size is not None and path.stat().st_size != expected_size:
+        return False
+    if md5 and md5sum(path).lower() != md5.lower():
+        return False
+    return path.stat().st_size > 0
+
+
+def download_file(url, out_path, expected_size=None, md5=None, session=None, progress=None):
+    """
+    Downloads url to out_path, resuming a partial `.part` file with an HTTP
+    Range request when one exists. The file is only moved into place once its
+    size matches expected_size (TNM sizeInBytes, or the server's Content-Length)
+    and, when given, its md5 checksum.
+    """
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    session = session or make_session()
+
+    if expected_size is None:
+        expected_size = remote_size(session, url)
+
+    if is_complete(out_path, expected_size, md5):
+        return out_path
+
+    part_path = out_path.with_name(out_path.name + ".part")
+    if out_path.exists():
+        # A tile from an older run that fails validation is treated as partial
+        out_path.replace(part_path)
+
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    if expected_size is not None and offset > expected_size:
+        part_path.unlink()
+        offset = 0
+
+    if expected_size is None or offset < expected_size:
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with session.get(url, stream=True, headers=headers, timeout=300) as r:
+            if offset and r.status_code == 416:
+                # Nothing left past offset: without a known size, the .part
+                # file is complete unless Content-Range says otherwise
+                total = r.headers.get("Content-Range", "").rpartition("/")[2]
+                if expected_size is None and total.isdigit() and int(total) != offset:
+                    part_path.unlink()
+                    raise TileIntegrityError(f"{out_path.name}: partial file larger than the {total} byte tile")
+                if expected_size is None:
+                    expected_size = offset
+            else:
+                r.raise_for_status()
+            if offset and r.status_code not in (206, 416):
+                # Server ignored the Range header; start over
+                offset = 0
+            if expected_size is None and r.status_code == 200 and r.headers.get("Content-Length"):
+                expected_size = int(r.headers["Content-Length"])
+
+            if r.status_code != 416:
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                            if progress is not None:
+                                progress.add_bytes(len(chunk))
+
+    size = part_path.stat().st_size
+    if expected_size is not None and size != expected_size:
+        raise TileIntegrityError(f"{out_path.name}: got {size} bytes, expected {expected_size}")
+    if md5 and md5sum(part_path).lower() != md5.lower():
+        part_path.unlink()
+        raise TileIntegrityError(f"{out_path.name}: md5 mismatch")
+
+    part_path.replace(out_path)
+    return out_path
+
+
+def download_tiles(items, out_dir, max_workers=4, retries=2, backoff=DEFAULT_BACKOFF):
+    """
+    Downloads TNM product items ({downloadURL, sizeInBytes, [md5]}) into out_dir
+    on a bounded thread pool. A tile whose transfer is cut short or fails is
+    retried up to retries times, with exponential backoff, resuming from its
+    .part file. Returns the local paths in the order of items.
+    """
+    session = make_session(max_per_host=max_workers)
+    total = sum(item.get("sizeInBytes") or 0 for item in items) or None
+    progress = DownloadProgress(len(items), total)
+
+    def fetch(item):
+        url = item["downloadURL"]
+        fname = url.split("/")[-1].split("?")[0]
+        if not fname.lower().endswith((".tif", ".tiff")):
+            fname += ".tif"
+        out_path = out_dir / fname
+
+        for attempt in range(retries + 1):
+            try:
+                download_file(url, out_path, item.get("sizeInBytes"), item.get("md5"), session, progress)
+                break
+            except (TileIntegrityError, requests.RequestException) as e:
+                # Short or interrupted transfer: loop again and resume from the .part file
+                if attempt == retries or not is_retryable(e):
+                    raise
+                print(f"  {fname}: {type(e).__name__}; resuming...")
+                time.sleep(backoff * (2 ** attempt))
+        progress.tile_done()
+        return out_path
+
+    paths = {}
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as pool:
+        futures = {pool.submit(fetch, item): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            paths[futures[future]] = future.result()
+
+    print(f"  {progress.line()}")
+    return [paths[i] for i in range(len(items))]
@@ -0,0 +1,227 @@
+"""
+Network topology for line layers (roads, trails, flowlines).
+
+build_graph turns a line layer into a node/edge graph held in flat arrays:
+
+- nodes are line endpoints, snapped together within a tolerance, plus
+  junctions where an endpoint lands on the interior of another line (the
+  line is split there, so T-junctions connect)
+- edges are the pieces of each line part between consecutive nodes, with
+  the layer row they came from and their length
+- adjacency is CSR: the neighbours of node n are indices[indptr[n]:indptr[n + 1]]
+  (adj_edge gives the edge for each neighbour)
+
+Isolated edges, connected components and dangles are then array queries on
+the graph rather than spatial joins. The graph is saved next to the processed
+layer as <layer>.graph.npz, built from the layer's exported (simplified and
+rounded) geometry so its nodes sit on the published vertices.
+"""
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+
+def graph_path(layer_path):
+    """The graph saved for a processed layer; row i is the layer's row i as written."""
+    layer_path = Path(layer_path)
+    return layer_path.with_name(f"{layer_path.stem}.graph.npz")
+
+
+def _components(n, a, b):
+    """Connected component label (0..k-1) for n nodes joined by the pairs a[i]-b[i]."""
+    labels = np.arange(n)
+    while True:
+        # Hook each pair onto the smaller root, then jump pointers to the root
+        low = np.minimum(labels[a], labels[b])
+        hooked = labels.copy()
+        np.minimum.at(hooked, labels[a], low)
+        np.minimum.at(hooked, labels[b], low)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return np.unique(labels, return_inverse=True)[1]
+        labels = hooked
+
+
+class NetworkGraph:
+    ARRAYS = ("node_xy", "edge_src", "edge_dst", "edge_row", "edge_length", "end_node", "end_row")
+
+    def __init__(self, node_xy, edge_src, edge_dst, edge_row, edge_length, end_node, end_row, n_rows):
+        self.node_xy = node_xy
+        self.edge_src = edge_src
+        self.edge_dst = edge_dst
+        self.edge_row = edge_row
+        self.edge_length = edge_length
+        # Endpoint node of every line part and the row it belongs to
+        self.end_node = end_node
+        self.end_row = end_row
+        self.n_rows = int(n_rows)
+        self._build_csr()
+
+    @property
+    def n_nodes(self):
+        return len(self.node_xy)
+
+    @property
+    def n_edges(self):
+        return len(self.edge_src)
+
+    def _build_csr(self):
+        src = np.concatenate([self.edge_src, self.edge_dst])
+        dst = np.concatenate([self.edge_dst, self.edge_src])
+        edge = np.concatenate([np.arange(self.n_edges)] * 2)
+        order = np.argsort(src, kind="stable")
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=self.n_nodes))])
+        self.indices = dst[order]
+        self.adj_edge = edge[order]
+
+    def neighbors(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    # -----------------------------
+    # QUERIES
+    # -----------------------------
+    def degree(self):
+        return np.diff(self.indptr)
+
+    def node_components(self):
+        return _components(self.n_nodes, self.edge_src, self.edge_dst)
+
+    def row_components(self):
+        """Component label per layer row (-1 for rows with no edges)."""
+        labels = np.full(self.n_rows, -1)
+        labels[self.edge_row] = self.node_components()[self.edge_src]
+        return labels
+
+    def connected_rows(self):
+        """
+        True for rows with an endpoint on a node that another row's line also
+        passes through or ends at (the rows remove_isolated_edges keeps).
+        """
+        node_row = np.unique(np.column_stack([
+            np.concatenate([self.edge_src, self.edge_dst]),
+            np.concatenate([self.edge_row, self.edge_row]),
+        ]), axis=0)
+        rows_at_node = np.bincount(node_row[:, 0], minlength=self.n_nodes)
+        connected = np.zeros(self.n_rows, dtype=bool)
+        shared = rows_at_node[self.end_node] > 1
+        connected[self.end_row[shared]] = True
+        return connected
+
+    def dangles(self):
+        """Dead-end nodes (degree 1)."""
+        return np.flatnonzero(self.degree() == 1)
+
+    def dangle_rows(self):
+        """True for rows with at least one dead-end endpoint."""
+        out = np.zeros(self.n_rows, dtype=bool)
+        out[self.end_row[self.degree()[self.end_node] == 1]] = True
+        return out
+
+    # -----------------------------
+    # SUBSETS / PERSISTENCE
+    # -----------------------------
+    def subgraph(self, rows):
+        """Graph of only the given row positions, renumbered 0..len(rows)-1 in that order."""
+        rows = np.asarray(rows, dtype=np.int64)
+        row_map = np.full(self.n_rows, -1)
+        row_map[rows] = np.arange(len(rows))
+
+        keep_edge = row_map[self.edge_row] >= 0
+        keep_end = row_map[self.end_row] >= 0
+        used = np.unique(np.concatenate([self.edge_src[keep_edge], self.edge_dst[keep_edge], self.end_node[keep_end]]))
+        node_map = np.full(self.n_nodes, -1)
+        node_map[used] = np.arange(len(used))
+
+        return NetworkGraph(
+            self.node_xy[used],
+            node_map[self.edge_src[keep_edge]], node_map[self.edge_dst[keep_edge]],
+            row_map[self.edge_row[keep_edge]], self.edge_length[keep_edge],
+            node_map[self.end_node[keep_end]], row_map[self.end_row[keep_end]],
+            len(rows),
+        )
+
+    def save(self, path):
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        np.savez_compressed(path, n_rows=np.array(self.n_rows), indptr=self.indptr,
+                            indices=self.indices, adj_edge=self.adj_edge, **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(*(data[name] for name in cls.ARRAYS), int(data["n_rows"]))
+
+    def summary(self):
+        n_components = len(np.unique(self.node_components())) if self.n_nodes else 0
+        return (f"{self.n_nodes} nodes, {self.n_edges} edges, {n_components} components, "
+                f"{len(self.dangles())} dangles")
+
+
+def build_graph(geoms, tolerance=0.0):
+    """
+    Builds the topology of a line layer. geoms: array of geometries, one per
+    row; rows that aren't (Multi)LineStrings get no edges. Endpoints within
+    tolerance (layer units) of each other are snapped to one node.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    n_rows = len(geoms)
+    is_line = np.isin(shapely.get_type_id(geoms), (1, 2, 5))
+    line_rows = np.flatnonzero(is_line)
+    parts, part_row = shapely.get_parts(geoms[line_rows], return_index=True)
+    valid = shapely.get_num_coordinates(parts) >= 2
+    parts, part_row = parts[valid], line_rows[part_row[valid]]
+    n_parts = len(parts)
+
+    # 1. Snap endpoints to nodes; endpoint i belongs to part i % n_parts
+    points = np.concatenate([shapely.get_point(parts, 0), shapely.get_point(parts, -1)])
+    point_part = np.concatenate([np.arange(n_parts)] * 2)
+    coords = shapely.get_coordinates(points)
+    if tolerance > 0:
+        a, b = shapely.STRtree(points).query(points, predicate="dwithin", distance=tolerance)
+        point_node = _components(len(points), a, b)
+    else:
+        _, point_node = np.unique(coords, axis=0, return_inverse=True)
+    point_node = point_node.ravel()
+    _, first = np.unique(point_node, return_index=True)
+    node_xy = coords[first]
+
+    # 2. Endpoints landing on another part away from its endpoints split that part
+    tree = shapely.STRtree(parts)
+    if tolerance > 0:
+        hit_point, hit_part = tree.query(points, predicate="dwithin", distance=tolerance)
+    else:
+        hit_point, hit_part = tree.query(points, predicate="intersects")
+    start_node, end_node = point_node[:n_parts], point_node[n_parts:]
+    node = point_node[hit_point]
+    interior = ((hit_part != point_part[hit_point])
+                & (node != start_node[hit_part]) & (node != end_node[hit_part]))
+    junction = np.unique(np.column_stack([hit_part[interior], node[interior]]), axis=0)
+    j_part, j_node = junction[:, 0], junction[:, 1]
+    j_loc = shapely.line_locate_point(parts[j_part], shapely.points(node_xy[j_node]))
+
+    # 3. Walk each part start -> junctions (by distance along it) -> end
+    lengths = shapely.length(parts)
+    seq_part = np.concatenate([np.arange(n_parts), j_part, np.arange(n_parts)])
+    seq_node = np.concatenate([start_node, j_node, end_node])
+    seq_loc = np.concatenate([np.zeros(n_parts), j_loc, lengths])
+    seq_kind = np.concatenate([np.zeros(n_parts), np.ones(len(j_part)), np.full(n_parts, 2)])
+    order = np.lexsort((seq_kind, seq_loc, seq_part))
+    seq_part, seq_node, seq_loc = seq_part[order], seq_node[order], seq_loc[order]
+
+    pair = seq_part[:-1] == seq_part[1:]
+    # Two junctions at the same spot would give a zero-length self loop
+    pair &= ~((seq_node[:-1] == seq_node[1:]) & (seq_loc[:-1] == seq_loc[1:]))
+    edge_part = seq_part[:-1][pair]
+
+    return NetworkGraph(
+        node_xy,
+        seq_node[:-1][pair], seq_node[1:][pair],
+        part_row[edge_part], (seq_loc[1:] - seq_loc[:-1])[pair],
+        point_node, np.concatenate([part_row, part_row]),
+        n_rows,
+    )
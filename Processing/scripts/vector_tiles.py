@@ -0,0 +1,386 @@
+"""
+Vector tile output stage.
+
+Tiles every processed layer into one directory of Mapbox Vector Tiles
+(<map_data_dir>/tiles/{z}/{x}/{y}.pbf, one source-layer per file) so the map
+only downloads the tiles in view instead of parsing whole GeoJSON files.
+
+Per zoom, geometries are simplified to the tile grid (tiles.simplify_px tile
+units), features smaller than a tile unit are dropped, and only the
+properties listed for a layer in tiles.layers are kept. Tiles are encoded here
+(MVT spec 2.1) so no tippecanoe or tile server is needed. Only tiles with
+features are written: only tiles a feature's bounding box reaches are
+considered, and the map's server answers the rest with 204 No Content (see
+precompressedData in frontend/vite.config.ts).
+"""
+import json
+import math
+import shutil
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from scripts import layer_io
+
+
+PROCESSING_DIR = Path(__file__).parent.parent
+WEB_MERCATOR_HALF = 20037508.342789244  # half the EPSG:3857 world width (m)
+
+GEOM_POINT, GEOM_LINESTRING, GEOM_POLYGON = 1, 2, 3
+CMD_MOVE_TO, CMD_LINE_TO, CMD_CLOSE_PATH = 1, 2, 7
+
+
+# -----------------------------
+# PROTOBUF
+# -----------------------------
+def _varint(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _len_field(number, data):
+    return _field(number, 2) + _varint(len(data)) + data
+
+
+def _packed(number, values):
+    return _len_field(number, b"".join(_varint(v) for v in values))
+
+
+def _value(v):
+    """Encodes a property value as an MVT Value message (None for nulls)."""
+    if isinstance(v, (bool, np.bool_)):
+        return _field(7, 0) + _varint(int(v))
+    if isinstance(v, (int, np.integer)):
+        return _field(6, 0) + _varint(_zigzag(int(v)))
+    if isinstance(v, (float, np.floating)):
+        if math.isnan(v):
+            return None
+        return _field(3, 1) + np.float64(v).tobytes()
+    if v is None:
+        return None
+    # Strings, and anything else (dates) as its string form
+    return _len_field(1, str(v).encode("utf-8"))
+
+
+# -----------------------------
+# GEOMETRY ENCODING
+# -----------------------------
+def _command(cmd, count):
+    return (cmd & 0x7) | (count << 3)
+
+
+def _ring_points(coords, closed):
+    """Rounds to integer tile units and drops repeated points."""
+    pts = np.rint(coords).astype(np.int64)
+    if closed:
+        pts = pts[:-1]
+    if len(pts) > 1:
+        keep = np.ones(len(pts), dtype=bool)
+        keep[1:] = np.any(pts[1:] != pts[:-1], axis=1)
+        pts = pts[keep]
+    return pts
+
+
+def _signed_area(pts):
+    x, y = pts[:, 0], pts[:, 1]
+    return float(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)) / 2
+
+
+class _Cursor:
+    """Tracks the pen position; MVT coordinates are deltas from the last point."""
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+
+    def deltas(self, pts):
+        out = []
+        for x, y in pts.tolist():
+            out.append(_zigzag(x - self.x))
+            out.append(_zigzag(y - self.y))
+            self.x, self.y = x, y
+        return out
+
+
+def _encode_line(pts, cursor, cmds):
+    cmds.append(_command(CMD_MOVE_TO, 1))
+    cmds.extend(cursor.deltas(pts[:1]))
+    cmds.append(_command(CMD_LINE_TO, len(pts) - 1))
+    cmds.extend(cursor.deltas(pts[1:]))
+
+
+def _encode_ring(pts, cursor, cmds, exterior):
+    # Exterior rings have positive area in tile space (y down), holes negative
+    area = _signed_area(pts)
+    if (area < 0) == exterior:
+        pts = pts[::-1]
+    _encode_line(pts, cursor, cmds)
+    cmds.append(_command(CMD_CLOSE_PATH, 1))
+
+
+def encode_geometry(geom):
+    """Returns (geom_type, commands) for a geometry in tile units, or None if it collapses."""
+    parts = shapely.get_parts(geom)
+    kind = shapely.get_type_id(parts[0]) if len(parts) else -1
+    cursor = _Cursor()
+    cmds = []
+
+    if kind == 0:  # Point
+        pts = np.rint(shapely.get_coordinates(parts)).astype(np.int64)
+        cmds.append(_command(CMD_MOVE_TO, len(pts)))
+        cmds.extend(cursor.deltas(pts))
+        return GEOM_POINT, cmds
+
+    if kind in (1, 2):  # LineString / LinearRing
+        for part in parts:
+            pts = _ring_points(shapely.get_coordinates(part), closed=False)
+            if len(pts) >= 2:
+                _encode_line(pts, cursor, cmds)
+        return (GEOM_LINESTRING, cmds) if cmds else None
+
+    if kind == 3:  # Polygon
+        for part in parts:
+            ext = _ring_points(shapely.get_coordinates(part.exterior), closed=True)
+            if len(ext) < 3 or _signed_area(ext) == 0:
+                continue
+            _encode_ring(ext, cursor, cmds, exterior=True)
+            for hole in part.interiors:
+                pts = _ring_points(shapely.get_coordinates(hole), closed=True)
+                if len(pts) >= 3 and _signed_area(pts) != 0:
+                    _encode_ring(pts, cursor, cmds, exterior=False)
+        return (GEOM_POLYGON, cmds) if cmds else None
+
+    return None
+
+
+def _homogeneous(geom):
+    """clip_by_rect can return collections; keep the parts of the highest dimension."""
+    if shapely.get_type_id(geom) != 7:
+        return geom
+    parts = shapely.get_parts(geom)
+    dims = shapely.get_dimensions(parts)
+    constructors = {2: shapely.multipolygons, 1: shapely.multilinestrings, 0: shapely.multipoints}
+    top = dims.max()
+    return constructors[top](parts[dims == top])
+
+
+# -----------------------------
+# LAYER ENCODING
+# -----------------------------
+class _LayerBuilder:
+    def __init__(self, name, extent):
+        self.name = name
+        self.extent = extent
+        self.keys, self.values = {}, {}
+        self.features = []
+
+    def _index(self, table, item):
+        if item not in table:
+            table[item] = len(table)
+        return table[item]
+
+    def add(self, geom, props, feature_id):
+        encoded = encode_geometry(geom)
+        if encoded is None:
+            return
+        geom_type, cmds = encoded
+        tags = []
+        for key, value in props.items():
+            encoded_value = _value(value)
+            if encoded_value is None:
+                continue
+            tags.append(self._index(self.keys, key))
+            tags.append(self._index(self.values, encoded_value))
+
+        feature = _field(1, 0) + _varint(feature_id)
+        if tags:
+            feature += _packed(2, tags)
+        feature += _field(3, 0) + _varint(geom_type) + _packed(4, cmds)
+        self.features.append(feature)
+
+    def encode(self):
+        body = _field(15, 0) + _varint(2) + _len_field(1, self.name.encode("utf-8"))
+        body += b"".join(_len_field(2, f) for f in self.features)
+        body += b"".join(_len_field(3, k.encode("utf-8")) for k in self.keys)
+        body += b"".join(_len_field(4, v) for v in self.values)
+        body += _field(5, 0) + _varint(self.extent)
+        return _len_field(3, body)
+
+
+# -----------------------------
+# TILING
+# -----------------------------
+def tile_span(z):
+    return 2 * WEB_MERCATOR_HALF / (1 << z)
+
+
+def tile_range(bounds, z):
+    """Inclusive x/y tile ranges covering EPSG:3857 bounds at zoom z."""
+    span = tile_span(z)
+    minx, miny, maxx, maxy = bounds
+    n = (1 << z) - 1
+    x0 = min(max(int((minx + WEB_MERCATOR_HALF) // span), 0), n)
+    x1 = min(max(int((maxx + WEB_MERCATOR_HALF) // span), 0), n)
+    y0 = min(max(int((WEB_MERCATOR_HALF - maxy) // span), 0), n)
+    y1 = min(max(int((WEB_MERCATOR_HALF - miny) // span), 0), n)
+    return range(x0, x1 + 1), range(y0, y1 + 1)
+
+
+def tile_cover(geoms, z, pad=0.0):
+    """(x, y) of the tiles at zoom z whose box, grown by pad, meets a geometry's bounding box."""
+    cover = set()
+    for minx, miny, maxx, maxy in np.unique(shapely.bounds(geoms), axis=0):
+        xs, ys = tile_range((minx - pad, miny - pad, maxx + pad, maxy + pad), z)
+        cover.update((x, y) for x in xs for y in ys)
+    return cover
+
+
+def tile_bounds(x, y, z):
+    span = tile_span(z)
+    minx = -WEB_MERCATOR_HALF + x * span
+    maxy = WEB_MERCATOR_HALF - y * span
+    return minx, maxy - span, minx + span, maxy
+
+
+class TileLayer:
+    """One processed file projected to EPSG:3857 with its pruned properties."""
+
+    def __init__(self, path, layer_opts):
+        self.name = path.stem.lower()
+        gdf = layer_io.read_layer(path)
+        gdf = gdf[~gdf.geometry.isna() & ~gdf.geometry.is_empty].to_crs(3857)
+
+        keep = layer_opts.get("properties")
+        columns = [c for c in gdf.columns if c != "geometry" and (keep is None or c in keep)]
+        self.records = gdf[columns].to_dict("records") if columns else [{}] * len(gdf)
+        self.geoms = gdf.geometry.to_numpy()
+        self.fields = {c: str(gdf[c].dtype) for c in columns}
+        self.minzoom = int(layer_opts.get("minzoom", 0))
+        self.bounds = tuple(gdf.total_bounds) if len(gdf) else None
+
+    def at_zoom(self, z, extent, simplify_px):
+        """Geometries simplified to the zoom's tile grid, with sub-unit features dropped."""
+        unit = tile_span(z) / extent
+        geoms = shapely.simplify(self.geoms, unit * simplify_px, preserve_topology=True)
+        dims = shapely.get_dimensions(geoms)
+        size = np.where(dims == 2, shapely.area(geoms) / unit ** 2,
+                        np.where(dims == 1, shapely.length(geoms) / unit, 1.0))
+        keep = np.flatnonzero(~shapely.is_empty(geoms) & (size >= 1.0))
+        tree = shapely.STRtree(geoms[keep])
+        return geoms, keep, tree
+
+
+def tiles_dir(config):
+    opts = config.get("tiles", {}) or {}
+    map_dir = PROCESSING_DIR / config["environment"]["map_data_dir"]
+    return (map_dir / opts.get("dir", "tiles")).resolve()
+
+
+def build_tiles(config):
+    """
+    Tiles every processed layer into <map_data_dir>/<tiles.dir>. Returns
+    the path of the TileJSON-style metadata.json written next to the tiles.
+    """
+    opts = config.get("tiles", {}) or {}
+    minzoom = int(opts.get("minzoom", 8))
+    maxzoom = int(opts.get("maxzoom", 14))
+    extent = int(opts.get("extent", 4096))
+    buffer = int(opts.get("buffer", 64))
+    simplify_px = float(opts.get("simplify_px", 1.0))
+    layer_opts = opts.get("layers", {}) or {}
+
+    processed_dir = PROCESSING_DIR / config["environment"]["processed_data_dir"]
+    out_dir = tiles_dir(config)
+
+    start = time.perf_counter()
+    layers = []
+    for path in layer_io.list_layers(processed_dir):
+        layer = TileLayer(path, layer_opts.get(path.stem.lower(), {}))
+        if layer.bounds is not None:
+            layers.append(layer)
+    if not layers:
+        print("No processed layers to tile.")
+        return None
+
+    bounds = np.array([layer.bounds for layer in layers])
+    total_bounds = (bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max())
+
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+
+    n_tiles, n_bytes = 0, 0
+    for z in range(minzoom, maxzoom + 1):
+        span = tile_span(z)
+        pad = span * buffer / extent
+        zoom_layers = [(layer, *layer.at_zoom(z, extent, simplify_px))
+                       for layer in layers if z >= layer.minzoom]
+
+        # Only tiles some kept feature can reach, rather than every tile in the bounds
+        cover = set()
+        for _, geoms, keep, _ in zoom_layers:
+            cover |= tile_cover(geoms[keep], z, pad)
+        for x, y in sorted(cover):
+            minx, miny, maxx, maxy = tile_bounds(x, y, z)
+            data = b""
+            for layer, geoms, keep, tree in zoom_layers:
+                hits = keep[tree.query(shapely.box(minx - pad, miny - pad, maxx + pad, maxy + pad))]
+                if not len(hits):
+                    continue
+                clipped = shapely.clip_by_rect(geoms[hits], minx - pad, miny - pad, maxx + pad, maxy + pad)
+                # EPSG:3857 meters -> tile units, y down
+                local = shapely.transform(
+                    clipped, lambda c: np.column_stack(((c[:, 0] - minx) / span * extent,
+                                                        (maxy - c[:, 1]) / span * extent)))
+                builder = _LayerBuilder(layer.name, extent)
+                for idx, geom in zip(hits, local):
+                    if not shapely.is_empty(geom):
+                        builder.add(_homogeneous(geom), layer.records[idx], int(idx) + 1)
+                if builder.features:
+                    data += builder.encode()
+
+            if not data:
+                continue
+            col_dir = out_dir / str(z) / str(x)
+            col_dir.mkdir(parents=True, exist_ok=True)
+            (col_dir / f"{y}.pbf").write_bytes(data)
+            n_tiles += 1
+            n_bytes += len(data)
+
+    lon_lat = gpd.GeoSeries([shapely.box(*total_bounds)], crs=3857).to_crs(4326).total_bounds
+    metadata = {
+        "tilejson": "3.0.0",
+        "tiles": ["{z}/{x}/{y}.pbf"],
+        "minzoom": minzoom,
+        "maxzoom": maxzoom,
+        "bounds": [round(float(v), 6) for v in lon_lat],
+        "vector_layers": [
+            {"id": layer.name, "fields": layer.fields, "minzoom": max(layer.minzoom, minzoom), "maxzoom": maxzoom}
+            for layer in layers
+        ],
+    }
+    out_dir.mkdir(parents=True, exist_ok=True)
+    metadata_path = out_dir / "metadata.json"
+    with open(metadata_path, "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"Wrote {n_tiles} tiles ({n_bytes / (1024 * 1024):.1f} MB) for {len(layers)} layers, "
+          f"z{minzoom}-{maxzoom}, in {time.perf_counter() - start:.1f}s -> {out_dir}")
+    return metadata_path
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import the pipeline as the scripts do when run from the Processing dir
+sys.path.insert(0, str(Path(__file__).parent.parent))
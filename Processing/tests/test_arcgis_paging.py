@@ -0,0 +1,72 @@
+"""ArcGISPager against benchmarks.stub_server, capped below the pager's page size."""
+import json
+
+import geopandas as gpd
+import pytest
+import shapely
+
+from benchmarks.stub_server import StubServer
+from benchmarks.synthetic import World
+from scripts.arcgis_paging import ArcGISPager
+from scripts.http_cache import ResponseCache
+
+N_FEATURES = 53
+MAX_RECORD_COUNT = 7
+PAGE_SIZE = 20
+PARAMS = {"where": "1=1", "outFields": "*", "f": "geojson"}
+
+
+@pytest.fixture(scope="module")
+def stub(tmp_path_factory):
+    root = tmp_path_factory.mktemp("world")
+    (root / "services").mkdir()
+    gdf = gpd.GeoDataFrame({"NAME": [f"f{i}" for i in range(N_FEATURES)]},
+                           geometry=shapely.points(range(N_FEATURES), 0), crs=4326)
+    gdf.to_parquet(root / "services" / "trails.parquet")
+    (root / "world.json").write_text(json.dumps({"tiles": []}))
+
+    with StubServer(World(root), max_record_count=MAX_RECORD_COUNT) as server:
+        yield server
+
+
+@pytest.fixture
+def pager():
+    return ArcGISPager(page_size=PAGE_SIZE, max_per_host=2, retries=0, backoff=0)
+
+
+def object_ids(features):
+    return [f["id"] for f in features]
+
+
+def query_url(stub):
+    return stub.service_url("trails") + "/query"
+
+
+def test_object_id_pages(stub, pager):
+    features = pager.query(query_url(stub), PARAMS)
+    assert object_ids(features) == list(range(1, N_FEATURES + 1))
+
+
+def test_count_offset_pages(stub, pager, monkeypatch):
+    monkeypatch.setattr(pager, "fetch_object_ids", lambda *args, **kwargs: None)
+    features = pager.query(query_url(stub), PARAMS)
+    assert object_ids(features) == list(range(1, N_FEATURES + 1))
+
+
+def test_sequential_offset_pages(stub, pager, monkeypatch):
+    monkeypatch.setattr(pager, "fetch_object_ids", lambda *args, **kwargs: None)
+    monkeypatch.setattr(pager, "fetch_count", lambda *args, **kwargs: None)
+    features = pager.query(query_url(stub), PARAMS)
+    assert object_ids(features) == list(range(1, N_FEATURES + 1))
+
+
+def test_offline_falls_back_to_cached_offset_pages(stub, tmp_path, monkeypatch):
+    # Cache only the sequential offset pages, as a run with ids/count unsupported would
+    online = ArcGISPager(page_size=PAGE_SIZE, retries=0, backoff=0, cache=ResponseCache(tmp_path))
+    monkeypatch.setattr(online, "fetch_object_ids", lambda *args, **kwargs: None)
+    monkeypatch.setattr(online, "fetch_count", lambda *args, **kwargs: None)
+    online.query(query_url(stub), PARAMS)
+
+    offline = ArcGISPager(page_size=PAGE_SIZE, retries=0, backoff=0, cache=ResponseCache(tmp_path, offline=True))
+    features = offline.query(query_url(stub), PARAMS)
+    assert object_ids(features) == list(range(1, N_FEATURES + 1))
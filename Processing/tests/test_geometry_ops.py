@@ -0,0 +1,103 @@
+"""
+geometry_ops on the shipped layers: remove_isolated_edges against the per-line
+loop it replaced and against build_network (what process_data runs), and
+export simplification.
+"""
+import json
+from pathlib import Path
+
+import pytest
+from geopandas.testing import assert_geodataframe_equal
+from shapely.geometry import LineString, MultiLineString, Point
+
+from scripts import layer_io
+from scripts.geometry_ops import METERS_PER_DEGREE, build_network, remove_isolated_edges, simplify_for_export
+
+DATA_DIR = Path(__file__).parent.parent.parent / "frontend" / "public" / "data"
+LAYERS = ("nhd_flowline", "mt_roads", "fs_trails")
+TOLERANCES = (0.0, 0.0001)
+FIELD_MAPPINGS = Path(__file__).parent.parent / "field_mappings.json"
+
+
+def snap_tolerances_m():
+    """(layer, meters) pairs: none, each layer's configured snap tolerance, and 5 m."""
+    with open(FIELD_MAPPINGS) as f:
+        field_mappings = json.load(f)
+    pairs = []
+    for name in LAYERS:
+        configured = field_mappings[f"{name}.geojson"].get("topology", {}).get("snap_tolerance_m", 0.0)
+        pairs += [(name, m) for m in sorted({0.0, configured, 5.0})]
+    return pairs
+
+
+def remove_isolated_edges_loop(gdf, tolerance=0.0):
+    """The previous per-line implementation, kept as the reference."""
+    if gdf.empty:
+        return gdf.copy()
+    lines = gdf[gdf.geometry.notna()].copy()
+    if lines.empty:
+        return lines
+    sindex = lines.sindex
+
+    def endpoints(geom):
+        if isinstance(geom, LineString):
+            coords = list(geom.coords)
+            return [Point(coords[0]), Point(coords[-1])] if len(coords) >= 2 else []
+        if isinstance(geom, MultiLineString):
+            pts = []
+            for part in geom.geoms:
+                coords = list(part.coords)
+                if len(coords) >= 2:
+                    pts += [Point(coords[0]), Point(coords[-1])]
+            return pts
+        return []
+
+    keep_mask = []
+    for idx, geom in lines.geometry.items():
+        connected = False
+        for pt in endpoints(geom):
+            query_geom = pt if tolerance <= 0 else pt.buffer(tolerance)
+            candidates = lines.iloc[list(sindex.intersection(query_geom.bounds))]
+            candidates = candidates[candidates.index != idx]
+            if not candidates.empty and candidates.intersects(query_geom).any():
+                connected = True
+                break
+        keep_mask.append(connected)
+    return lines.loc[keep_mask].copy()
+
+
+def shipped_layer(name):
+    layers = {p.stem.lower(): p for p in layer_io.list_layers(DATA_DIR)}
+    if name not in layers:
+        pytest.skip(f"{name} is not in {DATA_DIR}")
+    return layer_io.read_layer(layers[name])
+
+
+@pytest.mark.parametrize("tolerance", TOLERANCES)
+@pytest.mark.parametrize("name", LAYERS)
+def test_remove_isolated_edges_matches_loop(name, tolerance):
+    gdf = shipped_layer(name)
+    expected = remove_isolated_edges_loop(gdf, tolerance)
+    result = remove_isolated_edges(gdf, tolerance)
+
+    assert result.index.equals(expected.index)
+    assert_geodataframe_equal(result, expected)
+
+
+@pytest.mark.parametrize("name, coverage", [("mt_roads", False), ("parcels", True)])
+def test_simplify_for_export_leaves_input_unchanged(name, coverage):
+    gdf = shipped_layer(name)
+    before = gdf.copy()
+    simplified = simplify_for_export(gdf, simplify_tolerance_m=10.0, decimals=5, coverage=coverage)
+
+    assert not simplified.geometry.geom_equals_exact(before.geometry.loc[simplified.index], 0).all()
+    assert_geodataframe_equal(gdf, before)
+
+
+@pytest.mark.parametrize("name, snap_tolerance_m", snap_tolerances_m())
+def test_build_network_keeps_rows_remove_isolated_edges_keeps(name, snap_tolerance_m):
+    gdf = shipped_layer(name)
+    lines, _ = build_network(gdf, snap_tolerance_m)
+    expected = remove_isolated_edges(gdf, snap_tolerance_m / METERS_PER_DEGREE)
+
+    assert lines.index.equals(expected.index)
@@ -0,0 +1,59 @@
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+
+from scripts import layer_io
+
+
+def points(n, value="new"):
+    return gpd.GeoDataFrame({"name": [value] * n}, geometry=[Point(i, i) for i in range(n)], crs=4326)
+
+
+@pytest.fixture(params=["parquet", "geojson"])
+def previous(request, tmp_path):
+    """A layer left by an earlier run, plus its file in the other format."""
+    fmt = request.param
+    other = "geojson" if fmt == "parquet" else "parquet"
+    path = layer_io.layer_path(tmp_path, "trails", fmt)
+    sibling = layer_io.layer_path(tmp_path, "trails", other)
+    # Written directly, as write_layer would remove the sibling
+    for p in (path, sibling):
+        if p.suffix == ".parquet":
+            points(3, "old").to_parquet(p)
+        else:
+            points(3, "old").to_file(p)
+    return path, sibling
+
+
+@pytest.mark.parametrize("batches_before_failure", [0, 1])
+def test_failed_stream_keeps_previous_output(previous, batches_before_failure):
+    path, sibling = previous
+    with pytest.raises(RuntimeError):
+        with layer_io.LayerWriter(path) as writer:
+            for _ in range(batches_before_failure):
+                writer.write(points(2))
+            raise RuntimeError("reader failed")
+
+    assert list(layer_io.read_layer(path)["name"]) == ["old"] * 3
+    assert sibling.exists()
+    assert not writer.partial_path.exists()
+
+
+def test_stream_replaces_previous_output(previous):
+    path, sibling = previous
+    with layer_io.LayerWriter(path) as writer:
+        writer.write(points(2))
+        writer.write(points(2))
+
+    assert list(layer_io.read_layer(path)["name"]) == ["new"] * 4
+    assert not sibling.exists()
+    assert not writer.partial_path.exists()
+
+
+def test_stream_without_batches_writes_empty_layer(previous):
+    path, sibling = previous
+    with layer_io.LayerWriter(path):
+        pass
+
+    assert layer_io.read_layer(path).empty
+    assert not sibling.exists()
@@ -0,0 +1,28 @@
+import os
+import signal
+
+from concurrent.futures.process import BrokenProcessPool
+
+from scripts.process_data import run_jobs
+
+
+def square(x):
+    return x * x
+
+def killed():
+    # What the OOM killer does to a worker
+    os.kill(os.getpid(), signal.SIGKILL)
+
+def fails():
+    raise ValueError("bad layer")
+
+
+def test_run_jobs_survives_a_dead_worker():
+    jobs = [("killed", 3, killed, ()), ("fails", 2, fails, ()),
+            ("a", 2, square, (2,)), ("b", 1, square, (3,)), ("c", 1, square, (4,))]
+    results = {name: (result, error) for name, result, _, error in run_jobs(jobs, max_processes=2)}
+
+    assert sorted(results) == ["a", "b", "c", "fails", "killed"]
+    assert {name: results[name][0] for name in "abc"} == {"a": 4, "b": 9, "c": 16}
+    assert isinstance(results["fails"][1], ValueError)
+    assert isinstance(results["killed"][1], BrokenProcessPool)
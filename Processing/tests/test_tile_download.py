@@ -0,0 +1,69 @@
+import requests
+
+from scripts import tile_download
+
+URL = "https://example.test/dem/tile.tif"
+DATA = bytes(range(256)) * 40
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None, fail_after=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), 1000):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise requests.exceptions.ChunkedEncodingError("connection broken")
+            yield self.body[i:i + 1000]
+
+
+class FakeSession:
+    """Serves DATA with Range support; the first GET drops the connection part-way."""
+
+    def __init__(self, drop_at=None):
+        self.drop_at = drop_at
+        self.ranges = []
+
+    def head(self, url, **kwargs):
+        return FakeResponse(405)
+
+    def get(self, url, stream=True, headers=None, timeout=None):
+        start = int(headers["Range"][6:-1]) if headers else 0
+        self.ranges.append(start)
+        if start >= len(DATA):
+            return FakeResponse(416, headers={"Content-Range": f"bytes */{len(DATA)}"})
+        drop_at, self.drop_at = self.drop_at, None
+        if start:
+            return FakeResponse(206, DATA[start:], fail_after=drop_at)
+        return FakeResponse(200, DATA, {"Content-Length": str(len(DATA))}, fail_after=drop_at)
+
+
+def test_interrupted_transfer_resumes(tmp_path, monkeypatch):
+    session = FakeSession(drop_at=3000)
+    monkeypatch.setattr(tile_download, "make_session", lambda **kwargs: session)
+    [path] = tile_download.download_tiles([{"downloadURL": URL}], tmp_path, retries=2, backoff=0)
+
+    assert path.read_bytes() == DATA
+    assert session.ranges == [0, 3000]
+
+
+def test_range_past_end_completes_part_file(tmp_path):
+    # A .part file that already holds the whole tile, with no size known up front
+    (tmp_path / "tile.tif.part").write_bytes(DATA)
+    path = tile_download.download_file(URL, tmp_path / "tile.tif", session=FakeSession())
+
+    assert path.read_bytes() == DATA
+    assert not (tmp_path / "tile.tif.part").exists()
@@ -1,4 +1,5 @@
-import { useState, useCallback, useMemo } from 'react';
+import { useState, useCallback, useEffect, useMemo, useRef, Children, cloneElement, isValidElement } from 'react';
+import type { ReactNode } from 'react';
 import Map, { NavigationControl, Source, Layer, Popup } from 'react-map-gl/mapbox';
 import 'mapbox-gl/dist/mapbox-gl.css';
 import { Mountain, Satellite, X } from 'lucide-react';
@@ -6,16 +7,177 @@ import { STYLE_TERRAIN, STYLE_SATELLITE } from '../App';
 
 const MAPBOX_TOKEN = import.meta.env.VITE_MAPBOX_TOKEN || '';
 
-const HUNTING_DISTRICT_URL = '/data/hunting_district.geojson';
-const NHD_WATERBODY_URL = '/data/nhd_waterbody.geojson';
-const NHD_FLOWLINE_URL = '/data/nhd_flowline.geojson';
-const MT_ROADS_URL = '/data/mt_roads.geojson';
-const FS_TRAILS_URL = '/data/fs_trails.geojson';
-const PUBLIC_LANDS_URL = '/data/public_lands.geojson';
-const PARCELS_URL = '/data/parcels.geojson';
-const BHS_DISTRIBUTION_URL = '/data/distribution.geojson';
-const ELEVATION_BANDS_URL = '/data/elevation_bands.geojson';
-const SLOPE_MASK_URL = '/data/slope_mask.geojson';
+// VITE_VECTOR_TILES=true loads every layer from the tiles written by the
+// pipeline's vector_tiles step instead of downloading whole GeoJSON files.
+const USE_VECTOR_TILES = import.meta.env.VITE_VECTOR_TILES === 'true';
+const VECTOR_TILES_SOURCE = 'map-tiles';
+const VECTOR_TILES_URL = `${window.location.origin}/data/tiles/{z}/{x}/{y}.pbf`;
+const VECTOR_TILES_MINZOOM = 8;  // tiles.minzoom in Processing/config.yaml
+const VECTOR_TILES_MAXZOOM = 14; // tiles.maxzoom; the map overzooms past it
+
+// Written by the pipeline's push_to_map stage: layer name -> content-hashed
+// GeoJSON under /data/assets. Without one, layers load from /data/<layer>.geojson.
+const MANIFEST_URL = '/data/manifest.json';
+const DATA_URL = '/data';
+
+// Zoom below which a layer is neither drawn nor fetched. Layers listed under
+// publish.grid in Processing/config.yaml (parcels, roads) are also only
+// fetched for the grid chunks that have been in view.
+const LAYER_MINZOOM: Record<string, number> = {
+    hunting_district: 0,
+    distribution: 6,
+    public_lands: 8,
+    elevation_bands: 9,
+    slope_mask: 9,
+    nhd_waterbody: 9,
+    nhd_flowline: 10,
+    fs_trails: 10,
+    mt_roads: 11,
+    parcels: 12, // tiles.layers.parcels.minzoom
+};
+
+// Layers fetched as soon as the map loads. Other layers that are on by default
+// wait for the user's first pan or zoom (or for being toggled), so startup only
+// transfers these and the basemap.
+const STARTUP_LAYERS = new Set(['hunting_district']);
+
+const INITIAL_VIEW = {
+    longitude: -114.85,
+    latitude: 48.86,
+    zoom: 11
+};
+
+interface ManifestFile {
+    url: string;
+}
+
+interface ManifestLayer extends ManifestFile {
+    grid?: { cell: number; chunks: Record<string, ManifestFile> };
+}
+
+interface Manifest {
+    version: string;
+    layers: Record<string, ManifestLayer>;
+}
+
+type Layers = Record<string, ManifestLayer>;
+
+// west, south, east, north
+type Bounds = [number, number, number, number];
+
+interface View {
+    zoom: number;
+    bounds: Bounds | null;
+    interacted: boolean; // the user has panned or zoomed
+}
+
+// Layer name -> manifest entry; {} without a manifest, null until it has been read
+function useManifest() {
+    const [layers, setLayers] = useState<Layers | null>(null);
+
+    useEffect(() => {
+        if (USE_VECTOR_TILES) return;
+        fetch(MANIFEST_URL, { cache: 'no-cache' })
+            .then((response) => (response.ok ? response.json() : Promise.reject(response.status)))
+            .then((manifest: Manifest) => setLayers(manifest.layers))
+            .catch(() => setLayers({}));
+    }, []);
+
+    return layers;
+}
+
+// Keys of the grid cells a bounding box touches, as push_to_map names them
+function gridKeys(cell: number, [west, south, east, north]: Bounds) {
+    const keys = [];
+    for (let x = Math.floor(west / cell); x <= Math.floor(east / cell); x++) {
+        for (let y = Math.floor(south / cell); y <= Math.floor(north / cell); y++) {
+            keys.push(`${x}_${y}`);
+        }
+    }
+    return keys;
+}
+
+// Source data for one layer: null until the layer is first visible at or past
+// its minzoom (and, if it was on by default, the user has moved the map), then
+// its file's URL or, for a gridded layer, the features of every chunk that has
+// been in view while it was shown
+function useLayerData(manifest: Layers | null, layer: string, visible: boolean, view: View) {
+    const [needed, setNeeded] = useState(false);
+    const [chunks, setChunks] = useState<Record<string, GeoJSON.Feature[]>>({});
+    const requested = useRef(new Set<string>());
+    // On by default and not yet toggled by the user
+    const byDefault = useRef(visible && !STARTUP_LAYERS.has(layer));
+    if (!visible) byDefault.current = false;
+    const entry = manifest?.[layer];
+    const grid = entry?.grid;
+    const active = manifest !== null && visible && view.zoom >= (LAYER_MINZOOM[layer] ?? 0)
+        && (view.interacted || !byDefault.current);
+    if (active && !needed) setNeeded(true);
+
+    useEffect(() => {
+        if (!active || !grid || !view.bounds) return;
+        for (const key of gridKeys(grid.cell, view.bounds)) {
+            const chunk = grid.chunks[key];
+            if (!chunk || requested.current.has(key)) continue;
+            requested.current.add(key);
+            fetch(`${DATA_URL}/${chunk.url}`)
+                .then((response) => response.json())
+                .then((collection: GeoJSON.FeatureCollection) =>
+                    setChunks((loaded) => ({ ...loaded, [key]: collection.features })))
+                .catch(() => requested.current.delete(key));
+        }
+    }, [active, grid, view.bounds]);
+
+    return useMemo(() => {
+        if (!needed) return null;
+        if (!grid) return `${DATA_URL}/${entry ? entry.url : `${layer}.geojson`}`;
+        // A feature crossing chunk edges is in every chunk it touches, with one id
+        const byId = new globalThis.Map<string | number | undefined, GeoJSON.Feature>();
+        for (const features of Object.values(chunks)) {
+            for (const feature of features) byId.set(feature.id, feature);
+        }
+        return { type: 'FeatureCollection', features: [...byId.values()] } as GeoJSON.FeatureCollection;
+    }, [needed, grid, entry, layer, chunks]);
+}
+
+// children with extra props; each keeps the larger of its own and the layer's minzoom
+function withLayerProps(children: ReactNode, minzoom: number, props: (child: any) => object) {
+    return Children.map(children, (child) =>
+        isValidElement<any>(child)
+            ? cloneElement(child, { ...props(child.props), minzoom: Math.max(minzoom, child.props.minzoom ?? 0) })
+            : child
+    );
+}
+
+interface DataSourceProps {
+    id: string;
+    layer: string; // published layer name: manifest key and vector tile source-layer
+    visible: boolean;
+    manifest: Layers | null;
+    view: View;
+    children: ReactNode;
+}
+
+// GeoJSON source for one layer, or its layers pointed at the shared vector tile
+// source. A GeoJSON source is added the first time its layer is needed and then
+// kept (hidden while toggled off), so toggling a layer never refetches it.
+function DataSource({ id, layer, visible, manifest, view, children }: DataSourceProps) {
+    const data = useLayerData(manifest, layer, visible, view);
+    const minzoom = LAYER_MINZOOM[layer] ?? 0;
+
+    if (USE_VECTOR_TILES) {
+        if (!visible) return null;
+        return <>{withLayerProps(children, minzoom, () => ({ source: VECTOR_TILES_SOURCE, 'source-layer': layer }))}</>;
+    }
+    if (!data) return null;
+    return (
+        <Source id={id} type="geojson" data={data}>
+            {withLayerProps(children, minzoom, (props) => ({
+                layout: { ...props.layout, visibility: visible ? 'visible' : 'none' }
+            }))}
+        </Source>
+    );
+}
 
 const bhsLayer = {
     id: 'bhs-distribution',
@@ -171,6 +333,8 @@ export function MapComponent({
     const [cursorCoords, setCursorCoords] = useState<{ lat: number; lng: number } | null>(null);
     const [popupInfo, setPopupInfo] = useState<{ feature: any; lngLat: { lng: number; lat: number } } | null>(null);
     const [cursor, setCursor] = useState<string>('auto');
+    const manifest = useManifest();
+    const [view, setView] = useState<View>({ zoom: INITIAL_VIEW.zoom, bounds: null, interacted: false });
 
     const toggleMapStyle = () => {
         setMapStyle(mapStyle === STYLE_TERRAIN ? STYLE_SATELLITE : STYLE_TERRAIN);
@@ -191,7 +355,19 @@ export function MapComponent({
         if (showTrails) ids.push('fs-trails');
         if (showLocalDistricts) ids.push('hunting-district-line');
         return ids;
-    }, [showElevationBands, showSlopeMask, showPublicLands, showBHS, showMTRoads, showNHD, showTrails, showLocalDistricts]);
+    }, [showElevationBands, showSlopeMask, showPublicLands, showParcels, showBHS, showMTRoads, showNHD, showTrails, showLocalDistricts]);
+
+    // Layers fetch what they need for the view once the map settles. Only
+    // user-driven moves (which carry the DOM event) count as interaction.
+    const onMoveEnd = useCallback((event: any) => {
+        const map = event.target;
+        const bounds = map.getBounds();
+        setView((previous) => ({
+            zoom: map.getZoom(),
+            bounds: bounds && [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()],
+            interacted: previous.interacted || Boolean(event.originalEvent)
+        }));
+    }, []);
 
     const onMouseEnter = useCallback(() => setCursor('pointer'), []);
     const onMouseLeave = useCallback(() => setCursor('auto'), []);
@@ -211,11 +387,7 @@ export function MapComponent({
     return (
         <div className="h-full w-full relative">
             <Map
-                initialViewState={{
-                    longitude: -114.85,
-                    latitude: 48.86,
-                    zoom: 11
-                }}
+                initialViewState={INITIAL_VIEW}
                 style={{ width: '100%', height: '100%' }}
                 mapStyle={mapStyle}
                 mapboxAccessToken={MAPBOX_TOKEN}
@@ -223,11 +395,23 @@ export function MapComponent({
                 onMouseEnter={onMouseEnter}
                 onMouseLeave={onMouseLeave}
                 onClick={onClick}
+                onLoad={onMoveEnd}
+                onMoveEnd={onMoveEnd}
                 cursor={cursor}
                 interactiveLayerIds={interactiveLayerIds}
             >
                 <NavigationControl position="top-right" />
 
+                {USE_VECTOR_TILES && (
+                    <Source
+                        id={VECTOR_TILES_SOURCE}
+                        type="vector"
+                        tiles={[VECTOR_TILES_URL]}
+                        minzoom={VECTOR_TILES_MINZOOM}
+                        maxzoom={VECTOR_TILES_MAXZOOM}
+                    />
+                )}
+
                 {showNAIP && (
                     <Source
                         key={naipYear}
@@ -245,66 +429,46 @@ export function MapComponent({
                     </Source>
                 )}
 
-                {showElevationBands && (
-                    <Source id="elevation-bands" type="geojson" data={ELEVATION_BANDS_URL}>
-                        <Layer {...elevationBandsLayer} />
-                    </Source>
-                )}
-
-                {showSlopeMask && (
-                    <Source id="slope-mask" type="geojson" data={SLOPE_MASK_URL}>
-                        <Layer {...slopeMaskLayer} />
-                    </Source>
-                )}
-
-                {showPublicLands && (
-                    <Source id="public-lands" type="geojson" data={PUBLIC_LANDS_URL}>
-                        <Layer {...publicLandsLayer} />
-                    </Source>
-                )}
-
-                {showParcels && (
-                    <Source id="parcels" type="geojson" data={PARCELS_URL}>
-                        <Layer {...parcelsLayer} />
-                        <Layer {...parcelsLabelLayer} />
-                    </Source>
-                )}
-
-                {showBHS && (
-                    <Source id="bhs-distribution" type="geojson" data={BHS_DISTRIBUTION_URL}>
-                        <Layer {...bhsLayer} />
-                    </Source>
-                )}
-
-                {showMTRoads && (
-                    <Source id="mt-roads" type="geojson" data={MT_ROADS_URL}>
-                        <Layer {...mtRoadsLayer} />
-                    </Source>
-                )}
-
-                {showNHD && (
-                    <>
-                        <Source id="nhd-waterbodies" type="geojson" data={NHD_WATERBODY_URL}>
-                            <Layer {...nhdWaterbodyFillLayer} />
-                            <Layer {...nhdWaterbodyOutlineLayer} />
-                        </Source>
-                        <Source id="nhd-flowlines" type="geojson" data={NHD_FLOWLINE_URL}>
-                            <Layer {...nhdFlowlineLayer} />
-                        </Source>
-                    </>
-                )}
-
-                {showTrails && (
-                    <Source id="fs-trails" type="geojson" data={FS_TRAILS_URL}>
-                        <Layer {...fsTrailsLayer} />
-                    </Source>
-                )}
-
-                {showLocalDistricts && (
-                    <Source id="hunting-district" type="geojson" data={HUNTING_DISTRICT_URL}>
-                        <Layer {...huntingDistrictLineLayer} />
-                    </Source>
-                )}
+                <DataSource id="elevation-bands" layer="elevation_bands" visible={showElevationBands} manifest={manifest} view={view}>
+                    <Layer {...elevationBandsLayer} />
+                </DataSource>
+
+                <DataSource id="slope-mask" layer="slope_mask" visible={showSlopeMask} manifest={manifest} view={view}>
+                    <Layer {...slopeMaskLayer} />
+                </DataSource>
+
+                <DataSource id="public-lands" layer="public_lands" visible={showPublicLands} manifest={manifest} view={view}>
+                    <Layer {...publicLandsLayer} />
+                </DataSource>
+
+                <DataSource id="parcels" layer="parcels" visible={showParcels} manifest={manifest} view={view}>
+                    <Layer {...parcelsLayer} />
+                    <Layer {...parcelsLabelLayer} />
+                </DataSource>
+
+                <DataSource id="bhs-distribution" layer="distribution" visible={showBHS} manifest={manifest} view={view}>
+                    <Layer {...bhsLayer} />
+                </DataSource>
+
+                <DataSource id="mt-roads" layer="mt_roads" visible={showMTRoads} manifest={manifest} view={view}>
+                    <Layer {...mtRoadsLayer} />
+                </DataSource>
+
+                <DataSource id="nhd-waterbodies" layer="nhd_waterbody" visible={showNHD} manifest={manifest} view={view}>
+                    <Layer {...nhdWaterbodyFillLayer} />
+                    <Layer {...nhdWaterbodyOutlineLayer} />
+                </DataSource>
+                <DataSource id="nhd-flowlines" layer="nhd_flowline" visible={showNHD} manifest={manifest} view={view}>
+                    <Layer {...nhdFlowlineLayer} />
+                </DataSource>
+
+                <DataSource id="fs-trails" layer="fs_trails" visible={showTrails} manifest={manifest} view={view}>
+                    <Layer {...fsTrailsLayer} />
+                </DataSource>
+
+                <DataSource id="hunting-district" layer="hunting_district" visible={showLocalDistricts} manifest={manifest} view={view}>
+                    <Layer {...huntingDistrictLineLayer} />
+                </DataSource>
 
                 {popupInfo && (
                     <Popup
@@ -1,11 +1,63 @@
+import fs from 'node:fs'
+import path from 'node:path'
 import { defineConfig } from 'vite'
+import type { Connect, Plugin } from 'vite'
 import react from '@vitejs/plugin-react'
 import tailwindcss from '@tailwindcss/vite'
 
+const ASSETS_PATH = '/data/assets/'
+const TILES_PATH = '/data/tiles/'
+const ENCODINGS = [['br', '.br'], ['gzip', '.gz']]
+
+// Serves the .br/.gz variants push_to_map writes next to each content-hashed
+// layer file, and lets browsers cache those files for good. Vector tiles are
+// only written where there are features, so a missing tile is answered with
+// 204 (an empty tile) rather than the HTML fallback. A production server
+// should do the same (e.g. nginx gzip_static/brotli_static, try_files =204).
+function precompressedData(): Plugin {
+  const handler = (root: string): Connect.NextHandleFunction => (req, res, next) => {
+    const url = (req.url ?? '').split('?')[0]
+    const isTile = url.startsWith(TILES_PATH) && url.endsWith('.pbf')
+    if (!url.startsWith(ASSETS_PATH) && !isTile) return next()
+    const file = path.resolve(root, '.' + decodeURIComponent(url))
+    if (!file.startsWith(path.resolve(root) + path.sep)) return next()
+    if (isTile) {
+      if (fs.existsSync(file)) return next()
+      res.statusCode = 204
+      res.end()
+      return
+    }
+
+    const accepted = String(req.headers['accept-encoding'] ?? '')
+    for (const [encoding, suffix] of ENCODINGS) {
+      if (accepted.includes(encoding) && fs.existsSync(file + suffix)) {
+        res.setHeader('Content-Type', 'application/geo+json')
+        res.setHeader('Content-Encoding', encoding)
+        res.setHeader('Vary', 'Accept-Encoding')
+        res.setHeader('Cache-Control', 'public, max-age=31536000, immutable')
+        fs.createReadStream(file + suffix).pipe(res)
+        return
+      }
+    }
+    next()
+  }
+
+  return {
+    name: 'precompressed-data',
+    configureServer(server) {
+      server.middlewares.use(handler(server.config.publicDir))
+    },
+    configurePreviewServer(server) {
+      server.middlewares.use(handler(path.resolve(server.config.root, server.config.build.outDir)))
+    },
+  }
+}
+
 // https://vite.dev/config/
 export default defineConfig({
   plugins: [
     react(),
     tailwindcss(),
+    precompressedData(),
   ],
 })